@@ -62,6 +62,34 @@ POOL_ABI = [
         "stateMutability": "view",
         "type": "function",
     },
+    {
+        "inputs": [{"internalType": "uint8", "name": "id", "type": "uint8"}],
+        "name": "getEModeCategoryData",
+        "outputs": [
+            {
+                "components": [
+                    {"internalType": "uint16", "name": "ltv", "type": "uint16"},
+                    {
+                        "internalType": "uint16",
+                        "name": "liquidationThreshold",
+                        "type": "uint16",
+                    },
+                    {
+                        "internalType": "uint16",
+                        "name": "liquidationBonus",
+                        "type": "uint16",
+                    },
+                    {"internalType": "address", "name": "priceSource", "type": "address"},
+                    {"internalType": "string", "name": "label", "type": "string"},
+                ],
+                "internalType": "struct DataTypes.EModeCategory",
+                "name": "",
+                "type": "tuple",
+            }
+        ],
+        "stateMutability": "view",
+        "type": "function",
+    },
     {
         "inputs": [{"internalType": "address", "name": "user", "type": "address"}],
         "name": "getUserAccountData",
@@ -143,9 +171,164 @@ POOL_ABI = [
         "stateMutability": "view",
         "type": "function",
     },
+    # Events, for indexing a wallet's history with eth_getLogs
+    {
+        "anonymous": False,
+        "inputs": [
+            {
+                "indexed": True,
+                "internalType": "address",
+                "name": "reserve",
+                "type": "address",
+            },
+            {
+                "indexed": False,
+                "internalType": "address",
+                "name": "user",
+                "type": "address",
+            },
+            {
+                "indexed": True,
+                "internalType": "address",
+                "name": "onBehalfOf",
+                "type": "address",
+            },
+            {
+                "indexed": False,
+                "internalType": "uint256",
+                "name": "amount",
+                "type": "uint256",
+            },
+            {
+                "indexed": True,
+                "internalType": "uint16",
+                "name": "referralCode",
+                "type": "uint16",
+            },
+        ],
+        "name": "Supply",
+        "type": "event",
+    },
+    {
+        "anonymous": False,
+        "inputs": [
+            {
+                "indexed": True,
+                "internalType": "address",
+                "name": "reserve",
+                "type": "address",
+            },
+            {
+                "indexed": True,
+                "internalType": "address",
+                "name": "user",
+                "type": "address",
+            },
+            {
+                "indexed": True,
+                "internalType": "address",
+                "name": "to",
+                "type": "address",
+            },
+            {
+                "indexed": False,
+                "internalType": "uint256",
+                "name": "amount",
+                "type": "uint256",
+            },
+        ],
+        "name": "Withdraw",
+        "type": "event",
+    },
+    {
+        "anonymous": False,
+        "inputs": [
+            {
+                "indexed": True,
+                "internalType": "address",
+                "name": "reserve",
+                "type": "address",
+            },
+            {
+                "indexed": False,
+                "internalType": "address",
+                "name": "user",
+                "type": "address",
+            },
+            {
+                "indexed": True,
+                "internalType": "address",
+                "name": "onBehalfOf",
+                "type": "address",
+            },
+            {
+                "indexed": False,
+                "internalType": "uint256",
+                "name": "amount",
+                "type": "uint256",
+            },
+            {
+                "indexed": False,
+                "internalType": "uint8",
+                "name": "interestRateMode",
+                "type": "uint8",
+            },
+            {
+                "indexed": False,
+                "internalType": "uint256",
+                "name": "borrowRate",
+                "type": "uint256",
+            },
+            {
+                "indexed": True,
+                "internalType": "uint16",
+                "name": "referralCode",
+                "type": "uint16",
+            },
+        ],
+        "name": "Borrow",
+        "type": "event",
+    },
+    {
+        "anonymous": False,
+        "inputs": [
+            {
+                "indexed": True,
+                "internalType": "address",
+                "name": "reserve",
+                "type": "address",
+            },
+            {
+                "indexed": True,
+                "internalType": "address",
+                "name": "user",
+                "type": "address",
+            },
+            {
+                "indexed": True,
+                "internalType": "address",
+                "name": "repayer",
+                "type": "address",
+            },
+            {
+                "indexed": False,
+                "internalType": "uint256",
+                "name": "amount",
+                "type": "uint256",
+            },
+            {
+                "indexed": False,
+                "internalType": "bool",
+                "name": "useATokens",
+                "type": "bool",
+            },
+        ],
+        "name": "Repay",
+        "type": "event",
+    },
 ]
 
-# ERC20 Token ABI (for approve function)
+# ERC20 Token ABI (approve, allowance, balanceOf, decimals and Transfer)
 ERC20_ABI = [
     {
         "inputs": [
@@ -157,6 +340,16 @@ ERC20_ABI = [
         "stateMutability": "nonpayable",
         "type": "function",
     },
+    {
+        "inputs": [
+            {"internalType": "address", "name": "owner", "type": "address"},
+            {"internalType": "address", "name": "spender", "type": "address"},
+        ],
+        "name": "allowance",
+        "outputs": [{"internalType": "uint256", "name": "", "type": "uint256"}],
+        "stateMutability": "view",
+        "type": "function",
+    },
     {
         "inputs": [{"internalType": "address", "name": "account", "type": "address"}],
         "name": "balanceOf",
@@ -164,6 +357,38 @@ ERC20_ABI = [
         "stateMutability": "view",
         "type": "function",
     },
+    {
+        "inputs": [],
+        "name": "decimals",
+        "outputs": [{"internalType": "uint8", "name": "", "type": "uint8"}],
+        "stateMutability": "view",
+        "type": "function",
+    },
+    {
+        "anonymous": False,
+        "inputs": [
+            {
+                "indexed": True,
+                "internalType": "address",
+                "name": "from",
+                "type": "address",
+            },
+            {
+                "indexed": True,
+                "internalType": "address",
+                "name": "to",
+                "type": "address",
+            },
+            {
+                "indexed": False,
+                "internalType": "uint256",
+                "name": "value",
+                "type": "uint256",
+            },
+        ],
+        "name": "Transfer",
+        "type": "event",
+    },
 ]
 
 WSEI_ABI = [
@@ -176,3 +401,129 @@ WSEI_ABI = [
         "type": "function",
     },
 ]
+
+# aToken / variable debt token (Aave V3 IScaledBalanceToken)
+SCALED_TOKEN_ABI = [
+    *ERC20_ABI,
+    {
+        "inputs": [{"internalType": "address", "name": "user", "type": "address"}],
+        "name": "scaledBalanceOf",
+        "outputs": [{"internalType": "uint256", "name": "", "type": "uint256"}],
+        "stateMutability": "view",
+        "type": "function",
+    },
+]
+
+# Variable debt token (scaled balances plus credit delegation)
+DEBT_TOKEN_ABI = [
+    *SCALED_TOKEN_ABI,
+    {
+        "inputs": [
+            {"internalType": "address", "name": "delegatee", "type": "address"},
+            {"internalType": "uint256", "name": "amount", "type": "uint256"},
+        ],
+        "name": "approveDelegation",
+        "outputs": [],
+        "stateMutability": "nonpayable",
+        "type": "function",
+    },
+    {
+        "inputs": [
+            {"internalType": "address", "name": "fromUser", "type": "address"},
+            {"internalType": "address", "name": "toUser", "type": "address"},
+        ],
+        "name": "borrowAllowance",
+        "outputs": [{"internalType": "uint256", "name": "", "type": "uint256"}],
+        "stateMutability": "view",
+        "type": "function",
+    },
+]
+
+# Aave V3 WrappedTokenGatewayV3 (supply, withdraw, borrow and repay native SEI)
+WRAPPED_TOKEN_GATEWAY_ABI = [
+    {
+        "inputs": [
+            {"internalType": "address", "name": "pool", "type": "address"},
+            {"internalType": "address", "name": "onBehalfOf", "type": "address"},
+            {"internalType": "uint16", "name": "referralCode", "type": "uint16"},
+        ],
+        "name": "depositETH",
+        "outputs": [],
+        "stateMutability": "payable",
+        "type": "function",
+    },
+    {
+        "inputs": [
+            {"internalType": "address", "name": "pool", "type": "address"},
+            {"internalType": "uint256", "name": "amount", "type": "uint256"},
+            {"internalType": "address", "name": "to", "type": "address"},
+        ],
+        "name": "withdrawETH",
+        "outputs": [],
+        "stateMutability": "nonpayable",
+        "type": "function",
+    },
+    {
+        "inputs": [
+            {"internalType": "address", "name": "pool", "type": "address"},
+            {"internalType": "uint256", "name": "amount", "type": "uint256"},
+            {"internalType": "uint256", "name": "rateMode", "type": "uint256"},
+            {"internalType": "address", "name": "onBehalfOf", "type": "address"},
+        ],
+        "name": "repayETH",
+        "outputs": [],
+        "stateMutability": "payable",
+        "type": "function",
+    },
+    {
+        "inputs": [
+            {"internalType": "address", "name": "pool", "type": "address"},
+            {"internalType": "uint256", "name": "amount", "type": "uint256"},
+            {"internalType": "uint256", "name": "interestRateMode", "type": "uint256"},
+            {"internalType": "uint16", "name": "referralCode", "type": "uint16"},
+        ],
+        "name": "borrowETH",
+        "outputs": [],
+        "stateMutability": "nonpayable",
+        "type": "function",
+    },
+]
+
+# Multicall3 ABI (aggregate3 for batched reads, getEthBalance for native balances)
+MULTICALL3_ABI = [
+    {
+        "inputs": [
+            {
+                "components": [
+                    {"internalType": "address", "name": "target", "type": "address"},
+                    {"internalType": "bool", "name": "allowFailure", "type": "bool"},
+                    {"internalType": "bytes", "name": "callData", "type": "bytes"},
+                ],
+                "internalType": "struct Multicall3.Call3[]",
+                "name": "calls",
+                "type": "tuple[]",
+            }
+        ],
+        "name": "aggregate3",
+        "outputs": [
+            {
+                "components": [
+                    {"internalType": "bool", "name": "success", "type": "bool"},
+                    {"internalType": "bytes", "name": "returnData", "type": "bytes"},
+                ],
+                "internalType": "struct Multicall3.Result[]",
+                "name": "returnData",
+                "type": "tuple[]",
+            }
+        ],
+        "stateMutability": "payable",
+        "type": "function",
+    },
+    {
+        "inputs": [{"internalType": "address", "name": "addr", "type": "address"}],
+        "name": "getEthBalance",
+        "outputs": [{"internalType": "uint256", "name": "balance", "type": "uint256"}],
+        "stateMutability": "view",
+        "type": "function",
+    },
+]
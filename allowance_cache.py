@@ -0,0 +1,63 @@
+import os
+import threading
+
+from web3 import Web3
+
+from pipeline import MAX_UINT256
+
+# Approve 2**256-1 once instead of the exact amount before every supply/repay
+APPROVE_MAX_ALLOWANCE = os.getenv("APPROVE_MAX_ALLOWANCE", "0") == "1"
+
+
+class AllowanceCache:
+    """
+    Process-wide cache of ERC20 allowances keyed by (owner, token, spender)
+
+    Filled from one allowance() read, then kept up to date from approve,
+    supply and repay receipts so supply and repay can skip approvals the
+    remaining allowance already covers.
+    """
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self):
+        self._allowances = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def shared(cls):
+        """Get the cache shared by every bot in the process"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    @staticmethod
+    def _key(owner, token, spender):
+        return (
+            Web3.to_checksum_address(owner),
+            Web3.to_checksum_address(token),
+            Web3.to_checksum_address(spender),
+        )
+
+    def get(self, owner, token, spender):
+        """Cached allowance, or None if it has not been read yet"""
+        return self._allowances.get(self._key(owner, token, spender))
+
+    def set(self, owner, token, spender, amount):
+        with self._lock:
+            self._allowances[self._key(owner, token, spender)] = amount
+
+    def spend(self, owner, token, spender, amount):
+        """Record a transferFrom of amount (infinite allowances never decrease)"""
+        key = self._key(owner, token, spender)
+        with self._lock:
+            allowance = self._allowances.get(key)
+            if allowance is not None and allowance != MAX_UINT256:
+                self._allowances[key] = max(allowance - amount, 0)
+
+    def invalidate(self, owner, token, spender):
+        """Forget an allowance so the next check reads it from the chain"""
+        with self._lock:
+            self._allowances.pop(self._key(owner, token, spender), None)
@@ -0,0 +1,901 @@
+import asyncio
+import os
+import random
+import time
+
+from dotenv import load_dotenv
+from web3 import Web3
+from web3.exceptions import TimeExhausted, TransactionNotFound
+
+from abi import (
+    DEBT_TOKEN_ABI,
+    ERC20_ABI,
+    MULTICALL3_ABI,
+    POOL_ABI,
+    SCALED_TOKEN_ABI,
+    WRAPPED_TOKEN_GATEWAY_ABI,
+    WSEI_ABI,
+)
+from allowance_cache import APPROVE_MAX_ALLOWANCE, AllowanceCache
+from contract_registry import ContractRegistry
+from gas_estimator import GasEstimator
+from gas_oracle import GasPriceOracle
+from journal import Journal
+from metrics import Metrics
+from multicall import MULTICALL3_ADDRESS, parse_snapshot_batch, snapshot_batches
+from nonce_manager import NonceManager, is_nonce_error
+from pipeline import (
+    MAX_UINT256,
+    RECEIPT_POLL_INTERVAL,
+    RECEIPT_TIMEOUT,
+    StepBuilder,
+    cancel_transaction,
+)
+from planner import BPS, UNWIND_INTEREST_MARGIN
+from receipt_watcher import ReceiptWatcher
+from reserve_state import ReserveStateCache
+from signing_service import SigningService
+from web3_pool import get_async_web3
+
+load_dotenv()
+
+
+class AsyncYeiPointBot(StepBuilder):
+    """Aave V3 looping bot on AsyncWeb3; bot.YeiPointBot wraps it for sync use"""
+
+    RPC_URL = os.getenv("RPC_URL")
+    POOL_ADDRESS = os.getenv("POOL_ADDRESS")
+    WSEI_ADDRESS = os.getenv("WSEI_ADDRESS")
+    ATOKEN_ADDRESS = os.getenv("ATOKEN_ADDRESS")
+    DEBT_ADDRESS = os.getenv("DEBT_ADDRESS")
+    GATEWAY_ADDRESS = os.getenv("WRAPPED_TOKEN_GATEWAY_ADDRESS")
+
+    def __init__(self, address):
+        """
+        Initialize async Aave V3 Bot
+
+        Args:
+            address: Wallet address, registered with the SigningService that
+                holds its key
+        """
+        self.w3 = get_async_web3(self.RPC_URL)
+        self.address = Web3.to_checksum_address(address)
+        self.nonce_manager = NonceManager.for_address(self.address)
+        self.gas_oracle = GasPriceOracle.shared()
+        self.gas_estimator = GasEstimator.shared()
+        self.metrics = Metrics.shared()
+        self.journal = Journal.shared()
+        self.signer = SigningService.shared()
+        self.allowance_cache = AllowanceCache.shared()
+        self.reserve_cache = ReserveStateCache.shared()
+        self.receipt_watcher = ReceiptWatcher.shared(self.w3)
+        self.registry = ContractRegistry.shared(self.RPC_URL, self.POOL_ADDRESS)
+
+        # aToken and debt token default to the WSEI reserve's own tokens, set
+        # by resolve_chain_metadata() before the scheduler starts; a bot built
+        # without it discovers them here
+        reserve_tokens = None
+        if not self.ATOKEN_ADDRESS or not self.DEBT_ADDRESS:
+            reserve_tokens = self.registry.reserve_tokens(self.WSEI_ADDRESS)
+        if not self.ATOKEN_ADDRESS:
+            self.ATOKEN_ADDRESS = reserve_tokens["aTokenAddress"]
+        if not self.DEBT_ADDRESS:
+            self.DEBT_ADDRESS = reserve_tokens["variableDebtTokenAddress"]
+
+        self.pool_contract = self.registry.contract(
+            self.w3, self.POOL_ADDRESS, POOL_ABI
+        )
+        self.wsei_contract = self.get_wsei_contract()
+        self.atoken_contract = self.get_atoken_contract()
+        self.debt_contract = self.get_debt_contract()
+        # Native SEI path for the WSEI reserve, only when a gateway is known
+        self.gateway_contract = None
+        if self.GATEWAY_ADDRESS:
+            self.gateway_contract = self.registry.contract(
+                self.w3, self.GATEWAY_ADDRESS, WRAPPED_TOKEN_GATEWAY_ABI
+            )
+        self.multicall_contract = self.registry.contract(
+            self.w3, MULTICALL3_ADDRESS, MULTICALL3_ABI
+        )
+
+    @classmethod
+    async def resolve_chain_metadata(cls, tokens=()):
+        """
+        Discover the chain id, the WSEI reserve's tokens and token decimals
+        once, before any wallet runs, so no bot waits on discovery RPCs
+
+        Args:
+            tokens: Addresses of the tokens whose decimals the run needs
+        """
+        registry = ContractRegistry.shared(cls.RPC_URL, cls.POOL_ADDRESS)
+        await registry.async_chain_id()
+        if not cls.ATOKEN_ADDRESS or not cls.DEBT_ADDRESS:
+            reserve_tokens = await registry.async_reserve_tokens(cls.WSEI_ADDRESS)
+            if not cls.ATOKEN_ADDRESS:
+                cls.ATOKEN_ADDRESS = reserve_tokens["aTokenAddress"]
+            if not cls.DEBT_ADDRESS:
+                cls.DEBT_ADDRESS = reserve_tokens["variableDebtTokenAddress"]
+        for token_address in tokens:
+            await registry.async_decimals(token_address)
+
+    async def random_sleep(self, min_seconds=3, max_seconds=10):
+        sleep_time = random.uniform(min_seconds, max_seconds)
+        await asyncio.sleep(sleep_time)
+
+    def get_erc20_contract(self, token_address):
+        """Get ERC20 token contract instance"""
+        return self.registry.contract(self.w3, token_address, ERC20_ABI)
+
+    def get_wsei_contract(self):
+        return self.registry.contract(self.w3, self.WSEI_ADDRESS, WSEI_ABI)
+
+    def get_atoken_contract(self):
+        return self.registry.contract(self.w3, self.ATOKEN_ADDRESS, SCALED_TOKEN_ABI)
+
+    def get_debt_contract(self):
+        return self.registry.contract(self.w3, self.DEBT_ADDRESS, DEBT_TOKEN_ABI)
+
+    async def get_wsei_balance(self):
+        return await self.wsei_contract.functions.balanceOf(self.address).call()
+
+    async def get_decimals(self, token_address):
+        """Get ERC20 token decimals (cached on disk after the first read)"""
+        return await self.registry.async_decimals(token_address)
+
+    async def get_reserve_tokens(self, token_address):
+        """Get a reserve's aToken and debt token addresses (cached on disk)"""
+        return await self.registry.async_reserve_tokens(token_address)
+
+    async def get_reserve_state(self, token_address):
+        """Indexes and rates of a reserve, read at most once per RESERVE_STATE_TTL"""
+        state = self.reserve_cache.state(token_address)
+        if state is None:
+            reserve_data = await self.get_reserve_data(token_address)
+            state = self.reserve_cache.set_state(token_address, reserve_data)
+        return state
+
+    async def _scaled_balance(self, token_contract, address):
+        cache = self.reserve_cache
+        scaled_balance = cache.scaled_balance(token_contract.address, address)
+        if scaled_balance is None:
+            scaled_balance = await token_contract.functions.scaledBalanceOf(
+                address
+            ).call()
+            cache.set_scaled_balance(token_contract.address, address, scaled_balance)
+        return scaled_balance
+
+    async def project_balances(self, address=None):
+        """
+        Get aWSEI and debtWSEI balances projected from scaled balances
+
+        Scaled balances only change when the wallet transacts, and the WSEI
+        reserve state is refreshed once per RESERVE_STATE_TTL, so most calls
+        need no RPC. Once per BALANCE_VERIFY_INTERVAL, for whichever wallet
+        projects first, the projection is checked against balanceOf and the
+        on-chain balances are returned instead.
+
+        Args:
+            address: Address to check (default: caller)
+
+        Returns:
+            (atoken_balance, debt_balance)
+        """
+        address = Web3.to_checksum_address(address or self.address)
+        state, atoken_scaled, debt_scaled = await asyncio.gather(
+            self.get_reserve_state(self.WSEI_ADDRESS),
+            self._scaled_balance(self.atoken_contract, address),
+            self._scaled_balance(self.debt_contract, address),
+        )
+        now = int(time.time())
+        projected = (
+            state.atoken_balance(atoken_scaled, now),
+            state.debt_balance(debt_scaled, now),
+        )
+        if not self.reserve_cache.needs_verify(self.WSEI_ADDRESS):
+            return projected
+
+        actual = tuple(
+            await asyncio.gather(
+                self.atoken_contract.functions.balanceOf(address).call(),
+                self.debt_contract.functions.balanceOf(address).call(),
+            )
+        )
+        ok = self.reserve_cache.verify(self.WSEI_ADDRESS, address, projected, actual)
+        self.metrics.inc("balance_checks_total", status="ok" if ok else "drift")
+        return actual
+
+    async def get_atoken_balance(self, address=None):
+        return (await self.project_balances(address))[0]
+
+    async def get_debt_balance(self, address=None):
+        return (await self.project_balances(address))[1]
+
+    async def estimate_health_factor(self, liquidation_threshold, address=None):
+        """
+        Health factor of a WSEI loop from projected balances
+
+        Args:
+            liquidation_threshold: In bps (see planner.leverage_params)
+            address: Address to check (default: caller)
+        """
+        atoken_balance, debt_balance = await self.project_balances(address)
+        if debt_balance == 0:
+            return float("inf")
+        return atoken_balance * liquidation_threshold / (debt_balance * BPS)
+
+    async def _gas_limit(self, step, estimate=True):
+        """
+        Gas limit for a step: the cached estimate, a fresh eth_estimateGas
+        when estimate is set, or the step's fallback limit
+
+        Args:
+            step: TransactionStep to send
+            estimate: Whether an estimation RPC is allowed (it is not for
+                pipelined steps that depend on earlier, unmined ones)
+        """
+        if step.gas_key is None:
+            return step.gas
+        gas_limit = self.gas_estimator.gas_limit(step.gas_key)
+        if gas_limit is not None:
+            return gas_limit
+        if not estimate:
+            return step.gas
+
+        txn_params = {"from": self.address}
+        if step.value:
+            txn_params["value"] = step.value
+        try:
+            estimated = await step.contract_function.estimate_gas(txn_params)
+        except Exception as e:
+            print(f"Gas estimation for {step.label} failed, using {step.gas}: {e}")
+            return step.gas
+        return self.gas_estimator.record(step.gas_key, estimated)
+
+    def _observe_receipt(self, step, receipt):
+        """Feed a mined step's block number and gas usage back into the caches"""
+        self.gas_oracle.observe_block(receipt.blockNumber)
+        if step.gas_key is not None:
+            self.gas_estimator.observe(step.gas_key, receipt.gasUsed)
+        self.metrics.inc(
+            "transactions_total", method=step.method, status=receipt.status
+        )
+        self.journal.mined(self.address, receipt.transactionHash, receipt.status)
+        # Any transaction of the wallet may have minted or burned scaled balances
+        self.reserve_cache.invalidate(self.address)
+
+    async def _build_step(self, step, nonce, gas_price, gas_limit):
+        """Build a TransactionStep's transaction dict, ready to sign"""
+        txn_params = {
+            "from": self.address,
+            "nonce": nonce,
+            "gas": gas_limit,
+            "gasPrice": gas_price,
+            "chainId": await self.registry.async_chain_id(),
+        }
+        if step.value:
+            txn_params["value"] = step.value
+        with self.metrics.timer("tx_phase_seconds", phase="build", method=step.method):
+            return await step.contract_function.build_transaction(txn_params)
+
+    async def _sign_step(self, step, nonce, gas_price, gas_limit):
+        """Build and sign a TransactionStep with the given nonce, gas price and limit"""
+        txn = await self._build_step(step, nonce, gas_price, gas_limit)
+        with self.metrics.timer("tx_phase_seconds", phase="sign", method=step.method):
+            (signed_txn,) = await self.signer.async_sign_batch(self.address, [txn])
+        return signed_txn
+
+    async def _send_transaction(self, step):
+        """
+        Sign and send a TransactionStep, then wait for its receipt
+
+        Args:
+            step: TransactionStep to send
+        """
+        gas_limit = await self._gas_limit(step)
+        for attempt in range(2):
+            signed_txn = await self._sign_step(
+                step,
+                await self.nonce_manager.async_next_nonce(self.w3),
+                await self.gas_oracle.async_gas_price(self.w3),
+                gas_limit,
+            )
+            try:
+                with self.metrics.timer(
+                    "tx_phase_seconds", phase="send", method=step.method
+                ):
+                    tx_hash = await self.w3.eth.send_raw_transaction(
+                        signed_txn.raw_transaction
+                    )
+            except Exception as e:
+                # The local nonce was not consumed, resync before the next send
+                self.nonce_manager.reset()
+                if attempt == 0 and is_nonce_error(e):
+                    print(f"Nonce rejected, resyncing from chain: {e}")
+                    continue
+                raise
+            break
+        self.journal.sent(self.address, tx_hash, step.label, step.phase)
+        with self.metrics.timer("tx_phase_seconds", phase="sleep", method=step.method):
+            await self.random_sleep()
+
+        # Wait for confirmation
+        with self.metrics.timer("tx_phase_seconds", phase="wait", method=step.method):
+            receipt = await self.receipt_watcher.wait_for_receipt(tx_hash)
+        self._observe_receipt(step, receipt)
+        if receipt.status == 1 and step.on_success is not None:
+            step.on_success()
+        return tx_hash, receipt
+
+    def _journal_cancelled(self, tx_hash, receipt):
+        """Close a pipelined step in the journal, cancelled or mined anyway"""
+        status = None if receipt is None else receipt.status
+        self.journal.mined(self.address, tx_hash, status)
+
+    async def settle(self, tx_hashes=()):
+        """
+        Wait out transactions an interrupted run left in flight
+
+        Waits until the account has no pending nonces, including sends the
+        journal never got to record, so state read afterwards includes them.
+
+        Args:
+            tx_hashes: Hashes the journal saw sent but never mined
+
+        Returns:
+            Dict of tx hash to receipt, None for dropped or replaced ones
+        """
+        address = self.address
+        deadline = time.monotonic() + RECEIPT_TIMEOUT
+        while time.monotonic() < deadline:
+            pending = await self.w3.eth.get_transaction_count(address, "pending")
+            if pending <= await self.w3.eth.get_transaction_count(address, "latest"):
+                break
+            await asyncio.sleep(RECEIPT_POLL_INTERVAL)
+        else:
+            raise TimeExhausted(f"{address} still has pending transactions")
+        self.nonce_manager.reset()
+
+        receipts = {}
+        for tx_hash in tx_hashes:
+            try:
+                receipts[tx_hash] = await self.w3.eth.get_transaction_receipt(tx_hash)
+            except TransactionNotFound:
+                receipts[tx_hash] = None
+            status = None if receipts[tx_hash] is None else receipts[tx_hash].status
+            self.journal.mined(address, tx_hash, status)
+        return receipts
+
+    async def _cancel_or_wait(self, tx_hash, nonce, gas_price):
+        """
+        Replace a pending transaction with a self-transfer
+
+        Returns the original receipt if it was mined anyway, None if the
+        replacement took its nonce.
+        """
+        try:
+            return await self.w3.eth.get_transaction_receipt(tx_hash)
+        except TransactionNotFound:
+            pass
+
+        cancel_txn = cancel_transaction(
+            self.address,
+            nonce,
+            gas_price,
+            await self.registry.async_chain_id(),
+        )
+        (signed_txn,) = await self.signer.async_sign_batch(self.address, [cancel_txn])
+        try:
+            cancel_hash = await self.w3.eth.send_raw_transaction(
+                signed_txn.raw_transaction
+            )
+        except Exception:
+            # Most likely the original was mined in the meantime
+            return await self.receipt_watcher.wait_for_receipt(tx_hash)
+
+        # Whichever of the two gets mined holds the nonce
+        original = asyncio.ensure_future(
+            self.receipt_watcher.wait_for_receipt(tx_hash)
+        )
+        replacement = asyncio.ensure_future(
+            self.receipt_watcher.wait_for_receipt(cancel_hash)
+        )
+        done, pending = await asyncio.wait(
+            {original, replacement}, return_when=asyncio.FIRST_COMPLETED
+        )
+        for task in pending:
+            task.cancel()
+        if original in done:
+            return original.result()
+        replacement.result()
+        return None
+
+    async def send_pipeline(self, steps):
+        """
+        Send a sequence of steps back-to-back with consecutive nonces
+
+        Every step is signed up front and broadcast without waiting, then all
+        receipts are confirmed together. If a step reverts, the steps after
+        it that are still pending are replaced with self-transfers so they do
+        not run against an unexpected state.
+
+        Args:
+            steps: List of TransactionStep, in execution order
+
+        Returns:
+            List of receipts, None for steps that were cancelled or never sent
+        """
+        gas_price = await self.gas_oracle.async_gas_price(self.w3)
+        nonces = [await self.nonce_manager.async_next_nonce(self.w3) for _ in steps]
+        # Only the first step runs against the current state, later ones use
+        # cached estimates or their fallback limits
+        gas_limits = [
+            await self._gas_limit(step, estimate=i == 0) for i, step in enumerate(steps)
+        ]
+        txns = [
+            await self._build_step(step, nonce, gas_price, gas_limit)
+            for step, nonce, gas_limit in zip(steps, nonces, gas_limits)
+        ]
+        # One round trip to the signing worker for the whole pipeline
+        with self.metrics.timer("tx_phase_seconds", phase="sign", method="pipeline"):
+            signed_txns = await self.signer.async_sign_batch(self.address, txns)
+
+        tx_hashes = []
+        for step, signed_txn in zip(steps, signed_txns):
+            try:
+                with self.metrics.timer(
+                    "tx_phase_seconds", phase="send", method=step.method
+                ):
+                    tx_hashes.append(
+                        await self.w3.eth.send_raw_transaction(
+                            signed_txn.raw_transaction
+                        )
+                    )
+                self.journal.sent(self.address, tx_hashes[-1], step.label, step.phase)
+            except Exception as e:
+                # Later nonces can never be mined past the gap
+                print(f"{step.label} could not be sent, aborting pipeline: {e}")
+                self.nonce_manager.reset()
+                break
+        with self.metrics.timer("tx_phase_seconds", phase="sleep", method="pipeline"):
+            await self.random_sleep()
+
+        receipts = [None] * len(steps)
+        for i, tx_hash in enumerate(tx_hashes):
+            with self.metrics.timer(
+                "tx_phase_seconds", phase="wait", method=steps[i].method
+            ):
+                receipt = await self.receipt_watcher.wait_for_receipt(tx_hash)
+            receipts[i] = receipt
+            self._observe_receipt(steps[i], receipt)
+            if receipt.status == 1:
+                print(f"{steps[i].label} successful! Transaction hash: {tx_hash.hex()}")
+                if steps[i].on_success is not None:
+                    steps[i].on_success()
+                continue
+
+            print(f"{steps[i].label} failed! Transaction hash: {tx_hash.hex()}")
+            for j in range(i + 1, len(tx_hashes)):
+                receipts[j] = await self._cancel_or_wait(
+                    tx_hashes[j], nonces[j], gas_price
+                )
+                self._journal_cancelled(tx_hashes[j], receipts[j])
+                if receipts[j] is None:
+                    print(f"{steps[j].label} cancelled")
+                    continue
+                print(
+                    f"{steps[j].label} already mined with status "
+                    f"{receipts[j].status}! Transaction hash: {tx_hashes[j].hex()}"
+                )
+                if receipts[j].status == 1 and steps[j].on_success is not None:
+                    steps[j].on_success()
+            break
+        return receipts
+
+    async def get_allowance(self, token_address, spender=None):
+        """
+        Get the caller's allowance for spender, read from chain only once
+
+        Args:
+            token_address: Token contract address
+            spender: Spender address (default: Aave Pool)
+        """
+        if spender is None:
+            spender = self.pool_contract.address
+
+        allowance = self.allowance_cache.get(self.address, token_address, spender)
+        if allowance is None:
+            token_contract = self.get_erc20_contract(token_address)
+            allowance = await token_contract.functions.allowance(
+                self.address, Web3.to_checksum_address(spender)
+            ).call()
+            self.allowance_cache.set(self.address, token_address, spender, allowance)
+        return allowance
+
+    def approval_amount(self, amount):
+        """Amount to approve for a transfer of amount under the approval policy"""
+        return MAX_UINT256 if APPROVE_MAX_ALLOWANCE else amount
+
+    async def approval_steps(self, token_address, amount):
+        """
+        Steps needed before the Pool can pull amount of token
+
+        Returns an empty list when the cached allowance already covers it.
+        """
+        if await self.get_allowance(token_address) >= amount:
+            return []
+        return [self.approve_step(token_address, self.approval_amount(amount))]
+
+    async def get_borrow_allowance(self):
+        """Get the WSEI credit the caller delegated to the gateway (read once)"""
+        gateway = self._gateway_for(self.WSEI_ADDRESS).address
+        debt_address = self.debt_contract.address
+        allowance = self.allowance_cache.get(self.address, debt_address, gateway)
+        if allowance is None:
+            allowance = await self.debt_contract.functions.borrowAllowance(
+                self.address, gateway
+            ).call()
+            self.allowance_cache.set(self.address, debt_address, gateway, allowance)
+        return allowance
+
+    async def gateway_approval_steps(self, withdraw_amount=0, borrow_amount=0):
+        """
+        Steps needed before the gateway can withdraw or borrow natively
+
+        withdrawETH pulls the caller's aWSEI and borrowETH borrows against
+        the caller's collateral, so each needs its own allowance. Returns an
+        empty list when the cached allowances already cover both.
+        """
+        gateway = self._gateway_for(self.WSEI_ADDRESS).address
+        atoken_address = self.atoken_contract.address
+        steps = []
+        if withdraw_amount and (
+            await self.get_allowance(atoken_address, gateway) < withdraw_amount
+        ):
+            amount = self.approval_amount(withdraw_amount)
+            steps.append(self.approve_step(atoken_address, amount, gateway))
+        if borrow_amount and await self.get_borrow_allowance() < borrow_amount:
+            steps.append(self.delegation_step(self.approval_amount(borrow_amount)))
+        return steps
+
+    async def _send_gateway_approvals(self, withdraw_amount=0, borrow_amount=0):
+        for step in await self.gateway_approval_steps(withdraw_amount, borrow_amount):
+            print(f"{step.label} for the gateway...")
+            await self._send_transaction(step)
+
+    async def wrap_sei_to_wsei(self, amount):
+        tx_hash, receipt = await self._send_transaction(self.wrap_step(amount))
+        if receipt.status == 1:
+            print(f"Wrapped {amount} SEI to WSEI! Transaction hash: {tx_hash.hex()}")
+        else:
+            print(
+                f"Wrapped {amount} SEI to WSEI failed! Transaction hash: {tx_hash.hex()}"
+            )
+        return receipt
+
+    async def approve_token(self, token_address, amount):
+        """
+        Approve token spending for Aave Pool
+
+        Args:
+            token_address: Token contract address
+            amount: Amount to approve
+        """
+        tx_hash, receipt = await self._send_transaction(
+            self.approve_step(token_address, amount)
+        )
+        if receipt.status == 1:
+            print(f"Token approved! Transaction hash: {tx_hash.hex()}")
+        else:
+            print(f"Token approval failed! Transaction hash: {tx_hash.hex()}")
+        return receipt
+
+    async def supply(self, token_address, amount, on_behalf_of=None, native=None):
+        """
+        Supply tokens to Aave V3 Pool
+
+        Args:
+            token_address: Token contract address to supply
+            amount: Amount to supply (in wei)
+            on_behalf_of: Address to receive aTokens (default: caller)
+            native: Supply SEI through the gateway in one transaction instead
+                of WSEI (default: for WSEI when a gateway is configured)
+        """
+        if native is None:
+            native = self.uses_gateway(token_address)
+        # First approve token spending unless the allowance already covers it
+        if not native and await self.get_allowance(token_address) < amount:
+            print(f"Approving {amount} tokens...")
+            await self.approve_token(token_address, self.approval_amount(amount))
+
+        tx_hash, receipt = await self._send_transaction(
+            self.supply_step(token_address, amount, on_behalf_of, native)
+        )
+        if receipt.status == 1:
+            print(f"Supply successful! Transaction hash: {tx_hash.hex()}")
+        else:
+            print(f"Supply failed! Transaction hash: {tx_hash.hex()}")
+        return receipt
+
+    async def set_user_emode(self, category_id):
+        """
+        Set user efficiency mode (eMode)
+
+        Args:
+            category_id: eMode category ID (0 to disable, 1+ for categories)
+        """
+        tx_hash, receipt = await self._send_transaction(
+            self.set_user_emode_step(category_id)
+        )
+        if receipt.status == 1:
+            print(
+                f"eMode set to category {category_id}! Transaction hash: {tx_hash.hex()}"
+            )
+        else:
+            print(
+                f"eMode set to category {category_id} failed! Transaction hash: {tx_hash.hex()}"
+            )
+        return receipt
+
+    async def borrow(
+        self,
+        token_address,
+        amount,
+        interest_rate_mode=2,
+        on_behalf_of=None,
+        native=None,
+    ):
+        """
+        Borrow tokens from Aave V3 Pool
+
+        Args:
+            token_address: Token contract address to borrow
+            amount: Amount to borrow (in wei)
+            interest_rate_mode: 1 for stable, 2 for variable (default: 2)
+            on_behalf_of: Address to receive borrowed tokens (default: caller)
+            native: Receive SEI through the gateway instead of WSEI
+                (default: for WSEI when a gateway is configured)
+        """
+        if native is None:
+            native = self.uses_gateway(token_address) and on_behalf_of is None
+        if native:
+            await self._send_gateway_approvals(borrow_amount=amount)
+
+        tx_hash, receipt = await self._send_transaction(
+            self.borrow_step(
+                token_address, amount, interest_rate_mode, on_behalf_of, native
+            )
+        )
+        if receipt.status == 1:
+            print(f"Borrow successful! Transaction hash: {tx_hash.hex()}")
+        else:
+            print(f"Borrow failed! Transaction hash: {tx_hash.hex()}")
+        return receipt
+
+    async def repay(
+        self,
+        token_address,
+        amount,
+        interest_rate_mode=2,
+        on_behalf_of=None,
+        native=None,
+    ):
+        """
+        Repay borrowed tokens to Aave V3 Pool
+
+        Args:
+            token_address: Token contract address to repay
+            amount: Amount to repay (in wei). Use 2**256-1 to repay all debt
+            interest_rate_mode: 1 for stable, 2 for variable (default: 2)
+            on_behalf_of: Address whose debt to repay (default: caller)
+            native: Repay in SEI through the gateway instead of WSEI
+                (default: for WSEI when a gateway is configured)
+        """
+        if native is None:
+            native = self.uses_gateway(token_address)
+        value = None
+        if native and amount == MAX_UINT256:
+            # Send the debt plus margin, the gateway refunds what is left over
+            debt = await self.get_debt_balance(on_behalf_of)
+            value = debt + int(debt * UNWIND_INTEREST_MARGIN)
+        # First approve token spending if amount is not max uint256 and the
+        # allowance does not already cover it
+        elif (
+            not native
+            and amount != MAX_UINT256
+            and await self.get_allowance(token_address) < amount
+        ):
+            print(f"Approving {amount} tokens for repayment...")
+            await self.approve_token(token_address, self.approval_amount(amount))
+
+        tx_hash, receipt = await self._send_transaction(
+            self.repay_step(
+                token_address,
+                amount,
+                interest_rate_mode,
+                on_behalf_of,
+                native,
+                value,
+            )
+        )
+        if receipt.status == 1:
+            if amount == MAX_UINT256:
+                print(f"Full repayment successful! Transaction hash: {tx_hash.hex()}")
+            else:
+                print(f"Repayment successful! Transaction hash: {tx_hash.hex()}")
+        else:
+            print(f"Repayment failed! Transaction hash: {tx_hash.hex()}")
+        return receipt
+
+    async def withdraw(self, token_address, amount, to=None, native=None):
+        """
+        Withdraw tokens from Aave V3 Pool
+
+        Args:
+            token_address: Token contract address to withdraw
+            amount: Amount to withdraw (in wei). Use 2**256-1 to withdraw all
+            to: Address to receive withdrawn tokens (default: caller)
+            native: Receive SEI through the gateway instead of WSEI
+                (default: for WSEI when a gateway is configured)
+        """
+        if native is None:
+            native = self.uses_gateway(token_address)
+        if native:
+            withdraw_amount = amount
+            if amount == MAX_UINT256:
+                # The gateway pulls the whole (still accruing) aWSEI balance
+                atoken_balance = await self.get_atoken_balance()
+                withdraw_amount = atoken_balance + int(
+                    atoken_balance * UNWIND_INTEREST_MARGIN
+                )
+            await self._send_gateway_approvals(withdraw_amount=withdraw_amount)
+
+        tx_hash, receipt = await self._send_transaction(
+            self.withdraw_step(token_address, amount, to, native)
+        )
+        if receipt.status == 1:
+            if amount == MAX_UINT256:
+                print(f"Full withdrawal successful! Transaction hash: {tx_hash.hex()}")
+            else:
+                print(f"Withdrawal successful! Transaction hash: {tx_hash.hex()}")
+        else:
+            print(f"Withdrawal failed! Transaction hash: {tx_hash.hex()}")
+        return receipt
+
+    async def get_user_emode(self, user_address=None):
+        """
+        Get user's current eMode category
+
+        Args:
+            user_address: User address to check (default: caller)
+        """
+        if user_address is None:
+            user_address = self.address
+
+        return await self.pool_contract.functions.getUserEMode(
+            Web3.to_checksum_address(user_address)
+        ).call()
+
+    async def get_native_balance(self, address=None):
+        """
+        Get native token (SEI) balance
+
+        Args:
+            address: Address to check balance (default: caller)
+        """
+        if address is None:
+            address = self.address
+
+        return await self.w3.eth.get_balance(Web3.to_checksum_address(address))
+
+    async def get_erc20_balance(self, token_address, address=None):
+        """
+        Get ERC20 token balance
+
+        Args:
+            token_address: Token contract address
+            address: Address to check balance (default: caller)
+        """
+        if address is None:
+            address = self.address
+
+        token_contract = self.get_erc20_contract(token_address)
+        return await token_contract.functions.balanceOf(
+            Web3.to_checksum_address(address)
+        ).call()
+
+    async def get_emode_category_data(self, category_id):
+        """
+        Get eMode category parameters
+
+        Args:
+            category_id: eMode category ID
+        """
+        category_data = await self.pool_contract.functions.getEModeCategoryData(
+            category_id
+        ).call()
+
+        return {
+            "ltv": category_data[0],
+            "liquidationThreshold": category_data[1],
+            "liquidationBonus": category_data[2],
+            "priceSource": category_data[3],
+            "label": category_data[4],
+        }
+
+    async def get_user_account_data(self, user_address=None):
+        """
+        Get user's account data from Aave
+
+        Args:
+            user_address: User address to check (default: caller)
+        """
+        if user_address is None:
+            user_address = self.address
+
+        account_data = await self.pool_contract.functions.getUserAccountData(
+            Web3.to_checksum_address(user_address)
+        ).call()
+
+        return {
+            "totalCollateralBase": account_data[0],
+            "totalDebtBase": account_data[1],
+            "availableBorrowsBase": account_data[2],
+            "currentLiquidationThreshold": account_data[3],
+            "ltv": account_data[4],
+            "healthFactor": account_data[5],
+        }
+
+    async def get_reserve_data(self, token_address):
+        """
+        Get reserve data for a specific token
+
+        Args:
+            token_address: Token contract address
+        """
+        reserve_data = await self.pool_contract.functions.getReserveData(
+            Web3.to_checksum_address(token_address)
+        ).call()
+
+        return {
+            "configuration": reserve_data[0],
+            "liquidityIndex": reserve_data[1],
+            "currentLiquidityRate": reserve_data[2],
+            "variableBorrowIndex": reserve_data[3],
+            "currentVariableBorrowRate": reserve_data[4],
+            "currentStableBorrowRate": reserve_data[5],
+            "lastUpdateTimestamp": reserve_data[6],
+            "id": reserve_data[7],
+            "aTokenAddress": reserve_data[8],
+            "stableDebtTokenAddress": reserve_data[9],
+            "variableDebtTokenAddress": reserve_data[10],
+            "interestRateStrategyAddress": reserve_data[11],
+            "accruedToTreasury": reserve_data[12],
+            "unbacked": reserve_data[13],
+            "isolationModeTotalDebt": reserve_data[14],
+        }
+
+    async def get_position_snapshot(self, addresses=None):
+        """
+        Read eMode, SEI/WSEI balances, account data, aToken and debt balances
+        in one Multicall3 eth_call
+
+        Args:
+            addresses: Address or list of addresses (default: caller)
+
+        Returns:
+            PositionSnapshot, or a list of them when a list was given
+        """
+        if addresses is None:
+            addresses = self.address
+        single = isinstance(addresses, str)
+        if single:
+            addresses = [addresses]
+
+        snapshots = []
+        for batch, calls, encoded_calls in snapshot_batches(self, list(addresses)):
+            results = await self.multicall_contract.functions.aggregate3(
+                encoded_calls
+            ).call()
+            snapshots.extend(parse_snapshot_batch(batch, calls, results))
+
+        return snapshots[0] if single else snapshots
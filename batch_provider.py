@@ -0,0 +1,135 @@
+import asyncio
+import os
+
+from aiohttp import ClientSession, TCPConnector
+from web3 import AsyncWeb3
+
+RPC_BATCH_SIZE = int(os.getenv("RPC_BATCH_SIZE", "50"))
+# Keep-alive connections per RPC endpoint shared by every bot in the process
+RPC_POOL_SIZE = int(os.getenv("RPC_POOL_SIZE", "8"))
+
+# Read-only methods that are safe to group into one JSON-RPC batch
+BATCHABLE_METHODS = {
+    "eth_blockNumber",
+    "eth_call",
+    "eth_chainId",
+    "eth_gasPrice",
+    "eth_getBalance",
+    "eth_getBlockByNumber",
+    "eth_getCode",
+    "eth_getTransactionCount",
+    "eth_getTransactionReceipt",
+}
+
+
+class BatchingAsyncHTTPProvider(AsyncWeb3.AsyncHTTPProvider):
+    """
+    AsyncHTTPProvider that groups reads issued in the same event loop tick
+
+    Reads are queued and flushed on the next loop iteration as a single
+    JSON-RPC batch array (split at max_batch_size). Each response is handed
+    back to the coroutine that asked for it. Writes and any other methods are
+    sent on their own as usual.
+    """
+
+    def __init__(
+        self, endpoint_uri=None, max_batch_size=None, pool_size=None, **kwargs
+    ):
+        """
+        Args:
+            endpoint_uri: RPC endpoint URL
+            max_batch_size: Most requests per batch (default: RPC_BATCH_SIZE)
+            pool_size: Keep-alive connections to open (default: RPC_POOL_SIZE)
+        """
+        super().__init__(endpoint_uri, **kwargs)
+        self.max_batch_size = max_batch_size or RPC_BATCH_SIZE
+        self.pool_size = pool_size or RPC_POOL_SIZE
+        self._pending = []
+        self._flush_scheduled = False
+        self._batch_tasks = set()
+        self._session_loop = None
+
+    async def _ensure_session(self):
+        """
+        Cache a keep-alive session for the running loop
+
+        web3's default session closes the connection after every request, so
+        each call would pay for a new TCP and TLS handshake.
+        """
+        loop = asyncio.get_running_loop()
+        if self._session_loop is loop:
+            return
+        self._session_loop = loop
+        await self.cache_async_session(
+            ClientSession(
+                raise_for_status=True,
+                connector=TCPConnector(limit=self.pool_size),
+            )
+        )
+
+    async def make_batch_request(self, batch_requests):
+        await self._ensure_session()
+        return await super().make_batch_request(batch_requests)
+
+    async def make_request(self, method, params):
+        await self._ensure_session()
+        if method not in BATCHABLE_METHODS or self.max_batch_size <= 1:
+            return await super().make_request(method, params)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((method, params, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif not self._flush_scheduled:
+            self._flush_scheduled = True
+            loop.call_soon(self._flush)
+        return await future
+
+    def _flush(self):
+        self._flush_scheduled = False
+        pending, self._pending = self._pending, []
+        for i in range(0, len(pending), self.max_batch_size):
+            task = asyncio.create_task(
+                self._send_batch(pending[i : i + self.max_batch_size])
+            )
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _send_batch(self, batch):
+        if len(batch) == 1:
+            method, params, future = batch[0]
+            try:
+                response = await super().make_request(method, params)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                return
+            if not future.done():
+                future.set_result(response)
+            return
+
+        try:
+            responses = await self.make_batch_request(
+                [(method, params) for method, params, _ in batch]
+            )
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        if not isinstance(responses, list):
+            # The node rejected the whole batch with a single error object
+            responses = [responses] * len(batch)
+
+        # make_batch_request sorts responses by id, which follows request order
+        for i, (method, _, future) in enumerate(batch):
+            if future.done():
+                continue
+            if i < len(responses):
+                future.set_result(responses[i])
+            else:
+                future.set_exception(
+                    ValueError(f"No response for {method} in JSON-RPC batch")
+                )
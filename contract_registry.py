@@ -0,0 +1,146 @@
+import asyncio
+import json
+import os
+import threading
+
+from web3 import Web3
+
+from abi import ERC20_ABI, POOL_ABI
+from web3_pool import get_web3
+
+CHAIN_CACHE_FILE = os.getenv("CHAIN_CACHE_FILE", "chain_cache.json")
+
+
+class ContractRegistry:
+    """
+    Builds each contract object once and remembers chain metadata on disk
+
+    Contract objects are cached per (Web3 instance, address, ABI). The chain
+    id, token decimals and reserve token addresses discovered through
+    getReserveData are written to CHAIN_CACHE_FILE, keyed by Pool address, so
+    later runs start without any discovery RPCs. Discovery itself always goes
+    through the shared sync Web3; coroutines use the async_* accessors,
+    which answer from memory once cached and otherwise run the discovery in
+    a thread instead of blocking the event loop.
+    """
+
+    _registries = {}
+    _registries_lock = threading.Lock()
+
+    def __init__(self, rpc_url, pool_address, cache_file=CHAIN_CACHE_FILE):
+        """
+        Args:
+            rpc_url: RPC endpoint used for discovery
+            pool_address: Aave V3 Pool contract address
+            cache_file: JSON file to persist chain metadata in
+        """
+        self.rpc_url = rpc_url
+        self.pool_address = Web3.to_checksum_address(pool_address)
+        self.cache_file = cache_file
+        self._contracts = {}
+        self._lock = threading.RLock()
+        self._metadata = self._load().get(self.pool_address, {})
+        self._metadata.setdefault("decimals", {})
+        self._metadata.setdefault("reserves", {})
+
+    @classmethod
+    def shared(cls, rpc_url, pool_address):
+        """Get the registry shared by every bot using this Pool"""
+        with cls._registries_lock:
+            registry = cls._registries.get(pool_address)
+            if registry is None:
+                registry = cls(rpc_url, pool_address)
+                cls._registries[pool_address] = registry
+            return registry
+
+    def _load(self):
+        try:
+            with open(self.cache_file, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save(self):
+        cache = self._load()
+        cache[self.pool_address] = self._metadata
+        tmp_file = f"{self.cache_file}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(cache, f, indent=2)
+        os.replace(tmp_file, self.cache_file)
+
+    def contract(self, w3, address, abi):
+        """Get the contract object for address, building it on first use"""
+        address = Web3.to_checksum_address(address)
+        key = (id(w3), address, id(abi))
+        contract = self._contracts.get(key)
+        if contract is None:
+            contract = w3.eth.contract(address=address, abi=abi)
+            with self._lock:
+                self._contracts[key] = contract
+        return contract
+
+    def chain_id(self):
+        """Chain ID of the network, fetched once per cache file"""
+        with self._lock:
+            if "chainId" not in self._metadata:
+                self._metadata["chainId"] = get_web3(self.rpc_url).eth.chain_id
+                self._save()
+            return self._metadata["chainId"]
+
+    def decimals(self, token_address):
+        """ERC20 decimals of a token, fetched once per cache file"""
+        token_address = Web3.to_checksum_address(token_address)
+        with self._lock:
+            if token_address not in self._metadata["decimals"]:
+                w3 = get_web3(self.rpc_url)
+                token_contract = self.contract(w3, token_address, ERC20_ABI)
+                decimals = token_contract.functions.decimals().call()
+                self._metadata["decimals"][token_address] = decimals
+                self._save()
+            return self._metadata["decimals"][token_address]
+
+    def reserve_tokens(self, asset_address):
+        """
+        aToken and debt token addresses of a reserve, discovered once through
+        getReserveData
+        """
+        asset_address = Web3.to_checksum_address(asset_address)
+        with self._lock:
+            if asset_address not in self._metadata["reserves"]:
+                w3 = get_web3(self.rpc_url)
+                pool_contract = self.contract(w3, self.pool_address, POOL_ABI)
+                reserve_data = pool_contract.functions.getReserveData(
+                    asset_address
+                ).call()
+                self._metadata["reserves"][asset_address] = {
+                    "aTokenAddress": reserve_data[8],
+                    "stableDebtTokenAddress": reserve_data[9],
+                    "variableDebtTokenAddress": reserve_data[10],
+                }
+                self._save()
+            return self._metadata["reserves"][asset_address]
+
+    async def async_chain_id(self):
+        """chain_id() for coroutines"""
+        chain_id = self._metadata.get("chainId")
+        if chain_id is None:
+            chain_id = await asyncio.to_thread(self.chain_id)
+        return chain_id
+
+    async def async_decimals(self, token_address):
+        """decimals() for coroutines"""
+        token_address = Web3.to_checksum_address(token_address)
+        decimals = self._metadata["decimals"].get(token_address)
+        if decimals is None:
+            decimals = await asyncio.to_thread(self.decimals, token_address)
+        return decimals
+
+    async def async_reserve_tokens(self, asset_address):
+        """reserve_tokens() for coroutines"""
+        asset_address = Web3.to_checksum_address(asset_address)
+        reserve_tokens = self._metadata["reserves"].get(asset_address)
+        if reserve_tokens is None:
+            reserve_tokens = await asyncio.to_thread(
+                self.reserve_tokens, asset_address
+            )
+        return reserve_tokens
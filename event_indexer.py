@@ -0,0 +1,537 @@
+#!/usr/bin/env python3
+"""
+Index the fleet's Pool and token events into SQLite
+
+Scans the Pool's Supply, Borrow, Repay and Withdraw events and the ERC20
+Transfers of WSEI, its aToken and debt token (plus INDEXER_TOKENS) for every
+address in the wallets file with eth_getLogs, filtering on the indexed
+wallet topics so only the fleet's logs come back. Blocks are read in ranges
+that double after each success and halve whenever the node answers that a
+query matched too many logs or spanned too many blocks.
+
+Every wallet carries its own checkpoint, moved in the same SQLite
+transaction as the events of each range, so an interrupted scan resumes
+after the last range it stored and wallets added to the file later are
+backfilled from INDEXER_START_BLOCK until they catch up with the rest.
+Reports on what the fleet did are then local queries instead of balance
+reads per wallet.
+"""
+
+import argparse
+import os
+import sqlite3
+import time
+from collections import defaultdict
+
+from dotenv import load_dotenv
+from eth_utils.abi import event_abi_to_log_topic
+from web3 import Web3
+
+from abi import ERC20_ABI, POOL_ABI
+from contract_registry import ContractRegistry
+from wallet_store import WalletStore
+from web3_pool import get_web3
+
+load_dotenv()
+
+INDEXER_DB = os.getenv("INDEXER_DB", "events.sqlite")
+# First block scanned for a wallet, e.g. the Pool's deployment
+INDEXER_START_BLOCK = int(os.getenv("INDEXER_START_BLOCK", "0"))
+# Blocks per eth_getLogs range to start from and to grow up to
+INDEXER_CHUNK_SIZE = int(os.getenv("INDEXER_CHUNK_SIZE", "2000"))
+INDEXER_MAX_CHUNK_SIZE = int(os.getenv("INDEXER_MAX_CHUNK_SIZE", "50000"))
+# Blocks behind the head left unindexed, so reorged logs are never stored
+INDEXER_CONFIRMATIONS = int(os.getenv("INDEXER_CONFIRMATIONS", "2"))
+# Extra ERC20s whose transfers are indexed, comma-separated
+INDEXER_TOKENS = os.getenv("INDEXER_TOKENS", "")
+# Seconds between scans with --follow
+INDEXER_POLL_INTERVAL = float(os.getenv("INDEXER_POLL_INTERVAL", "5"))
+
+# Wallet topics per eth_getLogs filter, nodes cap the length of OR lists
+TOPIC_BATCH = 100
+
+RANGE_ERROR_MESSAGES = (
+    "more than",
+    "too many",
+    "limit exceeded",
+    "block range",
+    "range too large",
+    "response size",
+    "query timeout",
+)
+
+POOL_EVENTS = {
+    event_abi_to_log_topic(event): event["name"]
+    for event in POOL_ABI
+    if event["type"] == "event"
+}
+TRANSFER_TOPIC = next(
+    event_abi_to_log_topic(event)
+    for event in ERC20_ABI
+    if event["type"] == "event" and event["name"] == "Transfer"
+)
+
+
+def is_range_error(error):
+    """Check whether an eth_getLogs error asks for a smaller block range"""
+    message = str(error).lower()
+    return any(text in message for text in RANGE_ERROR_MESSAGES)
+
+
+def _topic(address):
+    """An address as an indexed event topic"""
+    return "0x" + "00" * 12 + address.lower()[2:]
+
+
+class EventIndex:
+    """
+    SQLite store of the fleet's events and per-wallet scan checkpoints
+
+    Amounts are kept as decimal strings since uint256 overflows SQLite
+    integers; queries that add them up do so in Python.
+    """
+
+    def __init__(self, db_path):
+        """
+        Args:
+            db_path: SQLite file, created if missing
+        """
+        self.db_path = db_path
+        # Autocommit, transactions are opened explicitly where needed
+        self._db = sqlite3.connect(db_path, isolation_level=None)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS events (block INTEGER, log_index INTEGER, "
+            "tx_hash TEXT, timestamp INTEGER, wallet TEXT, event TEXT, asset TEXT, "
+            "counterparty TEXT, amount TEXT, "
+            "PRIMARY KEY (tx_hash, log_index, wallet, event))"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS events_wallet ON events (wallet, block)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS events_timestamp ON events (timestamp)"
+        )
+        # Last block scanned for each wallet
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS wallets "
+            "(address TEXT PRIMARY KEY, block INTEGER)"
+        )
+
+    def add_wallets(self, addresses, block):
+        """Start checkpoints for wallets not indexed yet, as scanned up to block"""
+        self._db.execute("BEGIN")
+        self._db.executemany(
+            "INSERT OR IGNORE INTO wallets VALUES (?, ?)",
+            ((address.lower(), block) for address in addresses),
+        )
+        self._db.execute("COMMIT")
+
+    def checkpoints(self, addresses):
+        """
+        Group wallets by the last block scanned for them
+
+        Returns:
+            {block: [address]} for the given addresses that have a checkpoint
+        """
+        wanted = {address.lower() for address in addresses}
+        groups = defaultdict(list)
+        for address, block in self._db.execute("SELECT address, block FROM wallets"):
+            if address in wanted:
+                groups[block].append(address)
+        return groups
+
+    def store(self, rows, addresses, block):
+        """
+        Store a range's events and move its wallets' checkpoints in one go
+
+        Args:
+            rows: (block, log_index, tx_hash, timestamp, wallet, event, asset,
+                counterparty, amount) tuples; ones already stored are skipped
+            addresses: Wallets the range was scanned for
+            block: Last block of the range
+        """
+        db = self._db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.executemany(
+                "INSERT OR IGNORE INTO events VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            db.executemany(
+                "UPDATE wallets SET block = ? WHERE address = ?",
+                ((block, address) for address in addresses),
+            )
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def history(self, address, since=None):
+        """
+        A wallet's events, oldest first
+
+        Args:
+            address: Wallet address
+            since: Only events at or after this Unix timestamp
+
+        Returns:
+            List of dicts with block, tx_hash, timestamp, event, asset,
+            counterparty and amount
+        """
+        rows = self._db.execute(
+            "SELECT block, tx_hash, timestamp, event, asset, counterparty, amount "
+            "FROM events WHERE wallet = ? AND timestamp >= ? "
+            "ORDER BY block, log_index",
+            (address.lower(), since or 0),
+        )
+        return [
+            {
+                "block": block,
+                "tx_hash": tx_hash,
+                "timestamp": timestamp,
+                "event": event,
+                "asset": asset,
+                "counterparty": counterparty,
+                "amount": int(amount),
+            }
+            for block, tx_hash, timestamp, event, asset, counterparty, amount in rows
+        ]
+
+    def totals(self, since=None):
+        """
+        Fleet-wide sums per wallet, event and asset
+
+        Args:
+            since: Only events at or after this Unix timestamp
+
+        Returns:
+            {wallet: {(event, asset): amount}}
+        """
+        totals = defaultdict(lambda: defaultdict(int))
+        for wallet, event, asset, amount in self._db.execute(
+            "SELECT wallet, event, asset, amount FROM events WHERE timestamp >= ?",
+            (since or 0,),
+        ):
+            totals[wallet][(event, asset)] += int(amount)
+        return totals
+
+    def positions(self):
+        """
+        Every wallet's supplied and borrowed principal per reserve
+
+        Sums of Supply minus Withdraw and Borrow minus Repay, without the
+        interest accrued since; reserve_state projects that part.
+
+        Returns:
+            {wallet: {asset: (supplied, borrowed)}}, closed positions left out
+        """
+        positions = {}
+        for wallet, totals in self.totals().items():
+            assets = {}
+            for event, asset in list(totals):
+                if event not in POOL_EVENTS.values():
+                    continue
+                supplied = totals[("Supply", asset)] - totals[("Withdraw", asset)]
+                borrowed = totals[("Borrow", asset)] - totals[("Repay", asset)]
+                if supplied > 0 or borrowed > 0:
+                    assets[asset] = (max(supplied, 0), max(borrowed, 0))
+            if assets:
+                positions[wallet] = assets
+        return positions
+
+
+class EventIndexer:
+    """
+    Scans the fleet's Pool and token events into an EventIndex
+
+    The range size adapts to the node: it halves on errors saying a query
+    was too large and doubles back after each range that went through.
+    """
+
+    def __init__(
+        self,
+        w3,
+        index,
+        pool_address,
+        tokens=(),
+        a_tokens=None,
+        gateway_address=None,
+        start_block=0,
+        chunk_size=2000,
+        max_chunk_size=50000,
+        confirmations=2,
+    ):
+        """
+        Args:
+            w3: Web3 to read logs and block timestamps with
+            index: EventIndex to store into
+            pool_address: Pool whose events are indexed
+            tokens: ERC20s whose transfers are indexed
+            a_tokens: {aToken: reserve} for recognizing withdrawals through the
+                gateway, which only show up as an aToken transfer to it
+            gateway_address: WrappedTokenGateway address, if any
+            start_block: First block scanned for a new wallet
+            chunk_size: Blocks per range to start with
+            max_chunk_size: Most blocks per range
+            confirmations: Blocks behind the head left unindexed
+        """
+        self.w3 = w3
+        self.index = index
+        self.pool_address = Web3.to_checksum_address(pool_address)
+        self.tokens = [Web3.to_checksum_address(token) for token in tokens]
+        a_tokens = a_tokens or {}
+        self.a_tokens = {
+            token.lower(): reserve.lower() for token, reserve in a_tokens.items()
+        }
+        self.gateway_address = gateway_address.lower() if gateway_address else None
+        self.start_block = start_block
+        self.chunk_size = chunk_size
+        self.max_chunk_size = max_chunk_size
+        self.confirmations = confirmations
+        pool_contract = w3.eth.contract(abi=POOL_ABI)
+        token_contract = w3.eth.contract(abi=ERC20_ABI)
+        self._events = {
+            topic: getattr(pool_contract.events, name)()
+            for topic, name in POOL_EVENTS.items()
+        }
+        self._events[TRANSFER_TOPIC] = token_contract.events.Transfer()
+
+    def _get_logs(self, addresses, from_block, to_block):
+        topics = [_topic(address) for address in addresses]
+        pool_topics = ["0x" + topic.hex() for topic in POOL_EVENTS]
+        transfer_topic = "0x" + TRANSFER_TOPIC.hex()
+        logs = []
+        for i in range(0, len(topics), TOPIC_BATCH):
+            batch = topics[i : i + TOPIC_BATCH]
+            queries = [(self.pool_address, [pool_topics, None, batch])]
+            if self.tokens:
+                # Transfers from and to the fleet take one query each
+                queries += [
+                    (self.tokens, [transfer_topic, batch]),
+                    (self.tokens, [transfer_topic, None, batch]),
+                ]
+            for address, query_topics in queries:
+                logs += self.w3.eth.get_logs(
+                    {
+                        "fromBlock": from_block,
+                        "toBlock": to_block,
+                        "address": address,
+                        "topics": query_topics,
+                    }
+                )
+        return logs
+
+    def _rows(self, log, wallets, timestamp):
+        event = self._events[bytes(log["topics"][0])]
+        args = event.process_log(log)["args"]
+        name = event.event_name
+        contract = log["address"].lower()
+        if name == "Transfer":
+            sender = args["from"].lower()
+            to = args["to"].lower()
+            entries = []
+            if sender in wallets:
+                entries.append((sender, "TransferOut", contract, to))
+                if to == self.gateway_address and contract in self.a_tokens:
+                    # withdrawETH: the gateway pulls the aTokens and withdraws
+                    # as itself, so the Pool's event does not name the wallet
+                    reserve = self.a_tokens[contract]
+                    entries.append((sender, "Withdraw", reserve, to))
+            if to in wallets:
+                entries.append((to, "TransferIn", contract, sender))
+            amount = args["value"]
+        else:
+            # The wallet whose position changed, and who paid or got the funds
+            wallet_arg, counterparty_arg = {
+                "Supply": ("onBehalfOf", "user"),
+                "Borrow": ("onBehalfOf", "user"),
+                "Repay": ("user", "repayer"),
+                "Withdraw": ("user", "to"),
+            }[name]
+            entries = [
+                (
+                    args[wallet_arg].lower(),
+                    name,
+                    args["reserve"].lower(),
+                    args[counterparty_arg].lower(),
+                )
+            ]
+            amount = args["amount"]
+        return [
+            (
+                log["blockNumber"],
+                log["logIndex"],
+                "0x" + bytes(log["transactionHash"]).hex(),
+                timestamp,
+                wallet,
+                name,
+                asset,
+                counterparty,
+                str(amount),
+            )
+            for wallet, name, asset, counterparty in entries
+            if wallet in wallets
+        ]
+
+    def scan_range(self, addresses, from_block, to_block):
+        """
+        Read and decode the wallets' events in a block range
+
+        Returns:
+            Rows for EventIndex.store
+        """
+        wallets = set(addresses)
+        logs = self._get_logs(addresses, from_block, to_block)
+        timestamps = {}
+        rows = []
+        for log in logs:
+            block = log["blockNumber"]
+            if block not in timestamps:
+                timestamps[block] = self.w3.eth.get_block(block)["timestamp"]
+            rows += self._rows(log, wallets, timestamps[block])
+        return rows
+
+    def _scan(self, addresses, from_block, to_block):
+        start = from_block
+        while start <= to_block:
+            end = min(start + self.chunk_size - 1, to_block)
+            try:
+                rows = self.scan_range(addresses, start, end)
+            except Exception as e:
+                if end == start or not is_range_error(e):
+                    raise
+                self.chunk_size = max(self.chunk_size // 2, 1)
+                print(
+                    f"Blocks {start}-{end} too large for one query, "
+                    f"retrying with {self.chunk_size} blocks: {e}"
+                )
+                continue
+            self.index.store(rows, addresses, end)
+            print(
+                f"Indexed blocks {start}-{end} for {len(addresses)} wallets: "
+                f"{len(rows)} events"
+            )
+            start = end + 1
+            self.chunk_size = min(self.chunk_size * 2, self.max_chunk_size)
+
+    def sync(self, addresses):
+        """
+        Index the wallets' events up to the latest confirmed block
+
+        Wallets behind the others, e.g. just added, are caught up first, so
+        every wallet ends at the same block and later syncs scan them in one
+        pass.
+
+        Returns:
+            The last indexed block
+        """
+        addresses = [address.lower() for address in addresses]
+        head = self.w3.eth.block_number - self.confirmations
+        self.index.add_wallets(addresses, self.start_block - 1)
+        while True:
+            groups = self.index.checkpoints(addresses)
+            block = min(groups, default=head)
+            if block >= head:
+                return block
+            # Stop at the next group's checkpoint, where the two merge
+            later = [checkpoint for checkpoint in groups if checkpoint > block]
+            target = min(later + [head])
+            self._scan(groups[block], block + 1, target)
+
+
+def _format_amount(registry, asset, amount):
+    return f"{amount / 10 ** registry.decimals(Web3.to_checksum_address(asset)):.6f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="將錢包的 Pool 與代幣事件索引到 SQLite，報表改為本地查詢",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+範例：
+  python event_indexer.py
+  python event_indexer.py --follow
+  python event_indexer.py --report --since 1754524800
+  python event_indexer.py --history 0x1234...
+        """,
+    )
+    parser.add_argument(
+        "--wallets",
+        default=os.getenv("WALLETS_FILE", "wallets.json"),
+        help="錢包檔案（預設：WALLETS_FILE 或 wallets.json）",
+    )
+    parser.add_argument(
+        "--db",
+        default=INDEXER_DB,
+        help="事件資料庫（預設：INDEXER_DB 或 events.sqlite）",
+    )
+    parser.add_argument(
+        "--follow", action="store_true", help="索引到最新區塊後持續追蹤新區塊"
+    )
+    parser.add_argument(
+        "--report", action="store_true", help="不掃描，列出各錢包的倉位與事件總額"
+    )
+    parser.add_argument("--history", metavar="ADDRESS", help="不掃描，列出單一錢包的事件")
+    parser.add_argument(
+        "--since", type=int, help="報表與歷史只計入此 Unix 時間戳記之後的事件"
+    )
+    args = parser.parse_args()
+
+    rpc_url = os.getenv("RPC_URL")
+    pool_address = os.getenv("POOL_ADDRESS")
+    wsei_address = os.getenv("WSEI_ADDRESS")
+    registry = ContractRegistry.shared(rpc_url, pool_address)
+    index = EventIndex(args.db)
+
+    if args.history:
+        for event in index.history(args.history, args.since):
+            amount = _format_amount(registry, event["asset"], event["amount"])
+            print(
+                f"{event['block']} {event['tx_hash']} {event['event']} "
+                f"{event['asset']} {amount} {event['counterparty']}"
+            )
+        return
+    if args.report:
+        totals = index.totals(args.since)
+        positions = index.positions()
+        print(f"{len(positions)} 個錢包有未平倉部位")
+        for wallet in sorted(set(totals) | set(positions)):
+            print(wallet)
+            for asset, (supplied, borrowed) in positions.get(wallet, {}).items():
+                print(
+                    f"  部位 {asset} 供應 {_format_amount(registry, asset, supplied)}"
+                    f" 借款 {_format_amount(registry, asset, borrowed)}"
+                )
+            for (event, asset), amount in sorted(totals[wallet].items()):
+                print(f"  {event} {asset} {_format_amount(registry, asset, amount)}")
+        return
+
+    reserve_tokens = registry.reserve_tokens(wsei_address)
+    a_token = os.getenv("ATOKEN_ADDRESS") or reserve_tokens["aTokenAddress"]
+    debt_token = os.getenv("DEBT_ADDRESS") or reserve_tokens["variableDebtTokenAddress"]
+    tokens = [wsei_address, a_token, debt_token]
+    tokens += [token.strip() for token in INDEXER_TOKENS.split(",") if token.strip()]
+    indexer = EventIndexer(
+        get_web3(rpc_url),
+        index,
+        pool_address,
+        tokens,
+        a_tokens={a_token: wsei_address},
+        gateway_address=os.getenv("WRAPPED_TOKEN_GATEWAY_ADDRESS"),
+        start_block=INDEXER_START_BLOCK,
+        chunk_size=INDEXER_CHUNK_SIZE,
+        max_chunk_size=INDEXER_MAX_CHUNK_SIZE,
+        confirmations=INDEXER_CONFIRMATIONS,
+    )
+    addresses = list(WalletStore(args.wallets).addresses())
+    print(f"索引 {len(addresses)} 個錢包的事件至 {args.db}")
+    while True:
+        block = indexer.sync(addresses)
+        print(f"已索引至區塊 {block}")
+        if not args.follow:
+            break
+        time.sleep(INDEXER_POLL_INTERVAL)
+
+
+if __name__ == "__main__":
+    main()
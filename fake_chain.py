@@ -0,0 +1,1143 @@
+#!/usr/bin/env python3
+"""
+In-memory stand-in for the Sei chain, for running the bots offline
+
+Models the Aave V3 Pool (supply, borrow, repay, withdraw, setUserEMode,
+getUserAccountData, getReserveData, getEModeCategoryData), the
+WrappedTokenGateway for native SEI, WSEI deposits, ERC20 balances and
+approvals, the reserves' aToken and debt token balances, credit delegation
+and Multicall3, with the Pool's and ERC20 events served by eth_getLogs.
+Point RPC_URL at fake:// and get_web3 / get_async_web3 hand out providers
+backed by one shared FakeChain.
+"""
+
+import argparse
+import asyncio
+import bisect
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+import rlp
+from eth_abi import decode, encode
+from eth_account import Account
+from eth_account.typed_transactions import TypedTransaction
+from eth_utils import keccak
+from eth_utils.abi import (
+    collapse_if_tuple,
+    event_abi_to_log_topic,
+    function_abi_to_4byte_selector,
+)
+from web3 import Web3
+from web3.providers import AsyncBaseProvider, BaseProvider
+
+from abi import (
+    DEBT_TOKEN_ABI,
+    ERC20_ABI,
+    MULTICALL3_ABI,
+    POOL_ABI,
+    WRAPPED_TOKEN_GATEWAY_ABI,
+    WSEI_ABI,
+)
+from multicall import MULTICALL3_ADDRESS
+from pipeline import MAX_UINT256
+
+FAKE_RPC_SCHEME = "fake://"
+# Seconds between blocks (0 mines every transaction as soon as it is sent)
+FAKE_CHAIN_BLOCK_TIME = float(os.getenv("FAKE_CHAIN_BLOCK_TIME", "0.4"))
+# Simulated round trip added to every RPC request, in seconds
+FAKE_CHAIN_LATENCY = float(os.getenv("FAKE_CHAIN_LATENCY", "0.05"))
+# SEI every address starts with
+FAKE_CHAIN_FUNDING = int(float(os.getenv("FAKE_CHAIN_FUNDING", "1000")) * 1e18)
+FAKE_CHAIN_ID = int(os.getenv("FAKE_CHAIN_ID", "1329"))
+# Most logs one eth_getLogs may return, like the caps real nodes put on it
+FAKE_CHAIN_MAX_LOGS = int(os.getenv("FAKE_CHAIN_MAX_LOGS", "10000"))
+
+# Same USDC reserve main2.py borrows from
+USDC_ADDRESS = "0x9cc91646ab84efa26469db98592f28B8b729C1c3"
+
+BPS = 10000
+WAD = 10**18
+RAY = 10**27
+GAS_PRICE = Web3.to_wei(1, "gwei")
+# Rough gasUsed of each call on the real contracts
+GAS_USED = {
+    "approve": 46000,
+    "approveDelegation": 50000,
+    "borrow": 260000,
+    "borrowETH": 300000,
+    "deposit": 45000,
+    "depositETH": 230000,
+    "repay": 180000,
+    "repayETH": 220000,
+    "setUserEMode": 70000,
+    "supply": 190000,
+    "withdraw": 210000,
+    "withdrawETH": 260000,
+}
+TRANSFER_GAS = 21000
+REVERT_GAS = 35000
+ERROR_SELECTOR = bytes.fromhex("08c379a0")  # Error(string)
+
+
+def fake_address(label):
+    """Deterministic address for a contract the environment does not name"""
+    return Web3.to_checksum_address(keccak(text=f"fake-chain:{label}")[-20:])
+
+
+class Revert(Exception):
+    """A call reverted; the message is the revert reason"""
+
+
+class FakeChainError(Exception):
+    """A JSON-RPC error returned to the caller"""
+
+    def __init__(self, message, code=-32000, data=None):
+        super().__init__(message)
+        self.code = code
+        self.data = data
+
+
+@dataclass
+class FakeReserve:
+    """Risk parameters of one Pool reserve (ltv and thresholds in bps)"""
+
+    asset: str
+    decimals: int
+    # Price in the Pool's base currency (USD with 8 decimals)
+    price: int
+    ltv: int
+    liquidation_threshold: int
+    liquidation_bonus: int
+    id: int
+    emode_category: int = 0
+    a_token: str = None
+    debt_token: str = None
+
+    @property
+    def configuration(self):
+        return (
+            self.ltv
+            | self.liquidation_threshold << 16
+            | self.liquidation_bonus << 32
+            | self.decimals << 48
+        )
+
+
+class FakeContract:
+    """Base for the fake contracts: dispatches calldata to methods by selector"""
+
+    abi = []
+
+    def __init__(self, chain, address):
+        self.chain = chain
+        self.address = address
+        self.functions = {
+            function_abi_to_4byte_selector(fn): fn
+            for fn in self.abi
+            if fn["type"] == "function"
+        }
+        self.events = {
+            event["name"]: event for event in self.abi if event["type"] == "event"
+        }
+
+    def call(self, sender, value, data):
+        fn = self.functions.get(bytes(data[:4]))
+        if fn is None:
+            raise Revert(f"unknown selector 0x{bytes(data[:4]).hex()}")
+        if value and fn.get("stateMutability") != "payable":
+            raise Revert(f"{fn['name']} is not payable")
+        input_types = [collapse_if_tuple(arg) for arg in fn["inputs"]]
+        args = decode(input_types, bytes(data[4:]))
+        result = getattr(self, fn["name"])(sender, value, *args)
+        output_types = [collapse_if_tuple(arg) for arg in fn["outputs"]]
+        return fn["name"], encode(output_types, result)
+
+    def emit(self, name, *args):
+        """Log one of the contract's events, args in ABI order"""
+        event = self.events[name]
+        topics = [event_abi_to_log_topic(event)]
+        data_types = []
+        data = []
+        for arg, value in zip(event["inputs"], args):
+            if arg["indexed"]:
+                topics.append(encode([arg["type"]], [value]))
+            else:
+                data_types.append(arg["type"])
+                data.append(value)
+        self.chain.log(self.address, topics, encode(data_types, data))
+
+
+class FakeToken(FakeContract):
+    abi = ERC20_ABI
+
+    def __init__(self, chain, address, decimals=18):
+        super().__init__(chain, address)
+        self.token_decimals = decimals
+
+    def approve(self, sender, value, spender, amount):
+        self.chain.write(
+            self.chain.allowances,
+            (self.address, sender, Web3.to_checksum_address(spender)),
+            amount,
+        )
+        return (True,)
+
+    def allowance(self, sender, value, owner, spender):
+        return (
+            self.chain.allowance(
+                self.address,
+                Web3.to_checksum_address(owner),
+                Web3.to_checksum_address(spender),
+            ),
+        )
+
+    def balanceOf(self, sender, value, account):
+        return (self.chain.token_balance(self.address, account),)
+
+    def decimals(self, sender, value):
+        return (self.token_decimals,)
+
+
+class FakeWrappedToken(FakeToken):
+    abi = WSEI_ABI + ERC20_ABI
+
+    def deposit(self, sender, value):
+        # The SEI itself already moved to this contract with the call value
+        self.chain.mint(self.address, sender, value)
+        return ()
+
+
+class FakeReserveToken(FakeToken):
+    """aToken or variable debt token, whose balances live in the Pool"""
+
+    abi = DEBT_TOKEN_ABI
+
+    def __init__(self, chain, address, reserve, balances):
+        super().__init__(chain, address, reserve.decimals)
+        self.reserve = reserve
+        self.balances = balances
+
+    def balanceOf(self, sender, value, account):
+        key = (Web3.to_checksum_address(account), self.reserve.asset)
+        return (self.balances.get(key, 0),)
+
+    def scaledBalanceOf(self, sender, value, user):
+        # Indexes never move from RAY here, so scaled and actual balances match
+        return self.balanceOf(sender, value, user)
+
+    def approveDelegation(self, sender, value, delegatee, amount):
+        self.chain.write(
+            self.chain.allowances,
+            (self.address, sender, Web3.to_checksum_address(delegatee)),
+            amount,
+        )
+        return ()
+
+    def borrowAllowance(self, sender, value, from_user, to_user):
+        return (
+            self.chain.allowance(
+                self.address,
+                Web3.to_checksum_address(from_user),
+                Web3.to_checksum_address(to_user),
+            ),
+        )
+
+
+class FakeMulticall(FakeContract):
+    abi = MULTICALL3_ABI
+
+    def aggregate3(self, sender, value, calls):
+        results = []
+        for target, allow_failure, call_data in calls:
+            try:
+                _, output = self.chain.execute(self.address, target, 0, call_data)
+            except Revert as e:
+                if not allow_failure:
+                    raise
+                results.append((False, revert_data(str(e))))
+            else:
+                results.append((True, output))
+        return (results,)
+
+    def getEthBalance(self, sender, value, addr):
+        return (self.chain.native_balance(addr),)
+
+
+class FakePool(FakeContract):
+    abi = POOL_ABI
+
+    def __init__(self, chain, address, reserves, emode_categories):
+        """
+        Args:
+            chain: FakeChain holding the balances
+            address: Pool address
+            reserves: FakeReserves, with a_token / debt_token filled in
+            emode_categories: {id: (ltv, liquidationThreshold, bonus, label)}
+        """
+        super().__init__(chain, address)
+        self.reserves = {reserve.asset: reserve for reserve in reserves}
+        self.emode_categories = emode_categories
+        self.supplied = {}
+        self.borrowed = {}
+        self.user_emode = {}
+
+    def _reserve(self, asset):
+        reserve = self.reserves.get(Web3.to_checksum_address(asset))
+        if reserve is None:
+            raise Revert("reserve not active")
+        return reserve
+
+    def account_data(self, user, supplied=None, borrowed=None, emode=None):
+        """
+        getUserAccountData, optionally for a hypothetical position
+
+        Args:
+            user: Account to compute the position of
+            supplied: {asset: amount} overriding the user's supplied balances
+            borrowed: {asset: amount} overriding the user's debt
+            emode: eMode category overriding the user's
+        """
+        supplied = supplied or {}
+        borrowed = borrowed or {}
+        emode = self.user_emode.get(user, 0) if emode is None else emode
+
+        collateral = debt = weighted_ltv = weighted_threshold = 0
+        for reserve in self.reserves.values():
+            unit = 10**reserve.decimals
+            ltv, threshold = reserve.ltv, reserve.liquidation_threshold
+            if emode and reserve.emode_category == emode:
+                ltv, threshold = self.emode_categories[emode][:2]
+            key = (user, reserve.asset)
+            amount = supplied.get(reserve.asset, self.supplied.get(key, 0))
+            value = amount * reserve.price // unit
+            collateral += value
+            weighted_ltv += value * ltv
+            weighted_threshold += value * threshold
+            amount = borrowed.get(reserve.asset, self.borrowed.get(key, 0))
+            debt += amount * reserve.price // unit
+
+        ltv = weighted_ltv // collateral if collateral else 0
+        threshold = weighted_threshold // collateral if collateral else 0
+        available = max(collateral * ltv // BPS - debt, 0)
+        if debt:
+            health_factor = collateral * threshold * WAD // (BPS * debt)
+        else:
+            health_factor = MAX_UINT256
+        return collateral, debt, available, threshold, ltv, health_factor
+
+    def _check_health(self, user, **position):
+        *_, health_factor = self.account_data(user, **position)
+        if health_factor < WAD:
+            raise Revert("health factor lower than liquidation threshold")
+
+    def supply(self, sender, value, asset, amount, on_behalf_of, referral_code):
+        reserve = self._reserve(asset)
+        on_behalf_of = Web3.to_checksum_address(on_behalf_of)
+        if amount == 0:
+            raise Revert("invalid amount")
+        self.chain.transfer_from(reserve.asset, sender, self.address, amount)
+        key = (on_behalf_of, reserve.asset)
+        self.chain.write(self.supplied, key, self.supplied.get(key, 0) + amount)
+        self.emit("Supply", reserve.asset, sender, on_behalf_of, amount, referral_code)
+        return ()
+
+    def borrow(
+        self, sender, value, asset, amount, rate_mode, referral_code, on_behalf_of
+    ):
+        reserve = self._reserve(asset)
+        on_behalf_of = Web3.to_checksum_address(on_behalf_of)
+        if amount == 0:
+            raise Revert("invalid amount")
+        if on_behalf_of != sender:
+            # Credit delegation, as the gateway's borrowETH uses
+            self.chain.spend_allowance(reserve.debt_token, on_behalf_of, sender, amount)
+        emode = self.user_emode.get(on_behalf_of, 0)
+        if emode and reserve.emode_category != emode:
+            raise Revert("inconsistent eMode category")
+
+        key = (on_behalf_of, reserve.asset)
+        borrowed = {reserve.asset: self.borrowed.get(key, 0) + amount}
+        collateral, debt, _, _, ltv, _ = self.account_data(
+            on_behalf_of, borrowed=borrowed
+        )
+        if debt > collateral * ltv // BPS:
+            raise Revert("collateral cannot cover new borrow")
+        self._check_health(on_behalf_of, borrowed=borrowed)
+        if self.chain.token_balance(reserve.asset, self.address) < amount:
+            raise Revert("not enough available liquidity")
+
+        self.chain.write(self.borrowed, key, borrowed[reserve.asset])
+        self.chain.transfer(reserve.asset, self.address, sender, amount)
+        self.emit(
+            "Borrow",
+            reserve.asset,
+            sender,
+            on_behalf_of,
+            amount,
+            rate_mode,
+            0,
+            referral_code,
+        )
+        return ()
+
+    def repay(self, sender, value, asset, amount, rate_mode, on_behalf_of):
+        reserve = self._reserve(asset)
+        on_behalf_of = Web3.to_checksum_address(on_behalf_of)
+        key = (on_behalf_of, reserve.asset)
+        debt = self.borrowed.get(key, 0)
+        if debt == 0:
+            raise Revert("no debt of selected type")
+        if amount == MAX_UINT256 and on_behalf_of != sender:
+            raise Revert("no explicit amount to repay on behalf")
+        paid = min(amount, debt)
+
+        self.chain.transfer_from(reserve.asset, sender, self.address, paid)
+        self.chain.write(self.borrowed, key, debt - paid)
+        self.emit("Repay", reserve.asset, on_behalf_of, sender, paid, False)
+        return (paid,)
+
+    def withdraw(self, sender, value, asset, amount, to):
+        reserve = self._reserve(asset)
+        key = (sender, reserve.asset)
+        balance = self.supplied.get(key, 0)
+        if amount == MAX_UINT256:
+            amount = balance
+        if amount == 0 or amount > balance:
+            raise Revert("not enough available user balance")
+
+        self._check_health(sender, supplied={reserve.asset: balance - amount})
+
+        self.chain.write(self.supplied, key, balance - amount)
+        to = Web3.to_checksum_address(to)
+        self.chain.transfer(reserve.asset, self.address, to, amount)
+        self.emit("Withdraw", reserve.asset, sender, to, amount)
+        return (amount,)
+
+    def setUserEMode(self, sender, value, category_id):
+        if category_id and category_id not in self.emode_categories:
+            raise Revert("inconsistent eMode category")
+        if category_id:
+            for reserve in self.reserves.values():
+                borrowed = self.borrowed.get((sender, reserve.asset), 0)
+                if borrowed and reserve.emode_category != category_id:
+                    raise Revert("inconsistent eMode category")
+        self._check_health(sender, emode=category_id)
+        self.chain.write(self.user_emode, sender, category_id)
+        return ()
+
+    def getUserEMode(self, sender, value, user):
+        return (self.user_emode.get(Web3.to_checksum_address(user), 0),)
+
+    def getEModeCategoryData(self, sender, value, category_id):
+        ltv, threshold, bonus, label = self.emode_categories.get(
+            category_id, (0, 0, 0, "")
+        )
+        return ((ltv, threshold, bonus, "0x" + "00" * 20, label),)
+
+    def getUserAccountData(self, sender, value, user):
+        return self.account_data(Web3.to_checksum_address(user))
+
+    def getReserveData(self, sender, value, asset):
+        reserve = self.reserves.get(Web3.to_checksum_address(asset))
+        if reserve is None:
+            # An unlisted asset reads back as an empty struct
+            return (0, 0, 0, 0, 0, 0, 0, 0) + ("0x" + "00" * 20,) * 4 + (0, 0, 0)
+        return (
+            reserve.configuration,
+            RAY,  # liquidityIndex
+            0,  # currentLiquidityRate
+            RAY,  # variableBorrowIndex
+            0,  # currentVariableBorrowRate
+            0,  # currentStableBorrowRate
+            self.chain.timestamp(),
+            reserve.id,
+            reserve.a_token,
+            fake_address(f"stable-debt:{reserve.asset}"),
+            reserve.debt_token,
+            fake_address("interest-rate-strategy"),
+            0,  # accruedToTreasury
+            0,  # unbacked
+            0,  # isolationModeTotalDebt
+        )
+
+
+class FakeWrappedTokenGateway(FakeContract):
+    """WrappedTokenGatewayV3: wraps and unwraps SEI around the Pool calls"""
+
+    abi = WRAPPED_TOKEN_GATEWAY_ABI
+
+    def __init__(self, chain, address, pool, reserve):
+        super().__init__(chain, address)
+        self.pool = pool
+        self.reserve = reserve
+        # The gateway approves the Pool once, at deployment
+        self.chain.allowances[(reserve.asset, address, pool.address)] = MAX_UINT256
+
+    def _wrap(self, amount):
+        self.chain._transfer_native(self.address, self.reserve.asset, amount)
+        self.chain.mint(self.reserve.asset, self.address, amount)
+
+    def _unwrap(self, amount, to):
+        self.chain.burn(self.reserve.asset, self.address, amount)
+        self.chain._transfer_native(self.reserve.asset, to, amount)
+
+    def depositETH(self, sender, value, pool, on_behalf_of, referral_code):
+        self._wrap(value)
+        self.pool.supply(self.address, 0, self.reserve.asset, value, on_behalf_of, 0)
+        return ()
+
+    def withdrawETH(self, sender, value, pool, amount, to):
+        key = (sender, self.reserve.asset)
+        balance = self.pool.supplied.get(key, 0)
+        if amount == MAX_UINT256:
+            amount = balance
+        if amount == 0 or amount > balance:
+            raise Revert("not enough available user balance")
+        # aWSEI.transferFrom(user, gateway), which checks the user's health
+        self.chain.spend_allowance(self.reserve.a_token, sender, self.address, amount)
+        self.pool._check_health(sender, supplied={self.reserve.asset: balance - amount})
+        self.chain.write(self.pool.supplied, key, balance - amount)
+        self.chain.write(
+            self.pool.supplied, (self.address, self.reserve.asset), amount
+        )
+        a_token = self.chain.contracts[self.reserve.a_token]
+        a_token.emit("Transfer", sender, self.address, amount)
+
+        self.pool.withdraw(self.address, 0, self.reserve.asset, amount, self.address)
+        self._unwrap(amount, Web3.to_checksum_address(to))
+        return ()
+
+    def repayETH(self, sender, value, pool, amount, rate_mode, on_behalf_of):
+        on_behalf_of = Web3.to_checksum_address(on_behalf_of)
+        debt = self.pool.borrowed.get((on_behalf_of, self.reserve.asset), 0)
+        paid = min(amount, debt)
+        if value < paid:
+            raise Revert("msg.value is less than repayment amount")
+        self._wrap(paid)
+        self.pool.repay(
+            self.address, 0, self.reserve.asset, paid, rate_mode, on_behalf_of
+        )
+        if value > paid:
+            self.chain._transfer_native(self.address, sender, value - paid)
+        return ()
+
+    def borrowETH(self, sender, value, pool, amount, rate_mode, referral_code):
+        self.pool.borrow(
+            self.address, 0, self.reserve.asset, amount, rate_mode, 0, sender
+        )
+        self._unwrap(amount, sender)
+        return ()
+
+
+def revert_data(reason):
+    return ERROR_SELECTOR + encode(["string"], [reason])
+
+
+def decode_raw_transaction(raw_transaction):
+    """Sender and fields of a signed legacy or typed transaction"""
+    raw_transaction = bytes(raw_transaction)
+    sender = Account.recover_transaction(raw_transaction)
+    if raw_transaction[0] <= 0x7F:
+        fields = TypedTransaction.from_bytes(raw_transaction).as_dict()
+        chain_id = fields["chainId"]
+        gas_price = fields.get("gasPrice", fields.get("maxFeePerGas"))
+    else:
+        nonce, gas_price, gas, to, value, data, v, _, _ = rlp.decode(raw_transaction)
+        v = int.from_bytes(v, "big")
+        chain_id = (v - 35) // 2 if v >= 35 else None
+        fields = {
+            "nonce": int.from_bytes(nonce, "big"),
+            "gas": int.from_bytes(gas, "big"),
+            "to": to,
+            "value": int.from_bytes(value, "big"),
+            "data": data,
+        }
+        gas_price = int.from_bytes(gas_price, "big")
+    return {
+        "hash": keccak(raw_transaction),
+        "from": sender,
+        "nonce": fields["nonce"],
+        "gas": fields["gas"],
+        "gasPrice": gas_price,
+        "to": Web3.to_checksum_address(fields["to"]) if fields["to"] else None,
+        "value": fields["value"],
+        "data": bytes(fields["data"]),
+        "chainId": chain_id,
+    }
+
+
+def _hex(value):
+    return hex(value) if isinstance(value, int) else "0x" + bytes(value).hex()
+
+
+def _topics_match(query, topics):
+    """Whether log topics match an eth_getLogs topic filter"""
+    if len(query) > len(topics):
+        return False
+    for wanted, topic in zip(query, topics):
+        if wanted is None:
+            continue
+        if isinstance(wanted, str):
+            wanted = [wanted]
+        if topic.lower() not in {option.lower() for option in wanted}:
+            return False
+    return True
+
+
+def _to_bytes(data):
+    if not data:
+        return b""
+    return bytes.fromhex(data[2:] if data.startswith("0x") else data)
+
+
+class FakeChain:
+    """
+    One simulated chain shared by every provider in the process
+
+    Blocks are produced every block_time seconds of wall clock time and
+    include every pending transaction whose nonce is next for its sender.
+    State changes go through write(), which journals the previous value so a
+    reverted transaction, eth_call or eth_estimateGas can be rolled back.
+    """
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(
+        self,
+        pool_address=None,
+        wsei_address=None,
+        block_time=0.4,
+        chain_id=1329,
+        funding=FAKE_CHAIN_FUNDING,
+        atoken_address=None,
+        debt_address=None,
+        gateway_address=None,
+        max_logs=FAKE_CHAIN_MAX_LOGS,
+    ):
+        """
+        Args:
+            pool_address: Address the Pool lives at
+            wsei_address: Address WSEI lives at
+            block_time: Seconds between blocks (0 to mine on every send)
+            chain_id: Chain ID transactions must be signed for
+            funding: Native balance of every address before its first transfer
+            atoken_address: aWSEI address (default: a derived one)
+            debt_address: WSEI variable debt token address (default: derived)
+            gateway_address: WrappedTokenGateway address (default: derived)
+            max_logs: Most logs one eth_getLogs may match before it fails
+        """
+        self.block_time = block_time
+        self.chain_id = chain_id
+        self.funding = funding
+        self.max_logs = max_logs
+        self.block_number = 0
+        self.genesis = time.time()
+        self.native = {}
+        self.balances = {}
+        self.allowances = {}
+        self.nonces = {}
+        # {sender: {nonce: transaction}}
+        self.pending = {}
+        self.receipts = {}
+        self.blocks = {0: {"timestamp": int(self.genesis), "transactions": []}}
+        # Every mined log in order, with their block numbers for bisecting
+        self.logs = []
+        self._log_blocks = []
+        # Events of the transaction being executed, rolled back with it
+        self._tx_logs = {}
+        self._journal = []
+        self._lock = threading.RLock()
+
+        pool_address = Web3.to_checksum_address(pool_address or fake_address("pool"))
+        wsei_address = Web3.to_checksum_address(wsei_address or fake_address("wsei"))
+        usdc_address = Web3.to_checksum_address(USDC_ADDRESS)
+        wsei = FakeReserve(
+            wsei_address, 18, 30_000_000, 7500, 8000, 10500, 0, emode_category=1
+        )
+        wsei.a_token = atoken_address or fake_address(f"atoken:{wsei_address}")
+        wsei.debt_token = debt_address or fake_address(f"debt:{wsei_address}")
+        usdc = FakeReserve(usdc_address, 6, 100_000_000, 7500, 7800, 10500, 1)
+        usdc.a_token = fake_address(f"atoken:{usdc_address}")
+        usdc.debt_token = fake_address(f"debt:{usdc_address}")
+        reserves = [wsei, usdc]
+
+        self.pool = FakePool(
+            self, pool_address, reserves, {1: (9000, 9300, 10100, "SEI correlated")}
+        )
+        self.contracts = {
+            pool_address: self.pool,
+            wsei_address: FakeWrappedToken(self, wsei_address),
+            usdc_address: FakeToken(self, usdc_address, 6),
+            MULTICALL3_ADDRESS: FakeMulticall(self, MULTICALL3_ADDRESS),
+        }
+        for reserve in reserves:
+            self.contracts[reserve.a_token] = FakeReserveToken(
+                self, reserve.a_token, reserve, self.pool.supplied
+            )
+            self.contracts[reserve.debt_token] = FakeReserveToken(
+                self, reserve.debt_token, reserve, self.pool.borrowed
+            )
+            # Liquidity other suppliers left in the Pool
+            self.balances[(reserve.asset, pool_address)] = 10**9 * 10**reserve.decimals
+        gateway_address = Web3.to_checksum_address(
+            gateway_address or fake_address("wrapped-token-gateway")
+        )
+        self.contracts[gateway_address] = FakeWrappedTokenGateway(
+            self, gateway_address, self.pool, wsei
+        )
+
+    @classmethod
+    def shared(cls):
+        """Get the chain shared by every fake provider, configured from env"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls(
+                    pool_address=os.getenv("POOL_ADDRESS"),
+                    wsei_address=os.getenv("WSEI_ADDRESS"),
+                    block_time=FAKE_CHAIN_BLOCK_TIME,
+                    chain_id=FAKE_CHAIN_ID,
+                    atoken_address=os.getenv("ATOKEN_ADDRESS"),
+                    debt_address=os.getenv("DEBT_ADDRESS"),
+                    gateway_address=os.getenv("WRAPPED_TOKEN_GATEWAY_ADDRESS"),
+                )
+            return cls._shared
+
+    # State
+
+    def write(self, mapping, key, value):
+        """Set mapping[key], remembering the old value for rollback"""
+        self._journal.append((mapping, key, mapping.get(key, self)))
+        mapping[key] = value
+
+    def _rollback(self, mark):
+        while len(self._journal) > mark:
+            mapping, key, old = self._journal.pop()
+            if old is self:
+                del mapping[key]
+            else:
+                mapping[key] = old
+
+    def native_balance(self, address):
+        return self.native.get(Web3.to_checksum_address(address), self.funding)
+
+    def token_balance(self, token, owner):
+        return self.balances.get((token, Web3.to_checksum_address(owner)), 0)
+
+    def allowance(self, token, owner, spender):
+        return self.allowances.get((token, owner, spender), 0)
+
+    def mint(self, token, to, amount):
+        self.write(self.balances, (token, to), self.token_balance(token, to) + amount)
+
+    def transfer(self, token, sender, to, amount):
+        balance = self.token_balance(token, sender)
+        if balance < amount:
+            raise Revert("transfer amount exceeds balance")
+        self.write(self.balances, (token, sender), balance - amount)
+        self.mint(token, to, amount)
+        self.contracts[token].emit("Transfer", sender, to, amount)
+
+    def burn(self, token, owner, amount):
+        balance = self.token_balance(token, owner)
+        if balance < amount:
+            raise Revert("burn amount exceeds balance")
+        self.write(self.balances, (token, owner), balance - amount)
+
+    def spend_allowance(self, token, owner, spender, amount):
+        allowance = self.allowance(token, owner, spender)
+        if allowance < amount:
+            raise Revert("transfer amount exceeds allowance")
+        if allowance != MAX_UINT256:
+            self.write(self.allowances, (token, owner, spender), allowance - amount)
+
+    def transfer_from(self, token, owner, spender, amount):
+        """Move owner's tokens to spender, spending owner's approval"""
+        self.spend_allowance(token, owner, spender, amount)
+        self.transfer(token, owner, spender, amount)
+
+    def log(self, address, topics, data):
+        """Record an event of the transaction being executed"""
+        self.write(self._tx_logs, len(self._tx_logs), (address, topics, data))
+
+    def _transfer_native(self, sender, to, amount):
+        balance = self.native_balance(sender)
+        if balance < amount:
+            raise Revert("insufficient balance for transfer")
+        self.write(self.native, sender, balance - amount)
+        self.write(self.native, to, self.native_balance(to) + amount)
+
+    def execute(self, sender, to, value, data):
+        """
+        Run a call and return (function name, output)
+
+        A Revert undoes the call's own changes before propagating; otherwise
+        the changes are kept and the caller rolls them back when needed.
+        """
+        to = Web3.to_checksum_address(to)
+        mark = len(self._journal)
+        try:
+            if value:
+                self._transfer_native(sender, to, value)
+            contract = self.contracts.get(to)
+            if contract is None:
+                if data:
+                    raise Revert(f"no contract at {to}")
+                return None, b""
+            if not data:
+                raise Revert("contract has no receive function")
+            return contract.call(sender, value, data)
+        except Revert:
+            self._rollback(mark)
+            raise
+
+    def _simulate(self, call):
+        """Run an eth_call / eth_estimateGas request without keeping changes"""
+        sender = Web3.to_checksum_address(call.get("from") or "0x" + "00" * 20)
+        to = Web3.to_checksum_address(call["to"])
+        value = int(call.get("value", "0x0"), 16)
+        data = _to_bytes(call.get("data") or call.get("input"))
+        mark = len(self._journal)
+        try:
+            return self.execute(sender, to, value, data)
+        except Revert as e:
+            raise FakeChainError(
+                f"execution reverted: {e}", 3, "0x" + revert_data(str(e)).hex()
+            )
+        finally:
+            self._rollback(mark)
+
+    # Blocks
+
+    def timestamp(self):
+        return self.blocks[self.block_number]["timestamp"]
+
+    def _mine_due(self):
+        """Produce the blocks whose time has come"""
+        if not self.block_time:
+            return
+        target = int((time.time() - self.genesis) / self.block_time)
+        if target > self.block_number:
+            if self.pending:
+                self._mine_block(target)
+            else:
+                self.block_number = target
+                self.blocks[target] = {
+                    "timestamp": int(self.genesis + target * self.block_time),
+                    "transactions": [],
+                }
+
+    def _mine_block(self, number):
+        block = {
+            "timestamp": int(self.genesis + number * self.block_time)
+            if self.block_time
+            else int(time.time()),
+            "transactions": [],
+        }
+        self.block_number = number
+        self.blocks[number] = block
+        block_hash = keccak(number.to_bytes(32, "big"))
+        gas_total = 0
+        log_index = 0
+
+        for sender in list(self.pending):
+            queued = self.pending[sender]
+            # Transactions behind a nonce gap wait for a later block
+            while self.nonces.get(sender, 0) in queued:
+                tx = queued.pop(self.nonces.get(sender, 0))
+                status, gas_used, events = self._apply(tx)
+                gas_total += gas_used
+                block["transactions"].append(tx["hash"])
+                logs = []
+                for address, topics, data in events:
+                    logs.append(
+                        {
+                            "address": address,
+                            "topics": [_hex(topic) for topic in topics],
+                            "data": _hex(data),
+                            "blockNumber": hex(number),
+                            "blockHash": _hex(block_hash),
+                            "transactionHash": _hex(tx["hash"]),
+                            "transactionIndex": hex(len(block["transactions"]) - 1),
+                            "logIndex": hex(log_index),
+                            "removed": False,
+                        }
+                    )
+                    log_index += 1
+                self.logs += logs
+                self._log_blocks += [number] * len(logs)
+                self.receipts[tx["hash"]] = {
+                    "transactionHash": _hex(tx["hash"]),
+                    "transactionIndex": hex(len(block["transactions"]) - 1),
+                    "blockHash": _hex(block_hash),
+                    "blockNumber": hex(number),
+                    "from": tx["from"],
+                    "to": tx["to"],
+                    "cumulativeGasUsed": hex(gas_total),
+                    "gasUsed": hex(gas_used),
+                    "effectiveGasPrice": hex(tx["gasPrice"]),
+                    "contractAddress": None,
+                    "logs": logs,
+                    "logsBloom": "0x" + "00" * 256,
+                    "status": hex(status),
+                    "type": "0x0",
+                }
+            if not queued:
+                del self.pending[sender]
+
+    def _apply(self, tx):
+        """Execute a mined transaction, returning (status, gasUsed, events)"""
+        mark = len(self._journal)
+        status = 1
+        try:
+            name, _ = self.execute(tx["from"], tx["to"], tx["value"], tx["data"])
+            gas_used = GAS_USED.get(name, TRANSFER_GAS if name is None else 50000)
+            if gas_used > tx["gas"]:
+                raise Revert("out of gas")
+        except Revert:
+            # Out of gas still has the call's changes to undo
+            self._rollback(mark)
+            status = 0
+            gas_used = min(REVERT_GAS, tx["gas"])
+        # Mined transactions stay, gas is paid either way
+        self._journal.clear()
+        events = list(self._tx_logs.values())
+        self._tx_logs = {}
+        sender = tx["from"]
+        self.native[sender] = self.native_balance(sender) - gas_used * tx["gasPrice"]
+        self.nonces[sender] = tx["nonce"] + 1
+        return status, gas_used, events
+
+    def _send(self, raw_transaction):
+        tx = decode_raw_transaction(_to_bytes(raw_transaction))
+        if tx["chainId"] != self.chain_id:
+            raise FakeChainError(f"invalid chain id {tx['chainId']}")
+        if tx["to"] is None:
+            raise FakeChainError("contract creation is not supported")
+        sender = tx["from"]
+        if tx["nonce"] < self.nonces.get(sender, 0):
+            raise FakeChainError("nonce too low")
+        if self.native_balance(sender) < tx["gas"] * tx["gasPrice"] + tx["value"]:
+            raise FakeChainError("insufficient funds for gas * price + value")
+
+        queued = self.pending.setdefault(sender, {})
+        replaced = queued.get(tx["nonce"])
+        # Replacements must pay at least 10% more, as in geth
+        if replaced is not None and tx["gasPrice"] * 10 < replaced["gasPrice"] * 11:
+            raise FakeChainError("replacement transaction underpriced")
+        queued[tx["nonce"]] = tx
+        if not self.block_time:
+            self._mine_block(self.block_number + 1)
+        return _hex(tx["hash"])
+
+    def _pending_nonce(self, address):
+        nonce = self.nonces.get(address, 0)
+        queued = self.pending.get(address, {})
+        while nonce in queued:
+            nonce += 1
+        return nonce
+
+    def _block_number(self, tag):
+        if tag in ("latest", "pending", "safe", "finalized"):
+            return self.block_number
+        if tag == "earliest":
+            return 0
+        return int(tag, 16)
+
+    def _block(self, tag):
+        number = self._block_number(tag)
+        block = self.blocks.get(number)
+        if block is None:
+            return None
+        return {
+            "number": hex(number),
+            "hash": _hex(keccak(number.to_bytes(32, "big"))),
+            "parentHash": _hex(keccak(max(number - 1, 0).to_bytes(32, "big"))),
+            "timestamp": hex(block["timestamp"]),
+            "gasLimit": hex(30_000_000),
+            "gasUsed": "0x0",
+            "miner": "0x" + "00" * 20,
+            "transactions": [_hex(tx_hash) for tx_hash in block["transactions"]],
+        }
+
+    def _get_logs(self, query):
+        from_block = self._block_number(query.get("fromBlock") or "latest")
+        to_block = self._block_number(query.get("toBlock") or "latest")
+        addresses = query.get("address")
+        if isinstance(addresses, str):
+            addresses = [addresses]
+        addresses = {address.lower() for address in addresses or ()}
+        topics = query.get("topics") or []
+
+        start = bisect.bisect_left(self._log_blocks, from_block)
+        end = bisect.bisect_right(self._log_blocks, to_block)
+        logs = []
+        for log in self.logs[start:end]:
+            if addresses and log["address"].lower() not in addresses:
+                continue
+            if not _topics_match(topics, log["topics"]):
+                continue
+            logs.append(log)
+            if len(logs) > self.max_logs:
+                raise FakeChainError(
+                    f"query returned more than {self.max_logs} results"
+                )
+        return logs
+
+    # JSON-RPC
+
+    def request(self, method, params):
+        """
+        Handle one JSON-RPC request and return its result
+
+        Raises FakeChainError for anything a node would answer with an error.
+        """
+        params = params or []
+        with self._lock:
+            self._mine_due()
+            if method == "eth_chainId":
+                return hex(self.chain_id)
+            if method == "net_version":
+                return str(self.chain_id)
+            if method == "eth_blockNumber":
+                return hex(self.block_number)
+            if method == "eth_gasPrice":
+                return hex(GAS_PRICE)
+            if method == "eth_getBalance":
+                return hex(self.native_balance(params[0]))
+            if method == "eth_getTransactionCount":
+                address = Web3.to_checksum_address(params[0])
+                if len(params) > 1 and params[1] == "pending":
+                    return hex(self._pending_nonce(address))
+                return hex(self.nonces.get(address, 0))
+            if method == "eth_getCode":
+                address = Web3.to_checksum_address(params[0])
+                return "0x00" if address in self.contracts else "0x"
+            if method == "eth_call":
+                _, output = self._simulate(params[0])
+                return "0x" + output.hex()
+            if method == "eth_estimateGas":
+                name, _ = self._simulate(params[0])
+                return hex(GAS_USED.get(name, TRANSFER_GAS if name is None else 50000))
+            if method == "eth_sendRawTransaction":
+                return self._send(params[0])
+            if method == "eth_getTransactionReceipt":
+                return self.receipts.get(bytes(_to_bytes(params[0])))
+            if method == "eth_getBlockByNumber":
+                return self._block(params[0])
+            if method == "eth_getLogs":
+                return self._get_logs(params[0])
+        raise FakeChainError(f"the method {method} does not exist", -32601)
+
+    def response(self, request_id, method, params):
+        """Wrap request() in a JSON-RPC response object"""
+        try:
+            result = self.request(method, params)
+        except FakeChainError as e:
+            error = {"code": e.code, "message": str(e)}
+            if e.data is not None:
+                error["data"] = e.data
+            return {"jsonrpc": "2.0", "id": request_id, "error": error}
+        return {"jsonrpc": "2.0", "id": request_id, "result": result}
+
+
+class FakeChainProvider(BaseProvider):
+    """Web3 provider that answers from a FakeChain after a simulated delay"""
+
+    def __init__(self, chain=None, latency=None):
+        """
+        Args:
+            chain: FakeChain to talk to (default: FakeChain.shared())
+            latency: Seconds added to every request (default: FAKE_CHAIN_LATENCY)
+        """
+        super().__init__()
+        self.chain = chain or FakeChain.shared()
+        self.latency = FAKE_CHAIN_LATENCY if latency is None else latency
+        self._request_id = 0
+
+    def make_request(self, method, params):
+        if self.latency:
+            time.sleep(self.latency)
+        self._request_id += 1
+        return self.chain.response(self._request_id, method, params)
+
+    def make_batch_request(self, requests):
+        if self.latency:
+            time.sleep(self.latency)
+        return [
+            self.chain.response(i, method, params)
+            for i, (method, params) in enumerate(requests)
+        ]
+
+    def is_connected(self, show_traceback=False):
+        return True
+
+
+class AsyncFakeChainProvider(AsyncBaseProvider):
+    """AsyncWeb3 provider that answers from a FakeChain after a simulated delay"""
+
+    def __init__(self, chain=None, latency=None):
+        """
+        Args:
+            chain: FakeChain to talk to (default: FakeChain.shared())
+            latency: Seconds added to every request (default: FAKE_CHAIN_LATENCY)
+        """
+        super().__init__()
+        self.chain = chain or FakeChain.shared()
+        self.latency = FAKE_CHAIN_LATENCY if latency is None else latency
+        self._request_id = 0
+
+    async def make_request(self, method, params):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self._request_id += 1
+        return self.chain.response(self._request_id, method, params)
+
+    async def make_batch_request(self, requests):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return [
+            self.chain.response(i, method, params)
+            for i, (method, params) in enumerate(requests)
+        ]
+
+    async def is_connected(self, show_traceback=False):
+        return True
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="產生離線壓力測試用的模擬錢包（搭配 RPC_URL=fake:// 使用）",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+範例：
+  python fake_chain.py --count 1000
+  python schedule.py --wallets fake_wallets.json --output fake_schedule.json \\
+      --start 1754542179 --end 1754542779
+  RPC_URL=fake:// WALLETS_FILE=fake_wallets.json \\
+      SCHEDULE_FILE=fake_schedule.json python main.py
+        """,
+    )
+    parser.add_argument("--count", type=int, required=True, help="錢包數量")
+    parser.add_argument(
+        "--output",
+        type=str,
+        default="fake_wallets.json",
+        help="輸出錢包檔案路徑（預設：fake_wallets.json）",
+    )
+    args = parser.parse_args()
+
+    wallets = []
+    for _ in range(args.count):
+        account = Account.create()
+        wallets.append({"address": account.address, "pk": account.key.hex()})
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(wallets, f, indent=2)
+    print(f"已產生 {len(wallets)} 個模擬錢包至 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import os
+import threading
+
+# Headroom added on top of eth_estimateGas
+GAS_LIMIT_MARGIN = float(os.getenv("GAS_LIMIT_MARGIN", "1.3"))
+# Re-estimate once a receipt's gasUsed is this far off the cached estimate
+GAS_DRIFT_THRESHOLD = float(os.getenv("GAS_DRIFT_THRESHOLD", "0.2"))
+
+
+class GasEstimator:
+    """
+    Process-wide cache of gas estimates keyed by (method, asset)
+
+    The first transaction for a key pays for one eth_estimateGas; later ones
+    reuse estimate * margin as their gas limit. Receipts feed gasUsed back,
+    and the estimate is dropped when it drifts past the threshold so the next
+    transaction estimates again.
+    """
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, margin=1.3, drift_threshold=0.2):
+        """
+        Args:
+            margin: Factor applied to the estimate to get the gas limit
+            drift_threshold: Relative gasUsed change that triggers re-estimation
+        """
+        self.margin = margin
+        self.drift_threshold = drift_threshold
+        self._estimates = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def shared(cls):
+        """Get the estimator shared by every bot in the process, configured from env"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls(GAS_LIMIT_MARGIN, GAS_DRIFT_THRESHOLD)
+            return cls._shared
+
+    def gas_limit(self, key):
+        """Cached gas limit for key, or None if it needs estimating"""
+        estimate = self._estimates.get(key)
+        if estimate is None:
+            return None
+        return int(estimate * self.margin)
+
+    def record(self, key, estimate):
+        """Store a fresh eth_estimateGas result and return the gas limit to use"""
+        with self._lock:
+            self._estimates[key] = estimate
+        return int(estimate * self.margin)
+
+    def observe(self, key, gas_used):
+        """Compare a receipt's gasUsed with the cached estimate"""
+        with self._lock:
+            estimate = self._estimates.get(key)
+            if estimate is None:
+                return
+            if abs(gas_used - estimate) > estimate * self.drift_threshold:
+                del self._estimates[key]
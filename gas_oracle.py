@@ -0,0 +1,137 @@
+import asyncio
+import os
+import threading
+import time
+
+from web3 import Web3
+
+GAS_PRICE_TTL = float(os.getenv("GAS_PRICE_TTL", "15"))
+GAS_PRICE_MAX_BLOCKS = int(os.getenv("GAS_PRICE_MAX_BLOCKS", "0"))
+GAS_PRICE_MULTIPLIER = float(os.getenv("GAS_PRICE_MULTIPLIER", "1"))
+GAS_PRICE_CEILING_GWEI = os.getenv("GAS_PRICE_CEILING_GWEI")
+
+
+class GasPriceOracle:
+    """
+    Process-wide gas price cache
+
+    The first read fetches eth_gasPrice inline. Afterwards the cached price is
+    returned immediately and, once it is older than ttl seconds or max_blocks
+    blocks, a refresh is started in the background.
+    """
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, ttl=15, max_blocks=0, multiplier=1.0, ceiling=None):
+        """
+        Args:
+            ttl: Seconds before the cached price is refreshed
+            max_blocks: Blocks before the cached price is refreshed (0 to disable)
+            multiplier: Factor applied to the node's gas price
+            ceiling: Highest gas price ever returned (in wei, None for no limit)
+        """
+        self.ttl = ttl
+        self.max_blocks = max_blocks
+        self.multiplier = multiplier
+        self.ceiling = ceiling
+        self._price = None
+        self._fetched_at = 0.0
+        self._fetched_block = None
+        self._latest_block = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._refresh_task = None
+
+    @classmethod
+    def shared(cls):
+        """Get the oracle shared by every bot in the process, configured from env"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                ceiling = None
+                if GAS_PRICE_CEILING_GWEI:
+                    ceiling = Web3.to_wei(GAS_PRICE_CEILING_GWEI, "gwei")
+                cls._shared = cls(
+                    ttl=GAS_PRICE_TTL,
+                    max_blocks=GAS_PRICE_MAX_BLOCKS,
+                    multiplier=GAS_PRICE_MULTIPLIER,
+                    ceiling=ceiling,
+                )
+            return cls._shared
+
+    def observe_block(self, block_number):
+        """Record a block number seen elsewhere (e.g. from a receipt)"""
+        with self._lock:
+            if self._latest_block is None or block_number > self._latest_block:
+                self._latest_block = block_number
+
+    def _is_stale(self):
+        if time.monotonic() - self._fetched_at >= self.ttl:
+            return True
+        if self.max_blocks and self._fetched_block is not None:
+            if self._latest_block is not None:
+                return self._latest_block - self._fetched_block >= self.max_blocks
+        return False
+
+    def _store(self, price):
+        with self._lock:
+            self._price = price
+            self._fetched_at = time.monotonic()
+            self._fetched_block = self._latest_block
+            self._refreshing = False
+
+    def _apply(self, price):
+        price = int(price * self.multiplier)
+        if self.ceiling is not None:
+            price = min(price, self.ceiling)
+        return price
+
+    def _refresh(self, w3):
+        try:
+            self._store(w3.eth.gas_price)
+        except Exception as e:
+            print(f"Gas price refresh failed: {e}")
+            with self._lock:
+                self._refreshing = False
+
+    async def _async_refresh(self, w3):
+        try:
+            self._store(await w3.eth.gas_price)
+        except Exception as e:
+            print(f"Gas price refresh failed: {e}")
+            with self._lock:
+                self._refreshing = False
+
+    def _start_refresh(self):
+        """Mark a refresh as running, returns False if one already is"""
+        with self._lock:
+            if self._refreshing or not self._is_stale():
+                return False
+            self._refreshing = True
+            return True
+
+    def gas_price(self, w3):
+        """
+        Get the gas price to use for a transaction
+
+        Args:
+            w3: Web3 instance used to refresh the price
+        """
+        if self._price is None:
+            self._store(w3.eth.gas_price)
+        elif self._start_refresh():
+            threading.Thread(target=self._refresh, args=(w3,), daemon=True).start()
+        return self._apply(self._price)
+
+    async def async_gas_price(self, w3):
+        """
+        Get the gas price to use for a transaction
+
+        Args:
+            w3: AsyncWeb3 instance used to refresh the price
+        """
+        if self._price is None:
+            self._store(await w3.eth.gas_price)
+        elif self._start_refresh():
+            self._refresh_task = asyncio.create_task(self._async_refresh(w3))
+        return self._apply(self._price)
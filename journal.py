@@ -0,0 +1,361 @@
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+
+from hexbytes import HexBytes
+
+from sharding import SHARD_DB
+
+# Append-only log of wallet runs and their transactions, empty to disable;
+# with sharding the records go to the shared SHARD_DB instead
+JOURNAL_FILE = os.getenv("JOURNAL_FILE", "journal.jsonl")
+# Records written within this many seconds share one fsync
+JOURNAL_FSYNC_INTERVAL = float(os.getenv("JOURNAL_FSYNC_INTERVAL", "0.1"))
+# Attempts at a scheduled run before a failing one is no longer retried
+JOURNAL_MAX_ATTEMPTS = int(os.getenv("JOURNAL_MAX_ATTEMPTS", "3"))
+
+
+def _key(address):
+    return address.lower()
+
+
+def _tx_hash(tx_hash):
+    return HexBytes(tx_hash).to_0x_hex()
+
+
+@dataclass
+class WalletRun:
+    """One scheduled wallet run as replayed from the journal"""
+
+    timestamp: int
+    # running, done or failed
+    status: str = "running"
+    # Phases of the run whose transactions all confirmed
+    phases: set = field(default_factory=set)
+    # tx hash -> step label, sent but never seen mined
+    pending: dict = field(default_factory=dict)
+    # phase -> [transactions planned, transactions succeeded]
+    planned: dict = field(default_factory=dict)
+    # tx hash -> phase, for pending transactions sent as part of a phase
+    tx_phases: dict = field(default_factory=dict)
+    # Reopened after the process died during an earlier attempt, or failed
+    resumed: bool = False
+    # Times the run was started, retries of a failed run included
+    attempts: int = 0
+
+    @property
+    def finished(self):
+        return self.status == "done"
+
+
+class Journal:
+    """
+    Crash-safe record of which wallets ran and which transactions they sent
+
+    Every record is one JSON line appended to the journal file. Writers only
+    queue their record; a background thread writes what has queued up every
+    fsync_interval seconds and fsyncs once for the whole group. Replaying
+    the file on startup rebuilds the last run of each (wallet, scheduled
+    timestamp) in one pass, so finished runs can be skipped and interrupted
+    ones resumed. Failed runs are retried from their last confirmed phase
+    until max_attempts starts have failed. A record torn by a crash is cut
+    off before appending.
+
+    With db_path set (the shared SHARD_DB when sharding) records are stored
+    in a journal table there instead, keyed by wallet, and each wallet's
+    runs are replayed from it when first looked up and again by load()
+    before the wallet is run. A worker taking over a wallet from one that
+    stopped thus sees its confirmed phases and pending transactions.
+    """
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(
+        self, journal_file=None, fsync_interval=0.1, max_attempts=3, db_path=None
+    ):
+        """
+        Args:
+            journal_file: JSONL file to append to, None to keep nothing
+            fsync_interval: Seconds records are gathered before each fsync
+            max_attempts: Starts of a run before it is given up after failing
+            db_path: SQLite database shared by workers to keep the records in
+                instead of journal_file
+        """
+        self.journal_file = journal_file
+        self.fsync_interval = fsync_interval
+        self.max_attempts = max_attempts
+        self.enabled = bool(journal_file)
+        self.db_path = db_path if self.enabled else None
+        self.runs = {}
+        # address -> the run steps are recorded under
+        self._current = {}
+        # Wallets replayed from db_path
+        self._loaded = set()
+        self._queue = []
+        self._lock = threading.Lock()
+        self._queued = threading.Condition(self._lock)
+        self._write_lock = threading.Lock()
+        self._f = None
+        self._db = None
+        if not self.enabled:
+            return
+
+        if self.db_path:
+            self._db = sqlite3.connect(
+                self.db_path, timeout=30, check_same_thread=False
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS journal "
+                "(id INTEGER PRIMARY KEY AUTOINCREMENT, wallet TEXT, record TEXT)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS journal_wallet ON journal (wallet)"
+            )
+            self._db.commit()
+        else:
+            self._replay()
+            self._f = open(self.journal_file, "ab")
+        threading.Thread(target=self._writer, name="journal", daemon=True).start()
+        atexit.register(self.flush)
+
+    @classmethod
+    def shared(cls):
+        """Get the journal shared by every bot in the process, configured from env"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls(
+                    JOURNAL_FILE, JOURNAL_FSYNC_INTERVAL, JOURNAL_MAX_ATTEMPTS, SHARD_DB
+                )
+            return cls._shared
+
+    def _replay(self):
+        if not os.path.exists(self.journal_file):
+            return
+        start = time.perf_counter()
+        valid_size = 0
+        with open(self.journal_file, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                valid_size += len(line)
+                self._apply(record)
+        if valid_size < os.path.getsize(self.journal_file):
+            print(f"Dropping torn record at byte {valid_size} of {self.journal_file}")
+            os.truncate(self.journal_file, valid_size)
+        interrupted = sum(run.status == "running" for run in self.runs.values())
+        print(
+            f"Replayed {len(self.runs)} wallet runs ({interrupted} interrupted) "
+            f"from {self.journal_file} in {time.perf_counter() - start:.2f}s"
+        )
+
+    def load(self, address):
+        """
+        Replay a wallet's runs from db_path, as other workers left them
+
+        Called before running the wallet, while no other worker holds its
+        lease; does nothing without db_path.
+        """
+        if self._db is None:
+            return
+        key = _key(address)
+        # Our own queued records go first so the replay includes them
+        with self._write_lock:
+            self._write_locked()
+            records = [
+                json.loads(record)
+                for (record,) in self._db.execute(
+                    "SELECT record FROM journal WHERE wallet = ? ORDER BY id", (key,)
+                )
+            ]
+        with self._lock:
+            for record in records:
+                if record["event"] == "start":
+                    self.runs.pop((key, record["timestamp"]), None)
+            self._current.pop(key, None)
+            for record in records:
+                self._apply(record)
+            self._loaded.add(key)
+
+    def _apply(self, record):
+        address = record["wallet"]
+        event = record["event"]
+        if event == "start":
+            run = self.runs.get((address, record["timestamp"]))
+            if run is None:
+                run = WalletRun(record["timestamp"])
+                self.runs[address, run.timestamp] = run
+            # A retried run keeps the phases and transactions of the failed one
+            run.status = "running"
+            run.attempts += 1
+            self._current[address] = run
+            return
+
+        run = self._current.get(address)
+        if run is None:
+            # Transactions sent outside a scheduled run
+            return
+        if event == "sent":
+            run.pending[record["tx"]] = record["label"]
+            if record.get("phase"):
+                run.tx_phases[record["tx"]] = record["phase"]
+        elif event == "mined":
+            run.pending.pop(record["tx"], None)
+            phase = run.tx_phases.pop(record["tx"], None)
+            if phase in run.planned and record["status"] == 1:
+                counts = run.planned[phase]
+                counts[1] += 1
+                if counts[1] >= counts[0]:
+                    run.phases.add(phase)
+        elif event == "plan":
+            for phase, count in record["phases"].items():
+                run.planned[phase] = [count, 0]
+        elif event == "phase":
+            run.phases.add(record["phase"])
+        elif event in ("done", "failed"):
+            run.status = event
+
+    def _append(self, record):
+        if not self.enabled:
+            return
+        record = {"ts": round(time.time(), 3), **record}
+        with self._lock:
+            self._apply(record)
+            self._queue.append(record)
+            self._queued.notify()
+
+    def _writer(self):
+        while True:
+            with self._lock:
+                while not self._queue:
+                    self._queued.wait()
+            # Let the records of concurrent wallets pile up for one fsync
+            time.sleep(self.fsync_interval)
+            self._write()
+
+    def _write(self):
+        # Taking the queue under the write lock keeps batches in order
+        with self._write_lock:
+            self._write_locked()
+
+    def _write_locked(self):
+        with self._lock:
+            records, self._queue = self._queue, []
+        if not records:
+            return
+        try:
+            if self._db is not None:
+                with self._db:
+                    self._db.executemany(
+                        "INSERT INTO journal (wallet, record) VALUES (?, ?)",
+                        [(record["wallet"], json.dumps(record)) for record in records],
+                    )
+                return
+            self._f.write(b"".join(json.dumps(r).encode() + b"\n" for r in records))
+            self._f.flush()
+            os.fsync(self._f.fileno())
+        except (OSError, sqlite3.Error) as e:
+            print(f"Writing journal failed: {e}")
+
+    def flush(self):
+        """Write and fsync everything recorded so far"""
+        if self.enabled:
+            self._write()
+
+    def run(self, address, timestamp):
+        """The journaled run of a wallet at a scheduled timestamp, or None"""
+        key = _key(address)
+        if self._db is not None and key not in self._loaded:
+            self.load(address)
+        return self.runs.get((key, timestamp))
+
+    def finished(self, address, timestamp):
+        """Whether the wallet's run at timestamp already completed"""
+        run = self.run(address, timestamp)
+        return run is not None and run.finished
+
+    def gave_up(self, address, timestamp):
+        """Whether the wallet's run at timestamp failed max_attempts times"""
+        run = self.run(address, timestamp)
+        return (
+            run is not None
+            and run.status == "failed"
+            and run.attempts >= self.max_attempts
+        )
+
+    def start(self, address, timestamp):
+        """
+        Open (or reopen, after a crash or failure) the run of a wallet
+
+        Returns:
+            The WalletRun, with the phases and pending transactions of the
+            interrupted or failed attempt when resuming
+        """
+        key = _key(address)
+        run = self.runs.get((key, timestamp))
+        if run is not None and run.status == "running":
+            # Resuming: later steps are recorded under the same run
+            self._current[key] = run
+            run.resumed = True
+            return run
+        self._append({"wallet": key, "event": "start", "timestamp": timestamp})
+        run = self.runs.get((key, timestamp), WalletRun(timestamp))
+        if run.attempts > 1:
+            # Retrying a failed run: settle what it sent, skip what confirmed
+            run.resumed = True
+        return run
+
+    def sent(self, address, tx_hash, label, phase=None):
+        """Record a transaction the node accepted"""
+        record = {
+            "wallet": _key(address),
+            "event": "sent",
+            "tx": _tx_hash(tx_hash),
+            "label": label,
+        }
+        if phase:
+            record["phase"] = phase
+        self._append(record)
+
+    def mined(self, address, tx_hash, status):
+        """Record a transaction's receipt"""
+        self._append(
+            {
+                "wallet": _key(address),
+                "event": "mined",
+                "tx": _tx_hash(tx_hash),
+                "status": status,
+            }
+        )
+
+    def plan(self, address, phases):
+        """
+        Record how many transactions each upcoming phase of the run sends
+
+        A phase counts as confirmed once that many of the transactions sent
+        with its name succeeded, even if only a resumed run sees them mined.
+
+        Args:
+            address: Wallet address
+            phases: Dict of phase name to its number of transactions
+        """
+        self._append({"wallet": _key(address), "event": "plan", "phases": phases})
+
+    def phase(self, address, phase):
+        """Record that every transaction of a phase of the run confirmed"""
+        self._append({"wallet": _key(address), "event": "phase", "phase": phase})
+
+    def finish(self, address, error=None):
+        """Close the wallet's run as done, or failed with error"""
+        record = {"wallet": _key(address), "event": "failed" if error else "done"}
+        if error:
+            record["error"] = str(error)
+        self._append(record)
@@ -1,94 +1,215 @@
-import json
+import asyncio
 import os
-import random
-import time
 
-from eth_account import Account
 from web3 import Web3
 
-from bot import YeiPointBot
+from async_bot import AsyncYeiPointBot
+from journal import WalletRun
+from pipeline import MAX_UINT256
+from planner import (
+    UNWIND_HEALTH_FACTOR,
+    UNWIND_INTEREST_MARGIN,
+    leverage_params,
+    plan_leverage,
+    plan_unwind,
+)
+from runner import run_schedule
 
 MIN_HEALTH_FACTOR = float(os.getenv("MIN_HEALTH_FACTOR"))
 REMAINING_SEI_AMOUNT = int(float(os.getenv("REMAINING_SEI_AMOUNT")) * 1e18)
 MAX_LTV = float(os.getenv("MAX_LTV"))
 EMODE = int(os.getenv("EMODE"))
+PIPELINE_TRANSACTIONS = os.getenv("PIPELINE_TRANSACTIONS", "1") == "1"
+# Close every wallet's loop instead of building it
+UNWIND = os.getenv("UNWIND", "0") == "1"
 
 
-def load_wallets() -> list:
-    with open("wallets.json", "r") as f:
-        wallets = json.load(f)
-    return wallets
+async def supply_and_borrow(address: str, run: WalletRun):
+    print(f"=== Looping for {address} ===")
 
+    bot = AsyncYeiPointBot(address)
+    if run.resumed:
+        # Let the interrupted attempt's transactions land before reading state
+        await bot.settle(list(run.pending))
+        phases = ", ".join(sorted(run.phases)) or "none"
+        print(f"Resuming interrupted run, confirmed phases: {phases}")
 
-def load_schedules() -> dict:
-    with open("schedule.json", "r") as f:
-        schedule = json.load(f)
-    return schedule
-
-
-def supply_and_borrow(wallet: Account):
-    print(f"=== Looping for {wallet.address} ===")
-
-    bot = YeiPointBot(wallet.key)
-
-    current_emode = bot.get_user_emode()
+    snapshot = await bot.get_position_snapshot()
+    current_emode = snapshot.emode
     print(f"Current eMode category: {current_emode}")
     if current_emode != EMODE:
         print(f"enabling eMode category {EMODE}...")
-        bot.set_user_emode(EMODE)
+        await bot.set_user_emode(EMODE)
     else:
         print(f"eMode already enabled with category {current_emode}")
 
-    sei_balance = bot.get_native_balance(wallet.address)
-    wsei_balance = bot.get_wsei_balance()
+    sei_balance = snapshot.native_balance
+    wsei_balance = snapshot.wsei_balance
 
     print(f"SEI: {Web3.from_wei(sei_balance, 'ether'):.6f} SEI")
     print(f"WSEI: {Web3.from_wei(wsei_balance, 'ether'):.6f} WSEI")
 
-    if sei_balance + wsei_balance > REMAINING_SEI_AMOUNT:
+    if "setup" in run.phases:
+        print("Wrap and supply already done before the restart")
+    elif sei_balance + wsei_balance > REMAINING_SEI_AMOUNT:
         if sei_balance > REMAINING_SEI_AMOUNT:
             convert_amount = sei_balance - REMAINING_SEI_AMOUNT
-            bot.wrap_sei_to_wsei(convert_amount)
+            if bot.uses_gateway(bot.WSEI_ADDRESS):
+                # One depositETH instead of wrap, approve and supply
+                await bot.supply(bot.WSEI_ADDRESS, convert_amount, native=True)
+            else:
+                await bot.wrap_sei_to_wsei(convert_amount)
         if wsei_balance > 0:
-            bot.supply(bot.WSEI_ADDRESS, wsei_balance)
+            await bot.supply(bot.WSEI_ADDRESS, wsei_balance, native=False)
+    bot.journal.phase(address, "setup")
+
+    # Plan every borrow/supply round from one read, then re-read only to
+    # check for drift (interest accrual, partial fills) and top up
+    reserve_data = await bot.get_reserve_data(bot.WSEI_ADDRESS)
+    emode_data = await bot.get_emode_category_data(EMODE) if EMODE else None
+    ltv, liquidation_threshold = leverage_params(reserve_data, emode_data, MAX_LTV)
 
     while True:
-        health_factor = bot.get_user_account_data()["healthFactor"] / 1e18
-        print(f"Health factor: {health_factor:.2f}")
-        if health_factor <= MIN_HEALTH_FACTOR:
-            break
-        atoken_balance = bot.get_atoken_balance()
-        debt_balance = bot.get_debt_balance()
+        snapshot = await bot.get_position_snapshot()
+        print(f"Health factor: {snapshot.health_factor:.2f}")
+        atoken_balance = snapshot.atoken_balance
+        debt_balance = snapshot.debt_balance
         print(f"aWSEI: {Web3.from_wei(atoken_balance, 'ether'):.6f} aWSEI")
         print(f"debtWSEI: {Web3.from_wei(debt_balance, 'ether'):.6f} debtWSEI")
-        borrowable_amount = atoken_balance * MAX_LTV - debt_balance
-        borrowable_amount = int(borrowable_amount * 0.99)
-        bot.borrow(bot.WSEI_ADDRESS, borrowable_amount)
-        bot.supply(bot.WSEI_ADDRESS, borrowable_amount)
 
-    print("=== Looping completed ===\n")
+        plan = plan_leverage(
+            atoken_balance,
+            debt_balance,
+            ltv,
+            liquidation_threshold,
+            MIN_HEALTH_FACTOR,
+        )
+        if not plan.borrow_amounts:
+            break
+        print(
+            f"Planned {len(plan)} rounds, "
+            f"expected health factor: {plan.health_factor:.2f}"
+        )
+
+        failed = False
+        if PIPELINE_TRANSACTIONS:
+            # One approval up front covers every supply in the plan
+            steps = await bot.approval_steps(
+                bot.WSEI_ADDRESS, sum(plan.borrow_amounts)
+            )
+            for borrowable_amount in plan.borrow_amounts:
+                steps += [
+                    bot.borrow_step(bot.WSEI_ADDRESS, borrowable_amount),
+                    bot.supply_step(bot.WSEI_ADDRESS, borrowable_amount),
+                ]
+            receipts = await bot.send_pipeline(steps)
+            failed = any(r is None or r.status != 1 for r in receipts)
+        else:
+            # Borrowed WSEI goes straight back in, so it is never unwrapped
+            for borrowable_amount in plan.borrow_amounts:
+                receipt = await bot.borrow(
+                    bot.WSEI_ADDRESS, borrowable_amount, native=False
+                )
+                if receipt.status != 1:
+                    failed = True
+                    break
+                receipt = await bot.supply(
+                    bot.WSEI_ADDRESS, borrowable_amount, native=False
+                )
+                if receipt.status != 1:
+                    failed = True
+                    break
+        if failed:
+            print("Leverage round failed, stopping loop")
+            break
 
+    print("=== Looping completed ===\n")
 
-def main():
-    wallets = load_wallets()
-    schedules = load_schedules()
 
-    accounts = {wallet["address"]: Account.from_key(wallet["pk"]) for wallet in wallets}
+async def unwind(address: str, run: WalletRun):
+    print(f"=== Unwinding {address} ===")
+
+    bot = AsyncYeiPointBot(address)
+    if run.resumed:
+        # Let the interrupted attempt's transactions land before reading state
+        await bot.settle(list(run.pending))
+        print("Resuming interrupted unwind")
+
+    snapshot = await bot.get_position_snapshot()
+    reserve_data = await bot.get_reserve_data(bot.WSEI_ADDRESS)
+    emode_data = None
+    if snapshot.emode:
+        emode_data = await bot.get_emode_category_data(snapshot.emode)
+    _, liquidation_threshold = leverage_params(reserve_data, emode_data)
+
+    # Plan every withdraw/repay round from one read, then re-read only if
+    # the plan was cut short or a step failed
+    while snapshot.atoken_balance or snapshot.debt_balance:
+        print(f"Health factor: {snapshot.health_factor:.2f}")
+        print(f"aWSEI: {Web3.from_wei(snapshot.atoken_balance, 'ether'):.6f} aWSEI")
+        print(f"debtWSEI: {Web3.from_wei(snapshot.debt_balance, 'ether'):.6f} debtWSEI")
+
+        plan = plan_unwind(
+            snapshot.atoken_balance,
+            snapshot.debt_balance,
+            liquidation_threshold,
+            balance=snapshot.wsei_balance,
+        )
+        if not plan.closes and not plan.rounds:
+            # Already at or below the floor: only outside WSEI can repay first.
+            # Failing leaves the run to be retried instead of marked done
+            raise RuntimeError(
+                f"No withdrawal keeps the health factor above "
+                f"{UNWIND_HEALTH_FACTOR}; lower UNWIND_HEALTH_FACTOR or add "
+                f"WSEI to repay with"
+            )
+        print(f"Planned {len(plan)} transactions, closes position: {plan.closes}")
+
+        # With a gateway the last withdrawal comes out as SEI, no unwrap needed
+        native_exit = plan.closes and bot.uses_gateway(bot.WSEI_ADDRESS)
+        steps = await bot.approval_steps(bot.WSEI_ADDRESS, plan.repay_total)
+        if native_exit:
+            atoken_balance = snapshot.atoken_balance
+            margin = int(atoken_balance * UNWIND_INTEREST_MARGIN)
+            steps += await bot.gateway_approval_steps(
+                withdraw_amount=atoken_balance + margin
+            )
+        for withdraw_amount, repay_amount in plan.rounds:
+            if withdraw_amount:
+                steps.append(bot.withdraw_step(bot.WSEI_ADDRESS, withdraw_amount))
+            steps.append(bot.repay_step(bot.WSEI_ADDRESS, repay_amount))
+        if plan.closes:
+            if plan.final_withdraw:
+                steps.append(bot.withdraw_step(bot.WSEI_ADDRESS, plan.final_withdraw))
+            if plan.final_repay:
+                steps.append(bot.repay_step(bot.WSEI_ADDRESS, MAX_UINT256))
+            steps.append(
+                bot.withdraw_step(bot.WSEI_ADDRESS, MAX_UINT256, native=native_exit)
+            )
+
+        failed = False
+        if PIPELINE_TRANSACTIONS:
+            receipts = await bot.send_pipeline(steps)
+            failed = any(r is None or r.status != 1 for r in receipts)
+        else:
+            for step in steps:
+                (receipt,) = await bot.send_pipeline([step])
+                if receipt is None or receipt.status != 1:
+                    failed = True
+                    break
+        if failed:
+            raise RuntimeError("Unwind step failed, position left open")
+        if plan.closes:
+            break
+        snapshot = await bot.get_position_snapshot()
 
-    while True:
-        current_time = time.time()
-        print(current_time)
+    print("=== Unwind completed ===\n")
 
-        new_schedules = {}
-        for wallet_address, schedule_time in schedules.items():
-            if schedule_time <= current_time:
-                supply_and_borrow(accounts[wallet_address])
-            else:
-                new_schedules[wallet_address] = schedule_time
-        schedules = new_schedules
 
-        time.sleep(random.randint(1, 3))
+async def main():
+    await AsyncYeiPointBot.resolve_chain_metadata()
+    await run_schedule(unwind if UNWIND else supply_and_borrow)
 
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
@@ -1,87 +1,103 @@
-import json
+import asyncio
 import os
-import random
-import time
 
-from eth_account import Account
 from web3 import Web3
 
-from bot import YeiPointBot
+from async_bot import AsyncYeiPointBot
+from journal import WalletRun
+from runner import run_schedule
 
 MIN_HEALTH_FACTOR = float(os.getenv("MIN_HEALTH_FACTOR"))
 REMAINING_SEI_AMOUNT = int(float(os.getenv("REMAINING_SEI_AMOUNT")) * 1e18)
 MAX_LTV = float(os.getenv("MAX_LTV"))
 EMODE = int(os.getenv("EMODE"))
+PIPELINE_TRANSACTIONS = os.getenv("PIPELINE_TRANSACTIONS", "1") == "1"
 
 
 USDC_ADDRESS = "0x9cc91646ab84efa26469db98592f28B8b729C1c3"
 
 
-def load_wallets() -> list:
-    with open("wallets.json", "r") as f:
-        wallets = json.load(f)
-    return wallets
+async def supply_and_borrow(address: str, run: WalletRun):
+    print(f"=== Looping for {address} ===")
 
+    bot = AsyncYeiPointBot(address)
+    if run.resumed:
+        # Let the interrupted attempt's transactions land before reading state
+        await bot.settle(list(run.pending))
+        phases = ", ".join(sorted(run.phases)) or "none"
+        print(f"Resuming interrupted run, confirmed phases: {phases}")
 
-def load_schedules() -> dict:
-    with open("schedule.json", "r") as f:
-        schedule = json.load(f)
-    return schedule
-
-
-def supply_and_borrow(wallet: Account):
-    print(f"=== Looping for {wallet.address} ===")
-
-    bot = YeiPointBot(wallet.key)
-
-    current_emode = bot.get_user_emode()
+    snapshot = await bot.get_position_snapshot()
+    current_emode = snapshot.emode
     print(f"Current eMode category: {current_emode}")
     if current_emode != EMODE:
         print(f"enabling eMode category {EMODE}...")
-        bot.set_user_emode(EMODE)
+        await bot.set_user_emode(EMODE)
     else:
         print(f"eMode already enabled with category {current_emode}")
 
-    sei_balance = bot.get_native_balance(wallet.address)
-    wsei_balance = bot.get_wsei_balance()
+    sei_balance = snapshot.native_balance
+    wsei_balance = snapshot.wsei_balance
 
     print(f"SEI: {Web3.from_wei(sei_balance, 'ether'):.6f} SEI")
     print(f"WSEI: {Web3.from_wei(wsei_balance, 'ether'):.6f} WSEI")
 
     SUPPLY_WSEI_AMOUNT = int(0.5 * 1e18)
-    BORROW_USDC_AMOUNT = int(0.1 * 1e6)
-    REPAY_USDC_AMOUNT = int(0.05 * 1e6)
+    usdc_unit = 10 ** await bot.get_decimals(USDC_ADDRESS)
+    BORROW_USDC_AMOUNT = int(0.1 * usdc_unit)
+    REPAY_USDC_AMOUNT = int(0.05 * usdc_unit)
     WITHDRAW_WSEI_AMOUNT = int(0.1 * 1e18)
 
-    bot.wrap_sei_to_wsei(SUPPLY_WSEI_AMOUNT)
-    bot.supply(bot.WSEI_ADDRESS, SUPPLY_WSEI_AMOUNT)
-    bot.borrow(USDC_ADDRESS, BORROW_USDC_AMOUNT)
-    bot.repay(USDC_ADDRESS, REPAY_USDC_AMOUNT)
-    bot.withdraw(bot.WSEI_ADDRESS, WITHDRAW_WSEI_AMOUNT)
+    # A phase is confirmed once all of its transactions succeeded, so a
+    # resumed run picks up after the last confirmed one
+    phases = {}
+    if bot.uses_gateway(bot.WSEI_ADDRESS):
+        # One depositETH instead of wrap, approve and supply
+        if "supply" not in run.phases:
+            phases["supply"] = [
+                bot.supply_step(bot.WSEI_ADDRESS, SUPPLY_WSEI_AMOUNT, native=True)
+            ]
+    else:
+        if "wrap" not in run.phases:
+            phases["wrap"] = [bot.wrap_step(SUPPLY_WSEI_AMOUNT)]
+        if "supply" not in run.phases:
+            phases["supply"] = [
+                *await bot.approval_steps(bot.WSEI_ADDRESS, SUPPLY_WSEI_AMOUNT),
+                bot.supply_step(bot.WSEI_ADDRESS, SUPPLY_WSEI_AMOUNT),
+            ]
+    if "borrow" not in run.phases:
+        phases["borrow"] = [bot.borrow_step(USDC_ADDRESS, BORROW_USDC_AMOUNT)]
+    if "repay" not in run.phases:
+        phases["repay"] = [
+            *await bot.approval_steps(USDC_ADDRESS, REPAY_USDC_AMOUNT),
+            bot.repay_step(USDC_ADDRESS, REPAY_USDC_AMOUNT),
+        ]
+    if "withdraw" not in run.phases:
+        phases["withdraw"] = [bot.withdraw_step(bot.WSEI_ADDRESS, WITHDRAW_WSEI_AMOUNT)]
+    steps = []
+    for phase, phase_steps in phases.items():
+        for step in phase_steps:
+            step.phase = phase
+        steps += phase_steps
+    bot.journal.plan(address, {phase: len(s) for phase, s in phases.items()})
+
+    if PIPELINE_TRANSACTIONS:
+        # Each step only depends on the previous one being mined first,
+        # which consecutive nonces already guarantee
+        await bot.send_pipeline(steps)
+    else:
+        for step in steps:
+            (receipt,) = await bot.send_pipeline([step])
+            if receipt is None or receipt.status != 1:
+                break
 
     print("=== Looping completed ===\n")
 
 
-def main():
-    wallets = load_wallets()
-    schedules = load_schedules()
-
-    accounts = {wallet["address"]: Account.from_key(wallet["pk"]) for wallet in wallets}
-
-    while True:
-        current_time = time.time()
-        print(current_time)
-
-        new_schedules = {}
-        for wallet_address, schedule_time in schedules.items():
-            if schedule_time <= current_time:
-                supply_and_borrow(accounts[wallet_address])
-            else:
-                new_schedules[wallet_address] = schedule_time
-        schedules = new_schedules
-
-        time.sleep(random.randint(1, 3))
+async def main():
+    await AsyncYeiPointBot.resolve_chain_metadata([USDC_ADDRESS])
+    await run_schedule(supply_and_borrow)
 
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
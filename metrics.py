@@ -0,0 +1,290 @@
+import atexit
+import json
+import os
+import threading
+import time
+
+from web3.middleware import Web3Middleware
+
+# Prometheus text file to write (textfile collector format)
+METRICS_FILE = os.getenv("METRICS_FILE")
+# JSONL file every timed event is appended to
+METRICS_TRACE_FILE = os.getenv("METRICS_TRACE_FILE")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "10"))
+
+METRIC_PREFIX = "yei_"
+HISTOGRAM_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120
+)  # fmt: skip
+
+# name: (type, Prometheus label names, help). Any other labels passed to
+# timer() / inc() only go to the JSONL trace, so per-wallet or per-hash
+# fields do not blow up the number of series.
+METRICS = {
+    "rpc_request_seconds": (
+        "histogram",
+        ("method",),
+        "JSON-RPC request latency as seen by the caller",
+    ),
+    "rpc_errors_total": (
+        "counter",
+        ("method",),
+        "JSON-RPC requests answered with an error or that raised",
+    ),
+    "rpc_endpoint_seconds": (
+        "histogram",
+        ("endpoint",),
+        "JSON-RPC latency per node behind the multi-endpoint router",
+    ),
+    "rpc_hedged_total": (
+        "counter",
+        ("method",),
+        "Reads raced against a second node after a slow first answer",
+    ),
+    "tx_phase_seconds": (
+        "histogram",
+        ("phase", "method"),
+        "Time spent per transaction phase (build, sign, send, sleep, wait)",
+    ),
+    "transactions_total": (
+        "counter",
+        ("method", "status"),
+        "Mined transactions by contract method and receipt status",
+    ),
+    "wallet_cycle_seconds": (
+        "histogram",
+        (),
+        "Duration of one scheduled wallet run",
+    ),
+    "wallet_cycles_total": (
+        "counter",
+        ("status",),
+        "Scheduled wallet runs by outcome",
+    ),
+}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class _NullTimer:
+    """Stand-in returned by timer() while metrics are off"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.labels.setdefault("error", exc_type.__name__)
+        elapsed = time.perf_counter() - self.start
+        self.metrics.observe(self.name, elapsed, **self.labels)
+        return False
+
+
+class Metrics:
+    """
+    Process-wide counters and latency histograms
+
+    Enabled when METRICS_FILE or METRICS_TRACE_FILE is set. Histograms are
+    written to METRICS_FILE in the Prometheus text format and every
+    observation is appended to METRICS_TRACE_FILE as one JSON line. Files are
+    rewritten at most every flush_interval seconds and once more at exit.
+    While disabled, timer() hands back a shared no-op context manager and
+    inc() returns immediately.
+    """
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, metrics_file=None, trace_file=None, flush_interval=10):
+        """
+        Args:
+            metrics_file: Prometheus text file to write, None to skip
+            trace_file: JSONL trace file to append to, None to skip
+            flush_interval: Seconds between file writes
+        """
+        self.metrics_file = metrics_file
+        self.trace_file = trace_file
+        self.flush_interval = flush_interval
+        self.enabled = bool(metrics_file or trace_file)
+        self._histograms = {}
+        self._counters = {}
+        self._trace = []
+        self._flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+        if self.enabled:
+            atexit.register(self.flush)
+
+    @classmethod
+    def shared(cls):
+        """Get the metrics shared by every bot in the process, configured from env"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls(
+                    METRICS_FILE, METRICS_TRACE_FILE, METRICS_FLUSH_INTERVAL
+                )
+            return cls._shared
+
+    def _key(self, name, labels):
+        label_names = METRICS[name][1]
+        return name, tuple(str(labels.get(label, "")) for label in label_names)
+
+    def timer(self, name, **labels):
+        """Context manager that observes its duration into histogram name"""
+        if not self.enabled:
+            return NULL_TIMER
+        return _Timer(self, name, labels)
+
+    def observe(self, name, seconds, **labels):
+        """Record one duration in histogram name"""
+        if not self.enabled:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                # Bucket counts, then sum and count
+                histogram = [0] * len(HISTOGRAM_BUCKETS) + [0.0, 0]
+                self._histograms[key] = histogram
+            for i, bound in enumerate(HISTOGRAM_BUCKETS):
+                if seconds <= bound:
+                    histogram[i] += 1
+            histogram[-2] += seconds
+            histogram[-1] += 1
+            if self.trace_file:
+                self._trace.append(
+                    {"ts": time.time(), "metric": name, "seconds": seconds, **labels}
+                )
+        self._maybe_flush()
+
+    def inc(self, name, amount=1, **labels):
+        """Increase counter name"""
+        if not self.enabled:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+            if self.trace_file:
+                self._trace.append({"ts": time.time(), "metric": name, **labels})
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if time.monotonic() - self._flushed_at >= self.flush_interval:
+            self.flush()
+
+    def _format_labels(self, name, values, extra=()):
+        pairs = list(zip(METRICS[name][1], values)) + list(extra)
+        if not pairs:
+            return ""
+        pairs = [f'{label}="{_escape(value)}"' for label, value in pairs]
+        return "{" + ",".join(pairs) + "}"
+
+    def render(self):
+        """Current metrics in the Prometheus text exposition format"""
+        with self._lock:
+            histograms = {key: list(value) for key, value in self._histograms.items()}
+            counters = dict(self._counters)
+
+        lines = []
+        for name, (kind, _, help_text) in METRICS.items():
+            series = histograms if kind == "histogram" else counters
+            keys = sorted(key for key in series if key[0] == name)
+            if not keys:
+                continue
+            full_name = METRIC_PREFIX + name
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            for key in keys:
+                values = key[1]
+                if kind == "counter":
+                    labels = self._format_labels(name, values)
+                    lines.append(f"{full_name}{labels} {series[key]}")
+                    continue
+                histogram = series[key]
+                for bound, count in zip(HISTOGRAM_BUCKETS, histogram):
+                    labels = self._format_labels(name, values, [("le", bound)])
+                    lines.append(f"{full_name}_bucket{labels} {count}")
+                labels = self._format_labels(name, values, [("le", "+Inf")])
+                lines.append(f"{full_name}_bucket{labels} {histogram[-1]}")
+                labels = self._format_labels(name, values)
+                lines.append(f"{full_name}_sum{labels} {histogram[-2]}")
+                lines.append(f"{full_name}_count{labels} {histogram[-1]}")
+        return "\n".join(lines) + "\n"
+
+    def flush(self):
+        """Rewrite the Prometheus file and append pending trace lines"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._flushed_at = time.monotonic()
+            trace, self._trace = self._trace, []
+        try:
+            if self.metrics_file:
+                # Write then rename so a scraper never reads half a file
+                tmp_file = f"{self.metrics_file}.tmp"
+                with open(tmp_file, "w") as f:
+                    f.write(self.render())
+                os.replace(tmp_file, self.metrics_file)
+            if self.trace_file and trace:
+                with open(self.trace_file, "a") as f:
+                    f.writelines(json.dumps(event) + "\n" for event in trace)
+        except OSError as e:
+            print(f"Writing metrics failed: {e}")
+
+
+class RPCMetricsMiddleware(Web3Middleware):
+    """
+    Times every JSON-RPC request and counts the failed ones
+
+    Sits above the provider, so with BatchingAsyncHTTPProvider a read's
+    latency includes the time it spent queued for its batch.
+    """
+
+    def _record(self, method, start, response):
+        metrics = Metrics.shared()
+        elapsed = time.perf_counter() - start
+        metrics.observe("rpc_request_seconds", elapsed, method=method)
+        if response is None or "error" in response:
+            metrics.inc("rpc_errors_total", method=method)
+
+    def wrap_make_request(self, make_request):
+        def middleware(method, params):
+            start = time.perf_counter()
+            response = None
+            try:
+                response = make_request(method, params)
+                return response
+            finally:
+                self._record(method, start, response)
+
+        return middleware
+
+    async def async_wrap_make_request(self, make_request):
+        async def middleware(method, params):
+            start = time.perf_counter()
+            response = None
+            try:
+                response = await make_request(method, params)
+                return response
+            finally:
+                self._record(method, start, response)
+
+        return middleware
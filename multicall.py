@@ -0,0 +1,108 @@
+import os
+from dataclasses import dataclass
+
+from web3 import Web3
+
+MULTICALL3_ADDRESS = os.getenv(
+    "MULTICALL3_ADDRESS", "0xcA11bde05977b3631167028862bE2a173976CA11"
+)
+# Wallets per aggregate3 call when snapshotting many addresses
+MULTICALL_BATCH_SIZE = int(os.getenv("MULTICALL_BATCH_SIZE", "100"))
+
+
+class MulticallError(Exception):
+    pass
+
+
+@dataclass
+class PositionSnapshot:
+    """State of one wallet's position, read in a single Multicall3 call"""
+
+    address: str
+    emode: int
+    native_balance: int
+    wsei_balance: int
+    account_data: dict
+    atoken_balance: int
+    debt_balance: int
+
+    @property
+    def health_factor(self):
+        return self.account_data["healthFactor"] / 1e18
+
+
+def encode_call(contract, fn_name, args):
+    """Encode a view call as a Multicall3 Call3 struct"""
+    return (contract.address, True, contract.encode_abi(fn_name, args=args))
+
+
+def decode_result(contract, fn_name, result):
+    """Decode a Multicall3 Result struct with the called function's outputs"""
+    success, return_data = result
+    if not success:
+        raise MulticallError(f"{fn_name} on {contract.address} reverted")
+    outputs = contract.get_function_by_name(fn_name).abi["outputs"]
+    values = contract.w3.codec.decode([o["type"] for o in outputs], return_data)
+    return values[0] if len(values) == 1 else values
+
+
+def snapshot_calls(bot, address):
+    """Calls making up a PositionSnapshot, in the order parse_snapshot expects"""
+    address = Web3.to_checksum_address(address)
+    return [
+        (bot.pool_contract, "getUserEMode", [address]),
+        (bot.multicall_contract, "getEthBalance", [address]),
+        (bot.wsei_contract, "balanceOf", [address]),
+        (bot.pool_contract, "getUserAccountData", [address]),
+        (bot.atoken_contract, "balanceOf", [address]),
+        (bot.debt_contract, "balanceOf", [address]),
+    ]
+
+
+def parse_snapshot(address, values):
+    """Build a PositionSnapshot from decoded snapshot_calls results"""
+    emode, native_balance, wsei_balance, account_data, atoken, debt = values
+    return PositionSnapshot(
+        address=Web3.to_checksum_address(address),
+        emode=emode,
+        native_balance=native_balance,
+        wsei_balance=wsei_balance,
+        account_data={
+            "totalCollateralBase": account_data[0],
+            "totalDebtBase": account_data[1],
+            "availableBorrowsBase": account_data[2],
+            "currentLiquidationThreshold": account_data[3],
+            "ltv": account_data[4],
+            "healthFactor": account_data[5],
+        },
+        atoken_balance=atoken,
+        debt_balance=debt,
+    )
+
+
+def snapshot_batches(bot, addresses, batch_size=None):
+    """
+    Split addresses into aggregate3 batches
+
+    Yields (batch_addresses, calls, encoded_calls) for each batch.
+    """
+    batch_size = batch_size or MULTICALL_BATCH_SIZE
+    for i in range(0, len(addresses), batch_size):
+        batch = addresses[i : i + batch_size]
+        calls = []
+        for address in batch:
+            calls.extend(snapshot_calls(bot, address))
+        yield batch, calls, [encode_call(*call) for call in calls]
+
+
+def parse_snapshot_batch(batch, calls, results):
+    """Decode one aggregate3 batch into PositionSnapshots"""
+    values = [
+        decode_result(contract, fn_name, result)
+        for (contract, fn_name, _), result in zip(calls, results)
+    ]
+    per_wallet = len(values) // len(batch)
+    return [
+        parse_snapshot(address, values[i * per_wallet : (i + 1) * per_wallet])
+        for i, address in enumerate(batch)
+    ]
@@ -0,0 +1,85 @@
+import asyncio
+import threading
+
+# Substrings nodes use when a transaction is rejected because of its nonce
+NONCE_ERROR_MESSAGES = (
+    "nonce too low",
+    "nonce too high",
+    "invalid nonce",
+    "nonce has already been used",
+    "replacement transaction underpriced",
+)
+
+
+def is_nonce_error(error):
+    """Check whether a send_raw_transaction error was caused by a bad nonce"""
+    message = str(error).lower()
+    return any(text in message for text in NONCE_ERROR_MESSAGES)
+
+
+class NonceManager:
+    """
+    Hands out nonces for one account locally
+
+    The pending nonce is fetched from the chain once; after that every
+    transaction takes the next value without an RPC round trip. Call reset()
+    when the node rejects a nonce so the next request resyncs from the chain.
+    """
+
+    _managers = {}
+    _managers_lock = threading.Lock()
+
+    def __init__(self, address):
+        self.address = address
+        self._nonce = None
+        self._lock = threading.Lock()
+        self._async_lock = None
+
+    @classmethod
+    def for_address(cls, address):
+        """Get the manager shared by every bot using this address"""
+        with cls._managers_lock:
+            manager = cls._managers.get(address)
+            if manager is None:
+                manager = cls(address)
+                cls._managers[address] = manager
+            return manager
+
+    def _take(self):
+        nonce = self._nonce
+        self._nonce += 1
+        return nonce
+
+    def next_nonce(self, w3):
+        """
+        Get the next nonce, fetching the pending count on first use
+
+        Args:
+            w3: Web3 instance used to resync with the chain
+        """
+        with self._lock:
+            if self._nonce is None:
+                self._nonce = w3.eth.get_transaction_count(self.address, "pending")
+            return self._take()
+
+    async def async_next_nonce(self, w3):
+        """
+        Get the next nonce, fetching the pending count on first use
+
+        Args:
+            w3: AsyncWeb3 instance used to resync with the chain
+        """
+        if self._async_lock is None:
+            self._async_lock = asyncio.Lock()
+        async with self._async_lock:
+            if self._nonce is None:
+                self._nonce = await w3.eth.get_transaction_count(
+                    self.address, "pending"
+                )
+            with self._lock:
+                return self._take()
+
+    def reset(self):
+        """Forget the local nonce so the next transaction resyncs from the chain"""
+        with self._lock:
+            self._nonce = None
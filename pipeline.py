@@ -0,0 +1,318 @@
+import os
+from dataclasses import dataclass
+
+from web3 import Web3
+
+# Replacement transactions must outbid the pending one (geth requires +10%)
+CANCEL_GAS_PRICE_BUMP = float(os.getenv("CANCEL_GAS_PRICE_BUMP", "1.2"))
+RECEIPT_TIMEOUT = float(os.getenv("RECEIPT_TIMEOUT", "120"))
+RECEIPT_POLL_INTERVAL = float(os.getenv("RECEIPT_POLL_INTERVAL", "0.5"))
+
+MAX_UINT256 = 2**256 - 1
+
+
+@dataclass
+class TransactionStep:
+    """One contract call to send, with the label used in log lines"""
+
+    label: str
+    contract_function: object
+    gas: int
+    value: int = 0
+    # Called once the step's receipt shows success
+    on_success: object = None
+    # (method, asset) the gas estimate is cached under; gas is the fallback
+    gas_key: tuple = None
+    # Phase of the wallet run the step belongs to, for the journal
+    phase: str = None
+
+    @property
+    def method(self):
+        """Contract method name, used to label metrics"""
+        return self.gas_key[0] if self.gas_key else self.label
+
+
+def cancel_transaction(address, nonce, gas_price, chain_id):
+    """
+    Build a zero-value self-transfer that replaces a pending transaction
+
+    Args:
+        address: Sender address
+        nonce: Nonce of the transaction to replace
+        gas_price: Gas price the pending transaction was sent with
+        chain_id: Chain ID for EIP-155 signing
+    """
+    return {
+        "from": address,
+        "to": address,
+        "value": 0,
+        "nonce": nonce,
+        "gas": 21000,
+        "gasPrice": int(gas_price * CANCEL_GAS_PRICE_BUMP),
+        "chainId": chain_id,
+    }
+
+
+class StepBuilder:
+    """
+    Builds TransactionSteps for the bot operations
+
+    Mixed into AsyncYeiPointBot: building the contract call needs no RPC,
+    only sending it does.
+    """
+
+    def wrap_step(self, amount):
+        return TransactionStep(
+            f"Wrap {amount} SEI to WSEI",
+            self.wsei_contract.functions.deposit(),
+            300000,
+            value=amount,
+            gas_key=("deposit", self.wsei_contract.address),
+        )
+
+    def uses_gateway(self, token_address):
+        """Whether token_address can go through the WrappedTokenGateway as SEI"""
+        return self.gateway_contract is not None and Web3.to_checksum_address(
+            token_address
+        ) == Web3.to_checksum_address(self.WSEI_ADDRESS)
+
+    def _gateway_for(self, token_address):
+        if not self.uses_gateway(token_address):
+            raise ValueError(
+                f"No WrappedTokenGateway for {token_address}, "
+                "set WRAPPED_TOKEN_GATEWAY_ADDRESS for native WSEI operations"
+            )
+        return self.gateway_contract
+
+    def approve_step(self, token_address, amount, spender=None):
+        if spender is None:
+            spender = self.pool_contract.address
+        token_contract = self.get_erc20_contract(token_address)
+        return TransactionStep(
+            "Token approval",
+            token_contract.functions.approve(
+                Web3.to_checksum_address(spender), amount
+            ),
+            100000,
+            on_success=lambda: self.allowance_cache.set(
+                self.address, token_address, spender, amount
+            ),
+            gas_key=("approve", token_contract.address),
+        )
+
+    def delegation_step(self, amount):
+        """Let the gateway borrow WSEI against the caller's collateral"""
+        gateway = self._gateway_for(self.WSEI_ADDRESS)
+        return TransactionStep(
+            "Credit delegation",
+            self.debt_contract.functions.approveDelegation(gateway.address, amount),
+            100000,
+            on_success=lambda: self.allowance_cache.set(
+                self.address,
+                self.debt_contract.address,
+                gateway.address,
+                amount,
+            ),
+            gas_key=("approveDelegation", self.debt_contract.address),
+        )
+
+    def supply_step(self, token_address, amount, on_behalf_of=None, native=False):
+        """
+        Supply amount of token, or with native=True that much SEI through
+        the gateway's depositETH, which needs neither a wrap nor an approval
+        """
+        if on_behalf_of is None:
+            on_behalf_of = self.address
+        if native:
+            gateway = self._gateway_for(token_address)
+            return TransactionStep(
+                "Native supply",
+                gateway.functions.depositETH(
+                    self.pool_contract.address,
+                    Web3.to_checksum_address(on_behalf_of),
+                    0,  # referralCode
+                ),
+                300000,
+                value=amount,
+                gas_key=("depositETH", gateway.address),
+            )
+        return TransactionStep(
+            "Supply",
+            self.pool_contract.functions.supply(
+                Web3.to_checksum_address(token_address),
+                amount,
+                Web3.to_checksum_address(on_behalf_of),
+                0,  # referralCode
+            ),
+            300000,
+            on_success=lambda: self.allowance_cache.spend(
+                self.address, token_address, self.pool_contract.address, amount
+            ),
+            gas_key=("supply", Web3.to_checksum_address(token_address)),
+        )
+
+    def set_user_emode_step(self, category_id):
+        return TransactionStep(
+            f"Set eMode category {category_id}",
+            self.pool_contract.functions.setUserEMode(category_id),
+            150000,
+            gas_key=("setUserEMode", category_id),
+        )
+
+    def borrow_step(
+        self,
+        token_address,
+        amount,
+        interest_rate_mode=2,
+        on_behalf_of=None,
+        native=False,
+    ):
+        """
+        Borrow amount of token, or with native=True receive it as SEI through
+        the gateway's borrowETH (needs a delegation_step first)
+        """
+        if on_behalf_of is None:
+            on_behalf_of = self.address
+        if native:
+            gateway = self._gateway_for(token_address)
+            return TransactionStep(
+                "Native borrow",
+                gateway.functions.borrowETH(
+                    self.pool_contract.address,
+                    amount,
+                    interest_rate_mode,
+                    0,  # referralCode
+                ),
+                450000,
+                on_success=lambda: self.allowance_cache.spend(
+                    self.address,
+                    self.debt_contract.address,
+                    gateway.address,
+                    amount,
+                ),
+                gas_key=("borrowETH", gateway.address),
+            )
+        return TransactionStep(
+            "Borrow",
+            self.pool_contract.functions.borrow(
+                Web3.to_checksum_address(token_address),
+                amount,
+                interest_rate_mode,
+                0,  # referralCode
+                Web3.to_checksum_address(on_behalf_of),
+            ),
+            400000,
+            gas_key=("borrow", Web3.to_checksum_address(token_address)),
+        )
+
+    def repay_step(
+        self,
+        token_address,
+        amount,
+        interest_rate_mode=2,
+        on_behalf_of=None,
+        native=False,
+        value=None,
+    ):
+        """
+        Repay amount of token (2**256-1 for the whole debt), or with
+        native=True repay it in SEI through the gateway's repayETH
+
+        Args:
+            value: SEI sent with a native repayment (default: amount); for a
+                full repayment it must cover the debt, the rest is refunded
+        """
+        if on_behalf_of is None:
+            on_behalf_of = self.address
+        if native:
+            gateway = self._gateway_for(token_address)
+            if value is None:
+                if amount == MAX_UINT256:
+                    raise ValueError("A native full repayment needs a value")
+                value = amount
+            full = amount == MAX_UINT256
+            return TransactionStep(
+                "Native full repayment" if full else "Native repayment",
+                gateway.functions.repayETH(
+                    self.pool_contract.address,
+                    amount,
+                    interest_rate_mode,
+                    Web3.to_checksum_address(on_behalf_of),
+                ),
+                300000,
+                value=value,
+                gas_key=("repayETH", gateway.address),
+            )
+
+        def on_success():
+            # A full repayment pulls the unknown current debt
+            if amount == MAX_UINT256:
+                self.allowance_cache.invalidate(
+                    self.address, token_address, self.pool_contract.address
+                )
+            else:
+                self.allowance_cache.spend(
+                    self.address,
+                    token_address,
+                    self.pool_contract.address,
+                    amount,
+                )
+
+        return TransactionStep(
+            "Full repayment" if amount == MAX_UINT256 else "Repayment",
+            self.pool_contract.functions.repay(
+                Web3.to_checksum_address(token_address),
+                amount,
+                interest_rate_mode,
+                Web3.to_checksum_address(on_behalf_of),
+            ),
+            300000,
+            on_success=on_success,
+            gas_key=("repay", Web3.to_checksum_address(token_address)),
+        )
+
+    def withdraw_step(self, token_address, amount, to=None, native=False):
+        """
+        Withdraw amount of token (2**256-1 for everything), or with
+        native=True receive it as SEI through the gateway's withdrawETH (needs
+        the aToken approved to the gateway)
+        """
+        if to is None:
+            to = self.address
+        if native:
+            gateway = self._gateway_for(token_address)
+            atoken_address = self.atoken_contract.address
+
+            def on_success():
+                # A full withdrawal pulls the unknown current balance
+                if amount == MAX_UINT256:
+                    self.allowance_cache.invalidate(
+                        self.address, atoken_address, gateway.address
+                    )
+                else:
+                    self.allowance_cache.spend(
+                        self.address, atoken_address, gateway.address, amount
+                    )
+
+            full = amount == MAX_UINT256
+            return TransactionStep(
+                "Native full withdrawal" if full else "Native withdrawal",
+                gateway.functions.withdrawETH(
+                    self.pool_contract.address,
+                    amount,
+                    Web3.to_checksum_address(to),
+                ),
+                350000,
+                on_success=on_success,
+                gas_key=("withdrawETH", gateway.address),
+            )
+        return TransactionStep(
+            "Full withdrawal" if amount == MAX_UINT256 else "Withdrawal",
+            self.pool_contract.functions.withdraw(
+                Web3.to_checksum_address(token_address),
+                amount,
+                Web3.to_checksum_address(to),
+            ),
+            300000,
+            gas_key=("withdraw", Web3.to_checksum_address(token_address)),
+        )
@@ -0,0 +1,260 @@
+import os
+from dataclasses import dataclass, field
+
+# Share of the borrowing headroom used each round, as in the original loop
+LEVERAGE_SAFETY = float(os.getenv("LEVERAGE_SAFETY", "0.99"))
+# Rounds smaller than this (in SEI) are not worth a borrow + supply pair
+LEVERAGE_DUST = int(float(os.getenv("LEVERAGE_DUST", "0.1")) * 1e18)
+LEVERAGE_MAX_ROUNDS = int(os.getenv("LEVERAGE_MAX_ROUNDS", "50"))
+# Health factor each unwind withdrawal may bring the position down to. Loops
+# are built down to MIN_HEALTH_FACTOR and accrued interest pulls them lower
+# still, so a floor at that target would leave nothing to withdraw; it
+# defaults to halfway between the target and liquidation (1.0)
+UNWIND_HEALTH_FACTOR = float(
+    os.getenv("UNWIND_HEALTH_FACTOR")
+    or (1 + float(os.getenv("MIN_HEALTH_FACTOR") or "1.05")) / 2
+)
+# Share of the debt withdrawn on top for the final full repayment, covering
+# the interest accrued until it mines
+UNWIND_INTEREST_MARGIN = float(os.getenv("UNWIND_INTEREST_MARGIN", "0.001"))
+UNWIND_MAX_ROUNDS = int(os.getenv("UNWIND_MAX_ROUNDS", "100"))
+
+BPS = 10000
+
+
+def parse_reserve_configuration(configuration):
+    """
+    Decode the Aave V3 ReserveConfigurationMap bitmap
+
+    Args:
+        configuration: The configuration field of get_reserve_data
+    """
+    return {
+        "ltv": configuration & 0xFFFF,
+        "liquidationThreshold": (configuration >> 16) & 0xFFFF,
+        "liquidationBonus": (configuration >> 32) & 0xFFFF,
+        "decimals": (configuration >> 48) & 0xFF,
+    }
+
+
+def leverage_params(reserve_data, emode_data=None, max_ltv=None):
+    """
+    Get the LTV and liquidation threshold (in bps) that apply to a loop
+
+    Args:
+        reserve_data: Result of get_reserve_data for the looped asset
+        emode_data: Result of get_emode_category_data, None outside eMode
+        max_ltv: Optional cap on the LTV as a fraction (e.g. MAX_LTV)
+    """
+    if emode_data is not None and emode_data["ltv"]:
+        ltv = emode_data["ltv"]
+        liquidation_threshold = emode_data["liquidationThreshold"]
+    else:
+        config = parse_reserve_configuration(reserve_data["configuration"])
+        ltv = config["ltv"]
+        liquidation_threshold = config["liquidationThreshold"]
+    if max_ltv is not None:
+        ltv = min(ltv, int(max_ltv * BPS))
+    return ltv, liquidation_threshold
+
+
+@dataclass
+class LeveragePlan:
+    """Borrow/supply amounts for a same-asset loop and the expected end state"""
+
+    collateral: int
+    debt: int
+    liquidation_threshold: int
+    borrow_amounts: list = field(default_factory=list)
+
+    def __len__(self):
+        return len(self.borrow_amounts)
+
+    @property
+    def final_collateral(self):
+        return self.collateral + sum(self.borrow_amounts)
+
+    @property
+    def final_debt(self):
+        return self.debt + sum(self.borrow_amounts)
+
+    @property
+    def health_factor(self):
+        if self.final_debt == 0:
+            return float("inf")
+        return self.final_collateral * self.liquidation_threshold / (
+            self.final_debt * BPS
+        )
+
+
+def target_borrow(collateral, debt, liquidation_threshold, target_health_factor):
+    """
+    Total amount to borrow and resupply so the health factor lands on target
+
+    Solves (C + x) * LT / (D + x) = HF for x. Returns None when the target is
+    below the liquidation threshold, i.e. the LTV is the only limit.
+    """
+    target_bps = int(target_health_factor * BPS)
+    if target_bps <= liquidation_threshold:
+        return None
+    total = (collateral * liquidation_threshold - target_bps * debt) // (
+        target_bps - liquidation_threshold
+    )
+    return max(total, 0)
+
+
+def plan_leverage(
+    collateral,
+    debt,
+    ltv,
+    liquidation_threshold,
+    target_health_factor,
+    dust=None,
+    safety=None,
+    max_rounds=None,
+):
+    """
+    Plan a same-asset supply/borrow loop from a single position read
+
+    Each round borrows safety * (C * LTV - D) and resupplies it, so the
+    headroom shrinks geometrically by 1 - safety * (1 - LTV) per round. Rounds
+    stop once the target health factor is reached, the next amount falls
+    below dust, or max_rounds is hit; the last round is trimmed to land on the
+    target.
+
+    Args:
+        collateral: Supplied amount (aToken balance, in wei)
+        debt: Borrowed amount (debt token balance, in wei)
+        ltv: Loan to value in bps
+        liquidation_threshold: Liquidation threshold in bps
+        target_health_factor: Health factor to stop at (e.g. MIN_HEALTH_FACTOR)
+        dust: Smallest worthwhile borrow (default: LEVERAGE_DUST)
+        safety: Share of the headroom used per round (default: LEVERAGE_SAFETY)
+        max_rounds: Most rounds to plan (default: LEVERAGE_MAX_ROUNDS)
+    """
+    dust = LEVERAGE_DUST if dust is None else dust
+    safety = LEVERAGE_SAFETY if safety is None else safety
+    max_rounds = LEVERAGE_MAX_ROUNDS if max_rounds is None else max_rounds
+
+    plan = LeveragePlan(collateral, debt, liquidation_threshold)
+    remaining = target_borrow(
+        collateral, debt, liquidation_threshold, target_health_factor
+    )
+
+    while len(plan) < max_rounds:
+        headroom = plan.final_collateral * ltv // BPS - plan.final_debt
+        amount = int(headroom * safety)
+        if remaining is not None:
+            amount = min(amount, remaining)
+        if amount < max(dust, 1):
+            break
+        plan.borrow_amounts.append(amount)
+        if remaining is not None:
+            remaining -= amount
+    return plan
+
+
+@dataclass
+class UnwindPlan:
+    """Withdraw/repay rounds that close a same-asset loop"""
+
+    collateral: int
+    debt: int
+    liquidation_threshold: int
+    # (withdraw amount, repay amount) per round
+    rounds: list = field(default_factory=list)
+    # Withdrawn before the final full repayment, None if the plan does not
+    # reach it within max_rounds
+    final_withdraw: int = None
+    # Most the final full repayment may pull (debt left plus margin)
+    final_repay: int = 0
+
+    def __len__(self):
+        """Transactions the plan sends, not counting an approval"""
+        count = sum(1 if withdraw else 0 for withdraw, _ in self.rounds)
+        count += len(self.rounds)
+        if self.closes:
+            count += 1 if self.final_withdraw else 0
+            count += 1 if self.final_repay else 0
+            count += 1
+        return count
+
+    @property
+    def closes(self):
+        """Whether the plan ends with the full repayment and withdrawal"""
+        return self.final_withdraw is not None
+
+    @property
+    def repay_total(self):
+        """Most the plan's repayments may pull, i.e. the allowance it needs"""
+        return sum(repay for _, repay in self.rounds) + self.final_repay
+
+
+def max_withdraw(collateral, debt, liquidation_threshold, target_health_factor):
+    """
+    Largest withdrawal that keeps the health factor at target
+
+    Solves (C - x) * LT / D = HF for x.
+    """
+    if debt == 0:
+        return collateral
+    target_bps = int(target_health_factor * BPS)
+    kept = -(-debt * target_bps // liquidation_threshold)
+    return max(collateral - kept, 0)
+
+
+def plan_unwind(
+    collateral,
+    debt,
+    liquidation_threshold,
+    target_health_factor=None,
+    balance=0,
+    margin=None,
+    safety=None,
+    max_rounds=None,
+):
+    """
+    Plan the fewest transactions that close a same-asset loop
+
+    Each round withdraws as much as the health factor allows and repays it,
+    which grows the next round's headroom by a factor of HF / LT. As soon as
+    the headroom plus the wallet's balance covers the remaining debt (with
+    margin for accrued interest), the plan withdraws that, repays 2**256-1
+    and withdraws 2**256-1 instead of more rounds.
+
+    Args:
+        collateral: Supplied amount (aToken balance, in wei)
+        debt: Borrowed amount (debt token balance, in wei)
+        liquidation_threshold: Liquidation threshold in bps
+        target_health_factor: Lowest health factor after a withdrawal
+            (default: UNWIND_HEALTH_FACTOR)
+        balance: Tokens already in the wallet, repaid in the first round
+        margin: Extra share of the debt withdrawn for the full repayment
+            (default: UNWIND_INTEREST_MARGIN)
+        safety: Share of the headroom used per round (default: LEVERAGE_SAFETY)
+        max_rounds: Most rounds to plan (default: UNWIND_MAX_ROUNDS)
+    """
+    if target_health_factor is None:
+        target_health_factor = UNWIND_HEALTH_FACTOR
+    margin = UNWIND_INTEREST_MARGIN if margin is None else margin
+    safety = LEVERAGE_SAFETY if safety is None else safety
+    max_rounds = UNWIND_MAX_ROUNDS if max_rounds is None else max_rounds
+
+    plan = UnwindPlan(collateral, debt, liquidation_threshold)
+    while True:
+        needed = debt + int(debt * margin) if debt else 0
+        headroom = max_withdraw(
+            collateral, debt, liquidation_threshold, target_health_factor
+        )
+        amount = min(int(headroom * safety), collateral)
+        if balance + amount >= needed:
+            plan.final_withdraw = max(needed - balance, 0)
+            plan.final_repay = needed
+            return plan
+        if len(plan.rounds) >= max_rounds or balance + amount == 0:
+            return plan
+        repay = balance + amount
+        plan.rounds.append((amount, repay))
+        collateral -= amount
+        debt -= repay
+        balance = 0
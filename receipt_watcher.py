@@ -0,0 +1,136 @@
+import asyncio
+import os
+
+from hexbytes import HexBytes
+from web3 import AsyncWeb3, WebSocketProvider
+from web3.exceptions import TimeExhausted, TransactionNotFound
+
+from pipeline import RECEIPT_POLL_INTERVAL, RECEIPT_TIMEOUT
+
+# Optional websocket endpoint; new blocks are then pushed instead of polled
+RPC_WS_URL = os.getenv("RPC_WS_URL")
+
+
+class ReceiptWatcher:
+    """
+    One receipt poller shared by every in-flight transaction
+
+    Watches for new blocks (eth_blockNumber polling, or a newHeads
+    subscription when RPC_WS_URL is set) and on each new block fetches the
+    receipts of all pending hashes together. With BatchingAsyncHTTPProvider
+    those lookups go out as a single JSON-RPC batch, so receipt traffic grows
+    with the number of blocks rather than transactions times polls.
+    """
+
+    _shared = None
+
+    def __init__(self, w3, poll_interval=None, ws_url=None):
+        """
+        Args:
+            w3: AsyncWeb3 instance used for block numbers and receipts
+            poll_interval: Seconds between eth_blockNumber polls
+            ws_url: Websocket endpoint to subscribe to newHeads on
+        """
+        self.w3 = w3
+        self.poll_interval = poll_interval or RECEIPT_POLL_INTERVAL
+        self.ws_url = ws_url
+        self.latest_block = None
+        self._pending = {}
+        self._waiters = {}
+        self._task = None
+
+    @classmethod
+    def shared(cls, w3):
+        """Get the watcher shared by every bot in the process"""
+        if cls._shared is None:
+            cls._shared = cls(w3, ws_url=RPC_WS_URL)
+        return cls._shared
+
+    async def wait_for_receipt(self, tx_hash, timeout=None):
+        """
+        Wait until tx_hash is mined and return its receipt
+
+        Args:
+            tx_hash: Transaction hash to wait for
+            timeout: Seconds before raising TimeExhausted (default: RECEIPT_TIMEOUT)
+        """
+        timeout = timeout or RECEIPT_TIMEOUT
+        key = HexBytes(tx_hash)
+        future = self._pending.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._pending[key] = future
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            raise TimeExhausted(
+                f"Transaction {key.hex()} is not in the chain after {timeout} seconds"
+            )
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                # Nobody is waiting any more, stop looking the hash up
+                del self._waiters[key]
+                if self._pending.get(key) is future:
+                    del self._pending[key]
+
+    async def _run(self):
+        blocks = self._subscribe_blocks() if self.ws_url else self._poll_blocks()
+        try:
+            async for block_number in blocks:
+                self.latest_block = block_number
+                await self._check_receipts()
+                if not self._pending:
+                    return
+        finally:
+            await blocks.aclose()
+            # A restarted watcher must look its hashes up on the first poll,
+            # even if no block was mined since: with blocks mined on every
+            # send, another one may never come
+            self.latest_block = None
+
+    async def _poll_blocks(self):
+        while True:
+            try:
+                block_number = await self.w3.eth.block_number
+            except Exception as e:
+                print(f"Block number poll failed: {e}")
+            else:
+                if block_number != self.latest_block:
+                    yield block_number
+            await asyncio.sleep(self.poll_interval)
+
+    async def _subscribe_blocks(self):
+        try:
+            async with AsyncWeb3(WebSocketProvider(self.ws_url)) as ws3:
+                await ws3.eth.subscribe("newHeads")
+                # Receipts mined before the subscription started
+                yield await self.w3.eth.block_number
+                async for message in ws3.socket.process_subscriptions():
+                    yield message["result"]["number"]
+        except Exception as e:
+            print(f"newHeads subscription failed, polling instead: {e}")
+            async for block_number in self._poll_blocks():
+                yield block_number
+
+    async def _check_receipts(self):
+        hashes = list(self._pending)
+        results = await asyncio.gather(
+            *[self.w3.eth.get_transaction_receipt(tx_hash) for tx_hash in hashes],
+            return_exceptions=True,
+        )
+        for tx_hash, result in zip(hashes, results):
+            if isinstance(result, TransactionNotFound):
+                continue
+            if isinstance(result, Exception):
+                # Transient RPC error, try again on the next block
+                print(f"Receipt lookup for {tx_hash.hex()} failed: {result}")
+                continue
+            future = self._pending.pop(tx_hash, None)
+            if future is not None and not future.done():
+                future.set_result(result)
@@ -0,0 +1,230 @@
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+from web3 import Web3
+
+# Seconds reserve indexes and rates are reused, roughly one block window
+RESERVE_STATE_TTL = float(os.getenv("RESERVE_STATE_TTL", "5"))
+# Largest relative gap between a projected and an on-chain balance
+BALANCE_TOLERANCE = float(os.getenv("BALANCE_TOLERANCE", "0.0001"))
+# Seconds between on-chain checks of balances projected from a reserve's state
+BALANCE_VERIFY_INTERVAL = float(os.getenv("BALANCE_VERIFY_INTERVAL", "300"))
+
+RAY = 10**27
+HALF_RAY = RAY // 2
+SECONDS_PER_YEAR = 365 * 24 * 60 * 60
+
+
+def ray_mul(a, b):
+    """a * b in ray, rounding half up like Aave's WadRayMath"""
+    return (a * b + HALF_RAY) // RAY
+
+
+def ray_div(a, b):
+    """a / b in ray, rounding half up like Aave's WadRayMath"""
+    return (a * RAY + b // 2) // b
+
+
+def linear_interest(rate, last_update, timestamp):
+    """
+    Aave's MathUtils.calculateLinearInterest: the supply side accrues simple
+    interest between index updates
+
+    Args:
+        rate: Yearly rate in ray (currentLiquidityRate)
+        last_update: lastUpdateTimestamp of the reserve
+        timestamp: Time to accrue up to
+    """
+    return RAY + rate * (timestamp - last_update) // SECONDS_PER_YEAR
+
+
+def compounded_interest(rate, last_update, timestamp):
+    """
+    Aave's MathUtils.calculateCompoundedInterest: the borrow side compounds
+    per second, approximated by the first three terms of the binomial expansion
+
+    Args:
+        rate: Yearly rate in ray (currentVariableBorrowRate)
+        last_update: lastUpdateTimestamp of the reserve
+        timestamp: Time to accrue up to
+    """
+    exp = timestamp - last_update
+    if exp == 0:
+        return RAY
+    exp_minus_one = exp - 1
+    exp_minus_two = exp - 2 if exp > 2 else 0
+    base_power_two = ray_mul(rate, rate) // (SECONDS_PER_YEAR * SECONDS_PER_YEAR)
+    base_power_three = ray_mul(base_power_two, rate) // SECONDS_PER_YEAR
+    second_term = exp * exp_minus_one * base_power_two // 2
+    third_term = exp * exp_minus_one * exp_minus_two * base_power_three // 6
+    return RAY + rate * exp // SECONDS_PER_YEAR + second_term + third_term
+
+
+@dataclass
+class ReserveState:
+    """Indexes and rates of one reserve, as of its last on-chain update"""
+
+    liquidity_index: int
+    liquidity_rate: int
+    variable_borrow_index: int
+    variable_borrow_rate: int
+    last_update: int
+    fetched_at: float = 0.0
+
+    @classmethod
+    def from_reserve_data(cls, reserve_data):
+        """Build from the dict returned by get_reserve_data"""
+        return cls(
+            liquidity_index=reserve_data["liquidityIndex"],
+            liquidity_rate=reserve_data["currentLiquidityRate"],
+            variable_borrow_index=reserve_data["variableBorrowIndex"],
+            variable_borrow_rate=reserve_data["currentVariableBorrowRate"],
+            last_update=reserve_data["lastUpdateTimestamp"],
+            fetched_at=time.monotonic(),
+        )
+
+    def normalized_income(self, timestamp):
+        """Liquidity index accrued up to timestamp (getReserveNormalizedIncome)"""
+        if timestamp <= self.last_update:
+            return self.liquidity_index
+        return ray_mul(
+            linear_interest(self.liquidity_rate, self.last_update, timestamp),
+            self.liquidity_index,
+        )
+
+    def normalized_debt(self, timestamp):
+        """Borrow index accrued up to timestamp (getReserveNormalizedVariableDebt)"""
+        if timestamp <= self.last_update:
+            return self.variable_borrow_index
+        return ray_mul(
+            compounded_interest(self.variable_borrow_rate, self.last_update, timestamp),
+            self.variable_borrow_index,
+        )
+
+    def atoken_balance(self, scaled_balance, timestamp):
+        """aToken balanceOf projected from its scaledBalanceOf"""
+        return ray_mul(scaled_balance, self.normalized_income(timestamp))
+
+    def debt_balance(self, scaled_balance, timestamp):
+        """Variable debt token balanceOf projected from its scaledBalanceOf"""
+        return ray_mul(scaled_balance, self.normalized_debt(timestamp))
+
+
+class ReserveStateCache:
+    """
+    Process-wide reserve states and scaled balances for projecting positions
+
+    Balances of aTokens and variable debt tokens only change between a
+    wallet's own transactions through the reserve indexes, so they are
+    projected from the wallet's scaled balances and the reserve's last index
+    and rate instead of being read with balanceOf. Reserve states are reused
+    for ttl seconds; scaled balances are kept until the wallet sends another
+    transaction. Scaled balances are read as they are, so only the index
+    math can drift, and it is the same for every wallet: every
+    verify_interval seconds one projection per reserve is compared with an
+    on-chain read, and a gap larger than tolerance drops the cached state so
+    it is read again.
+    """
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, ttl=5, tolerance=0.0001, verify_interval=300):
+        """
+        Args:
+            ttl: Seconds a reserve state is reused before it is read again
+            tolerance: Largest accepted relative gap against an on-chain read
+            verify_interval: Seconds between on-chain checks per reserve
+                (0 to check every projection)
+        """
+        self.ttl = ttl
+        self.tolerance = tolerance
+        self.verify_interval = verify_interval
+        self._states = {}
+        self._scaled = {}
+        self._verified_at = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def shared(cls):
+        """Get the cache shared by every bot in the process, configured from env"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls(
+                    RESERVE_STATE_TTL, BALANCE_TOLERANCE, BALANCE_VERIFY_INTERVAL
+                )
+            return cls._shared
+
+    def state(self, asset):
+        """Cached state of a reserve, or None if missing or older than ttl"""
+        state = self._states.get(Web3.to_checksum_address(asset))
+        if state is None or time.monotonic() - state.fetched_at >= self.ttl:
+            return None
+        return state
+
+    def set_state(self, asset, reserve_data):
+        """Store a reserve's state from get_reserve_data and return it"""
+        state = ReserveState.from_reserve_data(reserve_data)
+        with self._lock:
+            self._states[Web3.to_checksum_address(asset)] = state
+        return state
+
+    def scaled_balance(self, token, address):
+        """Cached scaledBalanceOf, or None if it has not been read yet"""
+        key = (Web3.to_checksum_address(token), Web3.to_checksum_address(address))
+        return self._scaled.get(key)
+
+    def set_scaled_balance(self, token, address, scaled_balance):
+        key = (Web3.to_checksum_address(token), Web3.to_checksum_address(address))
+        with self._lock:
+            self._scaled[key] = scaled_balance
+
+    def invalidate(self, address):
+        """Forget a wallet's scaled balances, e.g. after it sent a transaction"""
+        address = Web3.to_checksum_address(address)
+        with self._lock:
+            for key in [key for key in self._scaled if key[1] == address]:
+                del self._scaled[key]
+
+    def needs_verify(self, asset):
+        """Whether projections from the reserve's state are due for a check"""
+        verified_at = self._verified_at.get(Web3.to_checksum_address(asset))
+        return (
+            verified_at is None
+            or time.monotonic() - verified_at >= self.verify_interval
+        )
+
+    def verify(self, asset, address, projected, actual):
+        """
+        Compare projected balances with on-chain ones
+
+        Args:
+            asset: Reserve the balances belong to
+            address: Wallet address
+            projected: Projected balances
+            actual: The same balances read on-chain
+
+        Returns:
+            True if every balance is within tolerance; otherwise the reserve
+            state and the wallet's scaled balances are dropped
+        """
+        within = all(
+            abs(p - a) <= self.tolerance * max(a, 1) for p, a in zip(projected, actual)
+        )
+        asset = Web3.to_checksum_address(asset)
+        address = Web3.to_checksum_address(address)
+        if within:
+            with self._lock:
+                self._verified_at[asset] = time.monotonic()
+            return True
+        print(
+            f"Projected balances {projected} of {address} drifted from "
+            f"on-chain {actual}, refreshing reserve state"
+        )
+        with self._lock:
+            self._states.pop(asset, None)
+            self._verified_at.pop(asset, None)
+        self.invalidate(address)
+        return False
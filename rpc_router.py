@@ -0,0 +1,396 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from eth_utils import keccak
+from hexbytes import HexBytes
+from web3.providers import AsyncBaseProvider, BaseProvider
+
+from metrics import Metrics
+
+# Reads still pending after this percentile of the node's latency are raced
+# against the next best node
+RPC_HEDGE_PERCENTILE = float(os.getenv("RPC_HEDGE_PERCENTILE", "0.9"))
+RPC_HEDGE_MIN_DELAY = float(os.getenv("RPC_HEDGE_MIN_DELAY", "0.05"))
+# Nodes each raw transaction is sent to
+RPC_BROADCAST_COUNT = int(os.getenv("RPC_BROADCAST_COUNT", "3"))
+# Seconds a node is skipped after repeated failures
+RPC_FAILURE_COOLDOWN = float(os.getenv("RPC_FAILURE_COOLDOWN", "30"))
+RPC_LATENCY_WINDOW = int(os.getenv("RPC_LATENCY_WINDOW", "100"))
+
+BROADCAST_METHODS = {"eth_sendRawTransaction"}
+# Hedge delay until a node has answered at least once
+INITIAL_HEDGE_DELAY = 1.0
+# Consecutive failures before a node is put in cooldown
+MAX_FAILURES = 3
+RATE_LIMIT_MESSAGES = ("rate limit", "too many requests", "limit exceeded")
+
+
+class EndpointError(Exception):
+    """A node answered with something that says it, not the request, is at fault"""
+
+
+def _is_rate_limited(response):
+    error = response.get("error") if isinstance(response, dict) else None
+    if not isinstance(error, dict):
+        return False
+    message = str(error.get("message", "")).lower()
+    return error.get("code") in (-32005, 429) or any(
+        text in message for text in RATE_LIMIT_MESSAGES
+    )
+
+
+def _is_accepted(response):
+    """Whether a node took a raw transaction (or already had it)"""
+    if "result" in response:
+        return True
+    error = response.get("error") or {}
+    return "already known" in str(error.get("message", "")).lower()
+
+
+def _accepted_response(response, raw_transaction):
+    if "result" in response:
+        return response
+    # Another node gossiped it first, the hash is still ours
+    tx_hash = "0x" + keccak(HexBytes(raw_transaction)).hex()
+    return {"jsonrpc": "2.0", "id": response.get("id"), "result": tx_hash}
+
+
+class EndpointStats:
+    """Moving latency and error score of one RPC node"""
+
+    def __init__(self, window=100, cooldown=30):
+        """
+        Args:
+            window: Latency samples kept for the hedge percentile
+            cooldown: Seconds the node is skipped after MAX_FAILURES in a row
+        """
+        self.cooldown = cooldown
+        self.latencies = deque(maxlen=window)
+        self.latency = None
+        self.error_rate = 0.0
+        self.failures = 0
+        self.down_until = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds, answered=True):
+        """
+        Add a latency sample
+
+        Args:
+            seconds: Time the request took
+            answered: False for a hedged request that was given up on, which
+                only says the node is at least this slow
+        """
+        with self._lock:
+            self.latencies.append(seconds)
+            if self.latency is None:
+                self.latency = seconds
+            else:
+                self.latency = 0.8 * self.latency + 0.2 * seconds
+            if answered:
+                self.error_rate *= 0.8
+                self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.error_rate = 0.8 * self.error_rate + 0.2
+            self.failures += 1
+            if self.failures >= MAX_FAILURES:
+                self.down_until = time.monotonic() + self.cooldown
+
+    def healthy(self):
+        return time.monotonic() >= self.down_until
+
+    def score(self):
+        """Lower is better; nodes that never answered are tried first"""
+        if self.latency is None:
+            return 0.0
+        return self.latency * (1 + 10 * self.error_rate)
+
+    def hedge_delay(self, percentile, min_delay):
+        """Seconds to wait on this node before asking another one, None if unknown"""
+        with self._lock:
+            samples = sorted(self.latencies)
+        if not samples:
+            return None
+        return max(min_delay, samples[int(percentile * (len(samples) - 1))])
+
+
+class Endpoint:
+    def __init__(self, url, provider, stats):
+        self.url = url
+        self.provider = provider
+        self.stats = stats
+
+
+class _Router:
+    """Endpoint ranking shared by the sync and async routers"""
+
+    def __init__(
+        self,
+        endpoints,
+        hedge_percentile=None,
+        hedge_min_delay=None,
+        broadcast_count=None,
+        cooldown=None,
+        window=None,
+    ):
+        """
+        Args:
+            endpoints: List of (url, provider) pairs
+            hedge_percentile: Latency percentile before hedging a read
+                (default: RPC_HEDGE_PERCENTILE)
+            hedge_min_delay: Shortest hedge delay in seconds
+                (default: RPC_HEDGE_MIN_DELAY)
+            broadcast_count: Nodes a raw transaction is sent to
+                (default: RPC_BROADCAST_COUNT)
+            cooldown: Seconds a failing node is skipped
+                (default: RPC_FAILURE_COOLDOWN)
+            window: Latency samples kept per node (default: RPC_LATENCY_WINDOW)
+        """
+        super().__init__()
+        cooldown = RPC_FAILURE_COOLDOWN if cooldown is None else cooldown
+        window = window or RPC_LATENCY_WINDOW
+        self.endpoints = [
+            Endpoint(url, provider, EndpointStats(window, cooldown))
+            for url, provider in endpoints
+        ]
+        self.hedge_percentile = hedge_percentile or RPC_HEDGE_PERCENTILE
+        self.hedge_min_delay = (
+            RPC_HEDGE_MIN_DELAY if hedge_min_delay is None else hedge_min_delay
+        )
+        self.broadcast_count = broadcast_count or RPC_BROADCAST_COUNT
+        self.metrics = Metrics.shared()
+
+    def ranked(self):
+        """Healthy endpoints fastest first, then the ones in cooldown"""
+        return sorted(
+            self.endpoints,
+            key=lambda endpoint: (not endpoint.stats.healthy(), endpoint.stats.score()),
+        )
+
+    def _hedge_delay(self, endpoint):
+        delays = [
+            other.stats.hedge_delay(self.hedge_percentile, self.hedge_min_delay)
+            for other in self.endpoints
+        ]
+        delay = endpoint.stats.hedge_delay(self.hedge_percentile, self.hedge_min_delay)
+        if delay is None:
+            # An untried node gets as long as the best known one needs
+            known = [delay for delay in delays if delay is not None]
+            delay = min(known) if known else INITIAL_HEDGE_DELAY
+        return delay
+
+    def _record(self, endpoint, start, response):
+        if _is_rate_limited(response):
+            endpoint.stats.record_failure()
+            raise EndpointError(f"{endpoint.url} is rate limiting: {response['error']}")
+        elapsed = time.perf_counter() - start
+        endpoint.stats.record(elapsed)
+        self.metrics.observe("rpc_endpoint_seconds", elapsed, endpoint=endpoint.url)
+
+
+class RouterProvider(_Router, BaseProvider):
+    """
+    Web3 provider spread over several RPC nodes
+
+    Reads go to the best scored healthy node and are raced against the next
+    one when they take longer than the node's usual latency percentile, or
+    retried there when the node fails. Raw transactions are sent to the
+    broadcast_count best nodes at once and the first acceptance is returned.
+    """
+
+    def __init__(self, endpoints, **kwargs):
+        super().__init__(endpoints, **kwargs)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(8, 4 * len(self.endpoints)),
+            thread_name_prefix="rpc-router",
+        )
+
+    def _request(self, endpoint, method, params):
+        start = time.perf_counter()
+        try:
+            response = endpoint.provider.make_request(method, params)
+        except Exception:
+            endpoint.stats.record_failure()
+            raise
+        self._record(endpoint, start, response)
+        return response
+
+    def make_request(self, method, params):
+        if method in BROADCAST_METHODS:
+            return self._broadcast(method, params)
+        return self._read(method, params)
+
+    def _read(self, method, params):
+        candidates = iter(self.ranked())
+        pending = set()
+        hedged = False
+        start_next = True
+        delay = error = None
+        while True:
+            # The next node joins when one fails or the first is slow
+            if start_next:
+                endpoint = next(candidates, None)
+                if endpoint is not None:
+                    if not pending:
+                        delay = self._hedge_delay(endpoint)
+                    pending.add(
+                        self._executor.submit(self._request, endpoint, method, params)
+                    )
+                elif not pending:
+                    raise error
+            done, pending = wait(
+                pending, timeout=None if hedged else delay, return_when=FIRST_COMPLETED
+            )
+            start_next = not done
+            if not done:
+                hedged = True
+                self.metrics.inc("rpc_hedged_total", method=method)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+                start_next = True
+
+    def _broadcast(self, method, params):
+        targets = self.ranked()[: self.broadcast_count]
+        pending = {
+            self._executor.submit(self._request, endpoint, method, params)
+            for endpoint in targets
+        }
+        first_response = error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = future.exception()
+                    continue
+                response = future.result()
+                if _is_accepted(response):
+                    # The other sends finish in the background
+                    return _accepted_response(response, params[0])
+                first_response = first_response or response
+        if first_response is not None:
+            return first_response
+        raise error
+
+    def is_connected(self, show_traceback=False):
+        return any(
+            endpoint.provider.is_connected(show_traceback)
+            for endpoint in self.endpoints
+        )
+
+
+class AsyncRouterProvider(_Router, AsyncBaseProvider):
+    """
+    AsyncWeb3 provider spread over several RPC nodes
+
+    Same routing as RouterProvider; hedged reads that lose the race are
+    cancelled.
+    """
+
+    def __init__(self, endpoints, **kwargs):
+        super().__init__(endpoints, **kwargs)
+        self._broadcast_tasks = set()
+
+    async def _request(self, endpoint, method, params):
+        start = time.perf_counter()
+        try:
+            response = await endpoint.provider.make_request(method, params)
+        except asyncio.CancelledError:
+            # Lost a hedge race, it was at least this slow
+            endpoint.stats.record(time.perf_counter() - start, answered=False)
+            raise
+        except Exception:
+            endpoint.stats.record_failure()
+            raise
+        self._record(endpoint, start, response)
+        return response
+
+    async def make_request(self, method, params):
+        if method in BROADCAST_METHODS:
+            return await self._broadcast(method, params)
+        return await self._read(method, params)
+
+    async def _read(self, method, params):
+        candidates = iter(self.ranked())
+        pending = set()
+        hedged = False
+        start_next = True
+        delay = error = None
+        try:
+            while True:
+                # The next node joins when one fails or the first is slow
+                if start_next:
+                    endpoint = next(candidates, None)
+                    if endpoint is not None:
+                        if not pending:
+                            delay = self._hedge_delay(endpoint)
+                        pending.add(
+                            asyncio.ensure_future(
+                                self._request(endpoint, method, params)
+                            )
+                        )
+                    elif not pending:
+                        raise error
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=None if hedged else delay,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                start_next = not done
+                if not done:
+                    hedged = True
+                    self.metrics.inc("rpc_hedged_total", method=method)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+                    start_next = True
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _broadcast(self, method, params):
+        targets = self.ranked()[: self.broadcast_count]
+        pending = {
+            asyncio.ensure_future(self._request(endpoint, method, params))
+            for endpoint in targets
+        }
+        first_response = error = None
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is not None:
+                    error = task.exception()
+                    continue
+                response = task.result()
+                if _is_accepted(response):
+                    # Let the other sends finish in the background
+                    self._broadcast_tasks.update(pending)
+                    for other in pending:
+                        other.add_done_callback(self._discard_broadcast)
+                    return _accepted_response(response, params[0])
+                first_response = first_response or response
+        if first_response is not None:
+            return first_response
+        raise error
+
+    def _discard_broadcast(self, task):
+        self._broadcast_tasks.discard(task)
+        if not task.cancelled():
+            # Failures were already scored, only silence the warning
+            task.exception()
+
+    async def is_connected(self, show_traceback=False):
+        for endpoint in self.endpoints:
+            if await endpoint.provider.is_connected(show_traceback):
+                return True
+        return False
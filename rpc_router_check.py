@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Check the RPC router's failover, hedging and broadcast against local nodes
+
+Starts three JSON-RPC servers on localhost: a fast one, a slow one and one
+that answers every request with HTTP 500. Both RouterProvider and
+AsyncRouterProvider are then run over them and must:
+
+- keep reading through the failing node and put it in cooldown,
+- answer a read within the slow node's latency when the fast node stalls,
+  because the read is hedged to the next node,
+- send a raw transaction to every node and return its hash, with "already
+  known" from a node counted as accepted.
+
+Exits non-zero on the first failed check.
+"""
+
+import asyncio
+import time
+from collections import Counter
+
+from aiohttp import web
+from eth_utils import keccak
+from hexbytes import HexBytes
+
+from web3_pool import get_async_web3, get_web3
+
+FAST_LATENCY = 0.01
+SLOW_LATENCY = 0.3
+# How long the fast node stalls for in the hedging check
+STALL = 1.0
+TX_HASH = "0x" + "ab" * 32
+RAW_TRANSACTION = "0x" + "00" * 10
+WARMUP_READS = 20
+
+
+class Node:
+    """A local JSON-RPC server answering eth_blockNumber and raw transactions"""
+
+    def __init__(self, name, latency, fail=False):
+        self.name = name
+        self.latency = latency
+        self.fail = fail
+        self.stalled = False
+        self.hits = Counter()
+        self.url = None
+        self._runner = None
+
+    def _answer(self, request):
+        if request["method"] == "eth_sendRawTransaction":
+            if self.name == "slow":
+                # Gossip from another node got there first
+                error = {"code": -32000, "message": "already known"}
+                return {"jsonrpc": "2.0", "id": request["id"], "error": error}
+            return {"jsonrpc": "2.0", "id": request["id"], "result": TX_HASH}
+        return {"jsonrpc": "2.0", "id": request["id"], "result": hex(100)}
+
+    async def _handle(self, http_request):
+        body = await http_request.json()
+        requests = body if isinstance(body, list) else [body]
+        for request in requests:
+            self.hits[request["method"]] += 1
+        if self.fail:
+            return web.Response(status=500)
+        await asyncio.sleep(STALL if self.stalled else self.latency)
+        if isinstance(body, list):
+            return web.json_response([self._answer(r) for r in body])
+        return web.json_response(self._answer(body))
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/", self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = self._runner.addresses[0][:2]
+        self.url = f"http://{host}:{port}"
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+
+def check(condition, message):
+    if not condition:
+        raise SystemExit(f"FAILED: {message}")
+    print(f"ok: {message}")
+
+
+def endpoint(provider, node):
+    return next(e for e in provider.endpoints if e.url == node.url)
+
+
+def check_stats(provider, fast, down, label):
+    check(
+        not endpoint(provider, down).stats.healthy(),
+        f"{label}: the failing node is in cooldown",
+    )
+    check(
+        endpoint(provider, fast).stats.healthy(),
+        f"{label}: the fast node stays healthy",
+    )
+
+
+async def check_async(fast, slow, down, urls):
+    w3 = get_async_web3(urls)
+    for i in range(WARMUP_READS):
+        block_number = await w3.eth.block_number
+        if i == 0:
+            check(block_number == 100, "async: read answered")
+    check_stats(w3.provider, fast, down, "async")
+
+    for node in (fast, slow, down):
+        node.hits.clear()
+    fast.stalled = True
+    start = time.perf_counter()
+    await w3.eth.block_number
+    elapsed = time.perf_counter() - start
+    fast.stalled = False
+    check(
+        elapsed < STALL and slow.hits["eth_blockNumber"] == 1,
+        f"async: stalled read hedged to the slow node ({elapsed:.2f}s)",
+    )
+
+    tx_hash = await w3.eth.send_raw_transaction(RAW_TRANSACTION)
+    check(tx_hash == HexBytes(TX_HASH), "async: broadcast returned the hash")
+    check(
+        all(node.hits["eth_sendRawTransaction"] for node in (fast, slow, down)),
+        "async: raw transaction sent to every node",
+    )
+
+
+def check_sync(fast, slow, down, urls):
+    w3 = get_web3(urls)
+    for i in range(WARMUP_READS):
+        block_number = w3.eth.block_number
+        if i == 0:
+            check(block_number == 100, "sync: read answered")
+    check_stats(w3.provider, fast, down, "sync")
+
+    for node in (fast, slow, down):
+        node.hits.clear()
+    fast.stalled = True
+    start = time.perf_counter()
+    w3.eth.block_number
+    elapsed = time.perf_counter() - start
+    fast.stalled = False
+    check(
+        elapsed < STALL and slow.hits["eth_blockNumber"] == 1,
+        f"sync: stalled read hedged to the slow node ({elapsed:.2f}s)",
+    )
+
+    # The slow node answers "already known" and must not fail the send
+    fast.fail = True
+    tx_hash = w3.eth.send_raw_transaction(RAW_TRANSACTION)
+    fast.fail = False
+    check(
+        tx_hash == keccak(HexBytes(RAW_TRANSACTION)),
+        "sync: broadcast accepted with only \"already known\" from a node",
+    )
+
+
+async def main():
+    fast = Node("fast", FAST_LATENCY)
+    slow = Node("slow", SLOW_LATENCY)
+    down = Node("down", 0, fail=True)
+    nodes = (fast, slow, down)
+    for node in nodes:
+        await node.start()
+    urls = ",".join(node.url for node in nodes)
+    try:
+        await check_async(fast, slow, down, urls)
+        # The sync provider blocks, so it runs beside the servers' event loop
+        await asyncio.to_thread(check_sync, fast, slow, down, urls)
+    finally:
+        for node in nodes:
+            await node.stop()
+    print("all router checks passed")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
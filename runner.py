@@ -0,0 +1,141 @@
+"""
+Schedule runner shared by main.py and main2.py
+
+Wallets come due from SCHEDULE_FILE and each one's run is handed to the
+caller's cycle coroutine, at most MAX_CONCURRENCY at a time. Every run is
+recorded in the journal and, with sharding, leased from the shard database
+so restarts and other workers neither repeat nor lose it.
+"""
+
+import asyncio
+import os
+import time
+
+from journal import Journal
+from metrics import Metrics
+from schedule import read_schedule
+from scheduler import WalletScheduler
+from sharding import ShardCoordinator
+from signing_service import SigningService
+from wallet_store import WalletStore
+
+MAX_CONCURRENCY = int(os.getenv("MAX_CONCURRENCY", "10"))
+WALLETS_FILE = os.getenv("WALLETS_FILE", "wallets.json")
+SCHEDULE_FILE = os.getenv("SCHEDULE_FILE", "schedule.json")
+
+
+async def run_wallet(
+    cycle,
+    semaphore: asyncio.Semaphore,
+    wallets: WalletStore,
+    address: str,
+    timestamp: int,
+):
+    """
+    Run one wallet's scheduled cycle under its journal run and shard lease
+
+    Args:
+        cycle: Coroutine function called with the wallet's address and WalletRun
+        semaphore: Limits how many wallets run at once
+        wallets: Store the wallet's key is read from
+        address: Wallet address
+        timestamp: Scheduled time of the run
+    """
+    metrics = Metrics.shared()
+    journal = Journal.shared()
+    shards = ShardCoordinator.shared()
+    signer = SigningService.shared()
+    async with semaphore:
+        taken_over = await asyncio.to_thread(shards.acquire, address, timestamp)
+        if taken_over is None:
+            print(f"Skipping {address}, run by another worker")
+            return
+        status = "ok"
+        error = None
+        with metrics.timer("wallet_cycle_seconds", wallet=address):
+            try:
+                # The key is only read (or decrypted) once the wallet is due,
+                # by the signing worker when there is one
+                await signer.async_register(address, wallets.wallets_file)
+                # With sharding, pick up what a previous owner recorded
+                await asyncio.to_thread(journal.load, address)
+                run = journal.start(address, timestamp)
+                if taken_over:
+                    # The worker that started it stopped, its transactions may
+                    # still be in flight
+                    run.resumed = True
+                try:
+                    await cycle(address, run)
+                finally:
+                    signer.unregister(address)
+            except Exception as e:
+                status = "failed"
+                error = e
+                print(f"=== Looping failed for {address}: {e} ===\n")
+        journal.finish(address, error)
+        if error is None or journal.gave_up(address, timestamp):
+            await asyncio.to_thread(shards.finish, address, timestamp)
+        else:
+            # Left for a retry, here after a restart or by another worker
+            await asyncio.to_thread(shards.release, address, timestamp)
+        metrics.inc("wallet_cycles_total", status=status, wallet=address)
+
+
+async def run_schedule(cycle):
+    """
+    Run cycle for every wallet in SCHEDULE_FILE as it comes due
+
+    Args:
+        cycle: Coroutine function called with the wallet's address and WalletRun
+    """
+    wallets = WalletStore(WALLETS_FILE)
+
+    # Due wallets run concurrently, at most MAX_CONCURRENCY at a time
+    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    running = set()
+    # Addresses with a run in progress in this process
+    active = set()
+
+    # Sorted schedules are read incrementally as wallets come due; runs the
+    # journal saw finish before a restart are not repeated, failed ones are
+    # retried up to JOURNAL_MAX_ATTEMPTS times, and with sharding only the
+    # wallets hashed to this worker are run
+    journal = Journal.shared()
+    shards = ShardCoordinator.shared()
+    shards.heartbeat()
+
+    def due_entries(until=None):
+        for timestamp, address in read_schedule(SCHEDULE_FILE):
+            if until is not None and timestamp > until:
+                return
+            if journal.finished(address, timestamp):
+                continue
+            if journal.gave_up(address, timestamp):
+                continue
+            if shards.owns(address, timestamp):
+                yield timestamp, address
+
+    scheduler = WalletScheduler(feed=due_entries())
+
+    def rebalance():
+        # Wallets that came due while owned by a worker that has since
+        # stopped now hash here; runs it left unfinished are retaken
+        for timestamp, address in due_entries(until=time.time()):
+            if address not in active:
+                scheduler.add(address, timestamp)
+
+    heartbeat = asyncio.create_task(shards.keep_alive(rebalance))
+    try:
+        while True:
+            for timestamp, wallet_address in await scheduler.wait_due_entries():
+                task = asyncio.create_task(
+                    run_wallet(cycle, semaphore, wallets, wallet_address, timestamp)
+                )
+                running.add(task)
+                active.add(wallet_address)
+                task.add_done_callback(running.discard)
+                task.add_done_callback(
+                    lambda _, address=wallet_address: active.discard(address)
+                )
+    finally:
+        heartbeat.cancel()
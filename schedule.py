@@ -1,49 +1,255 @@
 #!/usr/bin/env python3
 """
-Script to create a schedule.json file with random timestamps for each wallet address
+Script to create a schedule file with random timestamps for each wallet address
+
+Output formats:
+  json   {address: timestamp}, the original schedule.json layout
+  lines  "timestamp address" per line, sorted by time
+  bin    SCHEDULE_MAGIC, then 28-byte (uint64 timestamp, 20-byte address)
+         big-endian records sorted by time
+
+Wallets are read and timestamps generated in batches, and the sorted formats
+are merged from per-batch runs on disk, so memory stays flat however many
+wallets there are. The sorted formats can be split into one file per time
+window and are read back incrementally by read_schedule().
 """
 
 import argparse
+import glob
+import heapq
 import json
-import random
+import os
+import struct
 import sys
+import tempfile
+
+import numpy as np
+
+from wallet_store import scan_wallets
+
+SCHEDULE_MAGIC = b"YEISCHD1"
+RECORD = struct.Struct(">Q20s")
+# Sorting by (timestamp, address) makes the raw records sort the same way
+RECORD_DTYPE = np.dtype([("timestamp", ">u8"), ("address", "S20")])
+# Wallets per generated batch, which is also the size of each sorted run
+BATCH_SIZE = 1 << 20
+READ_RECORDS = 4096
+
 
+def load_wallets(wallets_file: str):
+    """Stream wallet addresses from a wallets file"""
+    with open(wallets_file, "rb") as f:
+        for _, _, wallet in scan_wallets(f):
+            address = wallet.get("address")
+            if not address:
+                print("警告：發現沒有地址的錢包，跳過")
+                continue
+            if not address.startswith("0x"):
+                # Keystore entries store the address without the prefix
+                address = "0x" + address
+            yield address
 
-def load_wallets(wallets_file: str) -> list:
-    with open(wallets_file, "r", encoding="utf-8") as f:
-        return json.load(f)
 
+def _batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
 
-def create_schedule(wallets: list, start_time: int, end_time: int) -> dict:
-    """Create schedule with random timestamps for each wallet address"""
+
+def create_schedule(addresses, start_time: int, end_time: int, rng, batch_size=None):
+    """
+    Assign random timestamps to addresses, one vectorized batch at a time
+
+    Args:
+        addresses: Iterable of wallet addresses
+        start_time: Earliest timestamp (inclusive)
+        end_time: Latest timestamp (inclusive)
+        rng: numpy Generator, seeded for reproducible schedules
+        batch_size: Addresses per batch (default: BATCH_SIZE)
+
+    Yields:
+        (addresses, timestamps) per batch, timestamps as a uint64 array
+    """
     if start_time >= end_time:
         print("錯誤：開始時間必須小於結束時間")
         sys.exit(1)
 
-    schedule = {}
+    for batch in _batches(addresses, batch_size or BATCH_SIZE):
+        timestamps = rng.integers(
+            start_time, end_time, size=len(batch), endpoint=True, dtype=np.uint64
+        )
+        yield batch, timestamps
+
+
+def _keep_sample(batches, sample, size=3):
+    """Pass batches through, copying the first entries into sample"""
+    for addresses, timestamps in batches:
+        if len(sample) < size:
+            sample.extend(zip(addresses[:size], timestamps[:size].tolist()))
+            del sample[size:]
+        yield addresses, timestamps
+
+
+def _sorted_run(addresses, timestamps):
+    records = np.empty(len(addresses), dtype=RECORD_DTYPE)
+    records["timestamp"] = timestamps
+    records["address"] = [bytes.fromhex(address[2:]) for address in addresses]
+    records.sort(order=["timestamp", "address"])
+    return records
+
+
+def _read_records(f):
+    """Raw 28-byte records from a run or bin file positioned at the first one"""
+    while True:
+        chunk = f.read(RECORD.size * READ_RECORDS)
+        if not chunk:
+            return
+        for i in range(0, len(chunk), RECORD.size):
+            yield chunk[i : i + RECORD.size]
+
+
+def _merge_runs(batches, tmp_dir):
+    """Sort every batch into a run file, then merge the runs into one stream"""
+    run_files = []
+    for i, (addresses, timestamps) in enumerate(batches):
+        run_file = os.path.join(tmp_dir, f"run{i}")
+        _sorted_run(addresses, timestamps).tofile(run_file)
+        run_files.append(run_file)
+
+    readers = [open(run_file, "rb") for run_file in run_files]
+    try:
+        yield from heapq.merge(*(_read_records(reader) for reader in readers))
+    finally:
+        for reader in readers:
+            reader.close()
+
+
+class _ShardWriter:
+    """Writes sorted records to one file, or one file per time window"""
 
-    for wallet in wallets:
-        address = wallet.get("address")
-        if not address:
-            print("警告：發現沒有地址的錢包，跳過")
-            continue
+    def __init__(self, output_file, output_format, shard_seconds=None):
+        self.output_file = output_file
+        self.output_format = output_format
+        self.shard_seconds = shard_seconds
+        self.files = []
+        self.count = 0
+        self._window = None
+        self._f = None
 
-        # Generate random timestamp between start and end
-        random_time = random.randint(start_time, end_time)
-        schedule[address] = random_time
+    def _path(self, window):
+        if not self.shard_seconds:
+            return self.output_file
+        # Zero padded so the shards sort by name in time order
+        root, ext = os.path.splitext(self.output_file)
+        return f"{root}.{window:010d}{ext}"
 
-    return schedule
+    def _open(self, window):
+        self.close()
+        path = self._path(window)
+        self._f = open(path, "wb")
+        if self.output_format == "bin":
+            self._f.write(SCHEDULE_MAGIC)
+        self._window = window
+        self.files.append(path)
 
+    def write(self, record):
+        timestamp = RECORD.unpack(record)[0]
+        window = timestamp - timestamp % self.shard_seconds if self.shard_seconds else 0
+        if self._f is None or window != self._window:
+            self._open(window)
+        if self.output_format == "bin":
+            self._f.write(record)
+        else:
+            self._f.write(f"{timestamp} 0x{record[8:].hex()}\n".encode())
+        self.count += 1
 
-def save_schedule(schedule: dict, output_file: str):
-    """Save schedule to JSON file"""
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+
+def save_schedule(batches, output_file: str, output_format="json", shard_seconds=None):
+    """
+    Write a schedule generated by create_schedule()
+
+    Args:
+        batches: (addresses, timestamps) batches from create_schedule()
+        output_file: Path to write (shards insert the window start before
+            the extension)
+        output_format: "json", "lines" or "bin"
+        shard_seconds: Split sorted output into files per window of this many
+            seconds
+
+    Returns:
+        (number of wallets, list of files written)
+    """
     try:
-        with open(output_file, "w", encoding="utf-8") as f:
-            json.dump(schedule, f, indent=2, ensure_ascii=False)
-        print(f"排程已儲存至 {output_file}")
-    except Exception as e:
+        if output_format == "json":
+            count = 0
+            with open(output_file, "w", encoding="utf-8") as f:
+                f.write("{")
+                for addresses, timestamps in batches:
+                    for address, timestamp in zip(addresses, timestamps.tolist()):
+                        f.write(f'{"," if count else ""}\n  "{address}": {timestamp}')
+                        count += 1
+                f.write("\n}\n")
+            files = [output_file]
+        else:
+            writer = _ShardWriter(output_file, output_format, shard_seconds)
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                try:
+                    for record in _merge_runs(batches, tmp_dir):
+                        writer.write(record)
+                finally:
+                    writer.close()
+            count, files = writer.count, writer.files
+    except OSError as e:
         print(f"錯誤：無法儲存排程檔案 - {e}")
         sys.exit(1)
+    print(f"排程已儲存至 {', '.join(files[:3])}{' ...' if len(files) > 3 else ''}")
+    return count, files
+
+
+def _read_file(path):
+    with open(path, "rb") as f:
+        head = f.read(len(SCHEDULE_MAGIC))
+        if head == SCHEDULE_MAGIC:
+            for record in _read_records(f):
+                timestamp, address = RECORD.unpack(record)
+                yield timestamp, "0x" + address.hex()
+            return
+
+        f.seek(0)
+        if head.lstrip().startswith(b"{"):
+            # The original format has no order, it is loaded whole and sorted
+            schedule = json.load(f)
+            for address, timestamp in sorted(schedule.items(), key=lambda x: x[1]):
+                yield timestamp, address
+            return
+
+        for line in f:
+            if line.strip():
+                timestamp, address = line.split()
+                yield int(timestamp), address.decode()
+
+
+def read_schedule(path):
+    """
+    Yield (timestamp, address) from a schedule file, sorted by timestamp
+
+    Args:
+        path: Schedule file in any output format, or a glob matching the
+            shards of one schedule (e.g. "schedule.*.bin")
+    """
+    paths = sorted(glob.glob(path)) if glob.has_magic(path) else [path]
+    for schedule_file in paths:
+        yield from _read_file(schedule_file)
 
 
 def main():
@@ -55,6 +261,8 @@ def main():
   python schedule.py --start 1754542179 --end 1754552179
   python schedule.py --start 1754542179 --end 1754552179 --wallets custom_wallets.json
   python schedule.py --start 1754542179 --end 1754552179 --output custom_schedule.json
+  python schedule.py --start 1754542179 --end 1754552179 --format bin --output schedule.bin
+  python schedule.py --start 1754542179 --end 1754552179 --format bin --output schedule.bin --shard-seconds 3600
         """,
     )
 
@@ -80,34 +288,47 @@ def main():
         help="輸出排程檔案路徑（預設：schedule.json）",
     )
 
+    parser.add_argument(
+        "--format",
+        choices=("json", "lines", "bin"),
+        default="json",
+        help="輸出格式：json（地址對時間）、lines（依時間排序的文字行）、bin（依時間排序的二進位紀錄）（預設：json）",
+    )
+
+    parser.add_argument(
+        "--shard-seconds",
+        type=int,
+        help="依時間區間分割輸出檔案的秒數（僅適用於 lines / bin）",
+    )
+
     parser.add_argument("--seed", type=int, help="隨機數種子（用於可重現的結果）")
 
     args = parser.parse_args()
 
+    if args.shard_seconds and args.format == "json":
+        print("錯誤：--shard-seconds 只能搭配 --format lines 或 bin")
+        sys.exit(1)
+
     # Set random seed if provided
+    rng = np.random.default_rng(args.seed)
     if args.seed is not None:
-        random.seed(args.seed)
         print(f"使用隨機數種子：{args.seed}")
 
     print(f"讀取錢包檔案：{args.wallets}")
-    wallets = load_wallets(args.wallets)
-    print(f"找到 {len(wallets)} 個錢包")
-
     print(f"建立排程（時間範圍：{args.start} - {args.end}）")
-    schedule = create_schedule(wallets, args.start, args.end)
-
-    print(f"為 {len(schedule)} 個地址分配了隨機時間")
+    batches = create_schedule(load_wallets(args.wallets), args.start, args.end, rng)
+    sample = []
+    batches = _keep_sample(batches, sample)
+    count, _ = save_schedule(batches, args.output, args.format, args.shard_seconds)
 
-    save_schedule(schedule, args.output)
+    print(f"為 {count} 個地址分配了隨機時間")
 
     # Display sample of the schedule
     print("\n排程範例：")
-    for i, (address, timestamp) in enumerate(schedule.items()):
-        if i < 3:  # Show first 3 entries
-            print(f"  {address}: {timestamp}")
-        elif i == 3 and len(schedule) > 3:
-            print(f"  ... 還有 {len(schedule) - 3} 個地址")
-            break
+    for address, timestamp in sample:
+        print(f"  {address}: {timestamp}")
+    if count > len(sample):
+        print(f"  ... 還有 {count - len(sample)} 個地址")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,102 @@
+import asyncio
+import heapq
+import time
+
+
+class WalletScheduler:
+    """
+    Min-heap of (timestamp, address) that sleeps until the next deadline
+
+    Rescheduling an address replaces its previous entry; stale heap entries
+    are skipped when popped. A feed of entries sorted by time (such as
+    schedule.read_schedule()) is only pulled onto the heap as its entries
+    come due, so a schedule of millions of wallets is never held in memory.
+    """
+
+    def __init__(self, schedules=(), feed=()):
+        """
+        Args:
+            schedules: Iterable of (address, timestamp) pairs
+            feed: Iterable of (timestamp, address) pairs sorted by timestamp
+        """
+        self._deadlines = dict(schedules)
+        self._heap = [
+            (timestamp, address) for address, timestamp in self._deadlines.items()
+        ]
+        heapq.heapify(self._heap)
+        self._feed = iter(feed)
+        self._feed_head = next(self._feed, None)
+        self._changed = asyncio.Event()
+
+    def __len__(self):
+        """Scheduled wallets, not counting feed entries that are not due yet"""
+        return len(self._deadlines)
+
+    def _pull_feed(self, now):
+        while self._feed_head is not None and self._feed_head[0] <= now:
+            timestamp, address = self._feed_head
+            self._feed_head = next(self._feed, None)
+            # An add() for the address already replaced its feed entry
+            if address not in self._deadlines:
+                self._deadlines[address] = timestamp
+                heapq.heappush(self._heap, (timestamp, address))
+
+    def add(self, address, timestamp):
+        """Schedule (or reschedule) a wallet at runtime"""
+        self._deadlines[address] = timestamp
+        heapq.heappush(self._heap, (timestamp, address))
+        self._changed.set()
+
+    def remove(self, address):
+        """Drop a wallet from the schedule"""
+        self._deadlines.pop(address, None)
+
+    def next_deadline(self):
+        """Timestamp of the earliest scheduled wallet, or None if empty"""
+        feed_timestamp = None if self._feed_head is None else self._feed_head[0]
+        while self._heap:
+            timestamp, address = self._heap[0]
+            if self._deadlines.get(address) == timestamp:
+                if feed_timestamp is not None and feed_timestamp < timestamp:
+                    return feed_timestamp
+                return timestamp
+            heapq.heappop(self._heap)
+        return feed_timestamp
+
+    def pop_due_entries(self, now=None):
+        """Remove and return (timestamp, address) for every wallet that is due"""
+        if now is None:
+            now = time.time()
+        self._pull_feed(now)
+        due = []
+        while True:
+            timestamp = self.next_deadline()
+            if timestamp is None or timestamp > now:
+                return due
+            entry = heapq.heappop(self._heap)
+            del self._deadlines[entry[1]]
+            due.append(entry)
+
+    def pop_due(self, now=None):
+        """Remove and return every address whose time has come"""
+        return [address for _, address in self.pop_due_entries(now)]
+
+    async def wait_due(self):
+        """Sleep until at least one wallet is due, then return the due addresses"""
+        return [address for _, address in await self.wait_due_entries()]
+
+    async def wait_due_entries(self):
+        """Sleep until at least one wallet is due, then return (timestamp, address)"""
+        while True:
+            self._changed.clear()
+            due = self.pop_due_entries()
+            if due:
+                return due
+
+            timestamp = self.next_deadline()
+            timeout = None if timestamp is None else timestamp - time.time()
+            try:
+                # Wake up early if add() schedules something sooner
+                await asyncio.wait_for(self._changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Spread the wallet fleet over several worker processes, on one or more hosts
+
+Workers register in a SQLite database on a path they all share and
+heartbeat into it. Every scheduled wallet belongs to one live worker by
+consistent hashing of its address, so a worker joining or leaving only moves
+its own share of wallets. Before running a wallet a worker takes a lease on
+(address, scheduled timestamp) in the same database and keeps renewing it;
+when a worker stops heartbeating its leases expire and the wallets it
+owned, including the one it was in the middle of, are picked up by the
+others. Finished runs are marked done there so no worker repeats them,
+and the journal of every run is kept there too so the worker that picks up
+a wallet resumes it from the phases and transactions already recorded.
+
+Started as a script it launches --workers local copies of main.py with
+sharding enabled and restarts any that exit; run it on each host with the
+same SHARD_DB to spread the fleet across hosts.
+"""
+
+import argparse
+import asyncio
+import atexit
+import bisect
+import hashlib
+import os
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+
+# Shared SQLite file the workers coordinate through; unset runs unsharded
+SHARD_DB = os.getenv("SHARD_DB")
+SHARD_WORKER_ID = os.getenv("SHARD_WORKER_ID")
+# Seconds without a heartbeat before a worker's wallets are taken over
+SHARD_LEASE_TTL = float(os.getenv("SHARD_LEASE_TTL", "60"))
+SHARD_HEARTBEAT_INTERVAL = float(os.getenv("SHARD_HEARTBEAT_INTERVAL", "10"))
+
+# Points per worker on the hash ring, more evens out the shares
+RING_VNODES = 128
+# Seconds before a worker process that exited is started again
+RESTART_DELAY = 5
+
+
+def _exit_on_sigterm(signum, frame):
+    raise SystemExit(128 + signum)
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest())
+
+
+class HashRing:
+    """Consistent hash ring mapping addresses to worker ids"""
+
+    def __init__(self, members=(), vnodes=RING_VNODES):
+        """
+        Args:
+            members: Worker ids
+            vnodes: Points placed on the ring per worker
+        """
+        self.members = tuple(sorted(members))
+        points = sorted(
+            (_hash(f"{member}#{i}"), member)
+            for member in self.members
+            for i in range(vnodes)
+        )
+        self._hashes = [point for point, _ in points]
+        self._owners = [member for _, member in points]
+
+    def owner(self, address):
+        """Worker id the address belongs to, None if there are no workers"""
+        if not self._hashes:
+            return None
+        i = bisect.bisect(self._hashes, _hash(address.lower()))
+        return self._owners[i % len(self._hashes)]
+
+
+class ShardCoordinator:
+    """
+    Wallet ownership and run leases of one worker
+
+    Disabled (owning every wallet, leasing nothing) unless db_path is set,
+    so main.py runs the same with and without sharding.
+    """
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(
+        self, db_path=None, worker_id=None, lease_ttl=60, heartbeat_interval=10
+    ):
+        """
+        Args:
+            db_path: Shared SQLite database, None to disable sharding
+            worker_id: Unique and stable name of this worker
+                (default: <hostname>-<pid>)
+            lease_ttl: Seconds a heartbeat or lease stays valid
+            heartbeat_interval: Seconds between heartbeats
+        """
+        self.db_path = db_path
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.lease_ttl = lease_ttl
+        self.heartbeat_interval = heartbeat_interval
+        self.enabled = bool(db_path)
+        self.ring = HashRing([self.worker_id])
+        self._lock = threading.Lock()
+        self._db = None
+        if not self.enabled:
+            return
+
+        # Autocommit, transactions are opened explicitly where needed
+        self._db = sqlite3.connect(
+            db_path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS workers "
+            "(worker_id TEXT PRIMARY KEY, heartbeat REAL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS leases (address TEXT, timestamp INTEGER, "
+            "worker_id TEXT, expires REAL, done INTEGER DEFAULT 0, "
+            "PRIMARY KEY (address, timestamp))"
+        )
+        atexit.register(self.leave)
+        if threading.current_thread() is threading.main_thread():
+            # The supervisor (or a service manager) stops workers with SIGTERM,
+            # which would skip atexit; exiting normally lets leave() run
+            signal.signal(signal.SIGTERM, _exit_on_sigterm)
+
+    @classmethod
+    def shared(cls):
+        """Get the coordinator of this process, configured from env"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls(
+                    SHARD_DB,
+                    SHARD_WORKER_ID,
+                    SHARD_LEASE_TTL,
+                    SHARD_HEARTBEAT_INTERVAL,
+                )
+            return cls._shared
+
+    def heartbeat(self):
+        """
+        Mark this worker alive, renew its leases and reload the live workers
+
+        Returns:
+            True if the set of live workers changed
+        """
+        if not self.enabled:
+            return False
+        now = time.time()
+        with self._lock:
+            db = self._db
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.execute(
+                    "INSERT OR REPLACE INTO workers VALUES (?, ?)",
+                    (self.worker_id, now),
+                )
+                db.execute(
+                    "UPDATE leases SET expires = ? WHERE worker_id = ? AND done = 0",
+                    (now + self.lease_ttl, self.worker_id),
+                )
+                members = [
+                    worker_id
+                    for (worker_id,) in db.execute(
+                        "SELECT worker_id FROM workers WHERE heartbeat > ?",
+                        (now - self.lease_ttl,),
+                    )
+                ]
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        if tuple(sorted(members)) == self.ring.members:
+            return False
+        print(f"Shard members: {', '.join(sorted(members))}")
+        self.ring = HashRing(members)
+        return True
+
+    async def keep_alive(self, on_change):
+        """
+        Heartbeat forever, calling on_change() when workers join or leave
+
+        Args:
+            on_change: Callback run in the event loop after a membership change
+        """
+        while self.enabled:
+            try:
+                if await asyncio.to_thread(self.heartbeat):
+                    on_change()
+            except sqlite3.Error as e:
+                print(f"Shard heartbeat failed: {e}")
+            await asyncio.sleep(self.heartbeat_interval)
+
+    def owns(self, address, timestamp):
+        """Whether this worker should run the wallet's run at timestamp"""
+        if not self.enabled:
+            return True
+        if self.ring.owner(address) != self.worker_id:
+            return False
+        with self._lock:
+            row = self._db.execute(
+                "SELECT done FROM leases WHERE address = ? AND timestamp = ?",
+                (address.lower(), timestamp),
+            ).fetchone()
+        return row is None or not row[0]
+
+    def acquire(self, address, timestamp):
+        """
+        Take the lease on a wallet's run
+
+        Returns:
+            None if another worker holds it or the run is done, otherwise
+            True if it was taken over from a worker that stopped, else False
+        """
+        if not self.enabled:
+            return False
+        key = address.lower()
+        now = time.time()
+        with self._lock:
+            db = self._db
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute(
+                    "SELECT worker_id, expires, done FROM leases "
+                    "WHERE address = ? AND timestamp = ?",
+                    (key, timestamp),
+                ).fetchone()
+                if row is not None and (
+                    row[2] or (row[0] != self.worker_id and row[1] > now)
+                ):
+                    db.execute("COMMIT")
+                    return None
+                db.execute(
+                    "INSERT OR REPLACE INTO leases VALUES (?, ?, ?, ?, 0)",
+                    (key, timestamp, self.worker_id, now + self.lease_ttl),
+                )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return row is not None and row[0] != self.worker_id
+
+    def finish(self, address, timestamp):
+        """Mark a wallet's run done so no worker runs it again"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._db.execute(
+                "UPDATE leases SET done = 1 WHERE address = ? AND timestamp = ?",
+                (address.lower(), timestamp),
+            )
+
+    def release(self, address, timestamp):
+        """Give up the lease on a failed run so it can be retried"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._db.execute(
+                "UPDATE leases SET expires = 0 WHERE address = ? AND timestamp = ? "
+                "AND worker_id = ? AND done = 0",
+                (address.lower(), timestamp, self.worker_id),
+            )
+
+    def leave(self):
+        """Deregister and release unfinished leases for the other workers"""
+        if not self.enabled:
+            return
+        with self._lock:
+            try:
+                self._db.execute(
+                    "DELETE FROM workers WHERE worker_id = ?", (self.worker_id,)
+                )
+                self._db.execute(
+                    "UPDATE leases SET expires = 0 WHERE worker_id = ? AND done = 0",
+                    (self.worker_id,),
+                )
+            except sqlite3.Error as e:
+                print(f"Leaving the shard failed: {e}")
+
+
+def _worker_env(worker_id, db_path):
+    # The journal goes to the shared database too, so whichever worker takes
+    # a wallet over sees the runs and transactions recorded for it
+    return dict(os.environ, SHARD_DB=db_path, SHARD_WORKER_ID=worker_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="以多個工作程序分攤錢包（一致性雜湊分配，可跨主機）",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+範例：
+  python sharding.py --workers 4
+  python sharding.py --workers 4 --script main2.py
+  python sharding.py --workers 8 --db /mnt/shared/shards.sqlite --name host-a
+        """,
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="本機工作程序數（預設：CPU 核心數）",
+    )
+    parser.add_argument(
+        "--script",
+        default="main.py",
+        help="每個工作程序執行的主程式（預設：main.py）",
+    )
+    parser.add_argument(
+        "--db",
+        default=SHARD_DB or "shards.sqlite",
+        help="所有主機共用的 SQLite 協調檔案（預設：SHARD_DB 或 shards.sqlite）",
+    )
+    parser.add_argument(
+        "--name",
+        default=socket.gethostname(),
+        help="工作程序名稱前綴，每台主機須不同（預設：主機名稱）",
+    )
+    args = parser.parse_args()
+
+    db_path = os.path.abspath(args.db)
+    worker_ids = [f"{args.name}-{i}" for i in range(args.workers)]
+    processes = {}
+    print(f"啟動 {args.workers} 個工作程序，協調檔案：{db_path}")
+    try:
+        while True:
+            for worker_id in worker_ids:
+                process = processes.get(worker_id)
+                if process is not None and process.poll() is None:
+                    continue
+                if process is not None:
+                    print(f"工作程序 {worker_id} 已結束（{process.returncode}），重新啟動")
+                processes[worker_id] = subprocess.Popen(
+                    [sys.executable, args.script],
+                    env=_worker_env(worker_id, db_path),
+                )
+            time.sleep(RESTART_DELAY)
+    except KeyboardInterrupt:
+        print("停止所有工作程序...")
+    finally:
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from web3 import Web3
+
+from wallet_store import WalletStore
+
+# Signing processes; 0 signs in the calling process as before
+SIGNING_WORKERS = int(os.getenv("SIGNING_WORKERS", "0"))
+
+# Accounts registered with this worker process, by address
+_accounts = {}
+# Wallets files keys are read from, opened once per process
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def _store(wallets_file):
+    with _stores_lock:
+        store = _stores.get(wallets_file)
+        if store is None:
+            store = WalletStore(wallets_file)
+            _stores[wallets_file] = store
+        return store
+
+
+def _register(sources):
+    """Load the keys of [(wallets_file, address)] into this process"""
+    for wallets_file, address in sources:
+        _accounts[address] = _store(wallets_file).account(address)
+
+
+def _unregister(addresses):
+    for address in addresses:
+        _accounts.pop(address, None)
+
+
+def _sign_batch(items):
+    """Sign [(address, transaction)] with keys held by this process"""
+    return [_accounts[address].sign_transaction(txn) for address, txn in items]
+
+
+class SigningService:
+    """
+    Signs transactions for every bot, optionally across worker processes
+
+    With workers > 0 each address is pinned to one worker process, which
+    is told at registration where the key is (the wallets file and address)
+    and reads it from there itself, again after a restart. Private keys
+    therefore never enter the calling process; only unsigned transactions
+    and signed bytes cross the process boundary. Async callers queue their
+    transactions and each worker gets everything queued in the same event
+    loop tick as a single batch. With workers == 0 the keys are read and
+    used inline.
+    """
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, workers=0):
+        """
+        Args:
+            workers: Signing processes to start (0 to sign inline)
+        """
+        self.workers = workers
+        # address -> wallets file its key is read from
+        self._sources = {}
+        self._executors = [None] * workers
+        self._queued = [[] for _ in range(workers)]
+        self._flush_scheduled = [False] * workers
+        self._batch_tasks = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def shared(cls):
+        """Get the service shared by every bot in the process, configured from env"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls(SIGNING_WORKERS)
+            return cls._shared
+
+    def _shard(self, address):
+        return zlib.crc32(address.encode()) % self.workers
+
+    def _executor(self, shard):
+        """The worker process for shard, (re)started with its wallets if needed"""
+        with self._lock:
+            executor = self._executors[shard]
+            if executor is None:
+                # spawn, as forking a process with running threads and event
+                # loops is unsafe
+                executor = ProcessPoolExecutor(
+                    max_workers=1, mp_context=multiprocessing.get_context("spawn")
+                )
+                sources = [
+                    (wallets_file, address)
+                    for address, wallets_file in self._sources.items()
+                    if self._shard(address) == shard
+                ]
+                if sources:
+                    executor.submit(_register, sources)
+                self._executors[shard] = executor
+            return executor
+
+    def _restart(self, shard, executor):
+        with self._lock:
+            if self._executors[shard] is executor:
+                self._executors[shard] = None
+        executor.shutdown(wait=False)
+
+    def _add_source(self, address, wallets_file):
+        address = Web3.to_checksum_address(address)
+        with self._lock:
+            self._sources[address] = wallets_file
+        return address, [(wallets_file, address)]
+
+    def register(self, address, wallets_file):
+        """
+        Have the process that signs for an address load its key
+
+        Args:
+            address: Wallet address
+            wallets_file: Wallets file (see WalletStore) holding its key
+        """
+        address, sources = self._add_source(address, wallets_file)
+        try:
+            if not self.workers:
+                _register(sources)
+            else:
+                executor = self._executor(self._shard(address))
+                executor.submit(_register, sources).result()
+        except BaseException:
+            self.unregister(address)
+            raise
+
+    async def async_register(self, address, wallets_file):
+        """register() without blocking the loop on reading or decrypting the key"""
+        address, sources = self._add_source(address, wallets_file)
+        try:
+            if not self.workers:
+                await asyncio.to_thread(_register, sources)
+            else:
+                executor = self._executor(self._shard(address))
+                await asyncio.wrap_future(executor.submit(_register, sources))
+        except BaseException:
+            self.unregister(address)
+            raise
+
+    def unregister(self, address):
+        """Forget a wallet's key once it has nothing left to sign"""
+        address = Web3.to_checksum_address(address)
+        with self._lock:
+            if self._sources.pop(address, None) is None:
+                return
+        if not self.workers:
+            _unregister([address])
+        else:
+            self._executor(self._shard(address)).submit(_unregister, [address])
+
+    def sign_batch(self, address, transactions):
+        """
+        Sign transactions for a registered address
+
+        Args:
+            address: Sender address passed to register() before
+            transactions: Transaction dicts from build_transaction
+
+        Returns:
+            List of SignedTransaction, in order
+        """
+        if not self.workers:
+            return _sign_batch([(address, txn) for txn in transactions])
+
+        items = [(address, txn) for txn in transactions]
+        shard = self._shard(address)
+        for attempt in range(2):
+            executor = self._executor(shard)
+            try:
+                return executor.submit(_sign_batch, items).result()
+            except BrokenProcessPool:
+                # The worker died, start a new one that reloads its wallets
+                self._restart(shard, executor)
+                if attempt:
+                    raise
+
+    async def async_sign_batch(self, address, transactions):
+        """
+        Sign transactions for a registered address without blocking the loop
+
+        Args:
+            address: Sender address passed to register() before
+            transactions: Transaction dicts from build_transaction
+
+        Returns:
+            List of SignedTransaction, in order
+        """
+        if not self.workers:
+            return self.sign_batch(address, transactions)
+
+        shard = self._shard(address)
+        future = asyncio.get_running_loop().create_future()
+        self._queued[shard].append(([(address, txn) for txn in transactions], future))
+        if not self._flush_scheduled[shard]:
+            self._flush_scheduled[shard] = True
+            asyncio.get_running_loop().call_soon(self._flush, shard)
+        return await future
+
+    def _flush(self, shard):
+        self._flush_scheduled[shard] = False
+        queued, self._queued[shard] = self._queued[shard], []
+        task = asyncio.create_task(self._send_batch(shard, queued))
+        self._batch_tasks.add(task)
+        task.add_done_callback(self._batch_tasks.discard)
+
+    async def _send_batch(self, shard, queued):
+        items = [item for batch, _ in queued for item in batch]
+        for attempt in range(2):
+            executor = self._executor(shard)
+            try:
+                signed = await asyncio.wrap_future(executor.submit(_sign_batch, items))
+                break
+            except BrokenProcessPool as e:
+                self._restart(shard, executor)
+                if attempt:
+                    signed = e
+            except Exception as e:
+                signed = e
+                break
+
+        start = 0
+        for batch, future in queued:
+            if future.done():
+                start += len(batch)
+                continue
+            if isinstance(signed, Exception):
+                future.set_exception(signed)
+            else:
+                future.set_result(signed[start : start + len(batch)])
+            start += len(batch)
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        with self._lock:
+            executors, self._executors = self._executors, [None] * self.workers
+        for executor in executors:
+            if executor is not None:
+                executor.shutdown()
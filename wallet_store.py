@@ -0,0 +1,217 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from eth_account import Account
+from web3 import Web3
+
+# Password for wallets stored as encrypted keystores
+WALLET_PASSWORD = os.getenv("WALLET_PASSWORD")
+# Seconds a decrypted keystore key is kept before it has to be decrypted again
+KEYSTORE_CACHE_TTL = float(os.getenv("KEYSTORE_CACHE_TTL", "300"))
+
+# Bytes read at a time while indexing the wallets file
+INDEX_CHUNK_SIZE = 1 << 20
+INDEX_VERSION = 1
+
+
+def _normalize(address):
+    if not address.startswith("0x"):
+        # Keystore files store the address without the prefix
+        address = "0x" + address
+    return address.lower()
+
+
+def scan_wallets(f):
+    """
+    Walk the top-level JSON array of a wallets file without loading it all
+
+    Args:
+        f: Wallets file opened in binary mode
+
+    Yields:
+        (offset, length, entry) for each wallet object, offset and length
+        in bytes
+    """
+    decoder = json.JSONDecoder()
+    # latin-1 maps every byte to one character, so string positions are
+    # file offsets
+    buffer = ""
+    buffer_offset = 0
+    pos = 0
+    eof = False
+    while True:
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,[":
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == "]":
+            return
+        try:
+            entry, end = decoder.raw_decode(buffer, pos)
+        except ValueError:
+            # Either the chunk ends mid-object or the file is malformed
+            if eof:
+                if buffer[pos:].strip():
+                    raise ValueError(
+                        f"Malformed wallet entry at byte {buffer_offset + pos}"
+                    ) from None
+                return
+            chunk = f.read(INDEX_CHUNK_SIZE).decode("latin-1")
+            eof = not chunk
+            buffer_offset += pos
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        yield buffer_offset + pos, end - pos, entry
+        pos = end
+
+
+class WalletStore:
+    """
+    Wallets file read on demand through an address -> byte offset index
+
+    The index lives in a SQLite sidecar next to the wallets file and is
+    rebuilt whenever the wallets file changes size or mtime. Looking up a
+    wallet reads only its own entry, so Account objects exist only while a
+    wallet is running. Entries are either {"address", "pk"} or encrypted:
+    a V3 keystore, or {"address", "keystore": <V3 keystore>}. Decrypted keys
+    are cached for keystore_ttl seconds since scrypt makes every decryption
+    slow on purpose.
+    """
+
+    def __init__(self, wallets_file, index_file=None, password=None, keystore_ttl=None):
+        """
+        Args:
+            wallets_file: JSON array of wallet entries
+            index_file: SQLite index path (default: <wallets_file>.idx)
+            password: Keystore password (default: WALLET_PASSWORD)
+            keystore_ttl: Seconds to cache decrypted keys
+                (default: KEYSTORE_CACHE_TTL)
+        """
+        self.wallets_file = wallets_file
+        self.index_file = index_file or f"{wallets_file}.idx"
+        self.password = password if password is not None else WALLET_PASSWORD
+        self.keystore_ttl = KEYSTORE_CACHE_TTL if keystore_ttl is None else keystore_ttl
+        self._decrypted = {}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.index_file, check_same_thread=False)
+        self._file = open(self.wallets_file, "rb")
+        self._ensure_index()
+
+    def _source_version(self):
+        stat = os.fstat(self._file.fileno())
+        return f"{INDEX_VERSION}:{stat.st_size}:{stat.st_mtime_ns}"
+
+    def _ensure_index(self):
+        db = self._db
+        db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS wallets "
+            "(address TEXT PRIMARY KEY, offset INTEGER, length INTEGER)"
+        )
+        version = self._source_version()
+        row = db.execute("SELECT value FROM meta WHERE key = 'source'").fetchone()
+        if row is not None and row[0] == version:
+            return
+
+        print(f"Indexing {self.wallets_file}...")
+        start = time.perf_counter()
+        self._file.seek(0)
+        with db:
+            db.execute("DELETE FROM wallets")
+            db.executemany(
+                "INSERT OR REPLACE INTO wallets VALUES (?, ?, ?)", self._index_rows()
+            )
+            db.execute("INSERT OR REPLACE INTO meta VALUES ('source', ?)", (version,))
+        print(f"Indexed {len(self)} wallets in {time.perf_counter() - start:.2f}s")
+
+    def _index_rows(self):
+        for offset, length, entry in scan_wallets(self._file):
+            address = entry.get("address") if isinstance(entry, dict) else None
+            if not address:
+                # One bad entry should not keep the rest of the fleet from running
+                print(f"Skipping wallet entry without an address at byte {offset}")
+                continue
+            yield _normalize(address), offset, length
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM wallets").fetchone()[0]
+
+    def __contains__(self, address):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT 1 FROM wallets WHERE address = ?", (_normalize(address),)
+            ).fetchone()
+        return row is not None
+
+    def addresses(self):
+        """Iterate over the indexed addresses (lowercase) in file order"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT address FROM wallets ORDER BY offset"
+            ).fetchall()
+        return (address for (address,) in rows)
+
+    def entry(self, address):
+        """
+        Read one wallet's raw entry from the wallets file
+
+        Raises:
+            KeyError: If the address is not in the file
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT offset, length FROM wallets WHERE address = ?",
+                (_normalize(address),),
+            ).fetchone()
+            if row is None:
+                raise KeyError(f"Wallet {address} not found in {self.wallets_file}")
+            self._file.seek(row[0])
+            data = self._file.read(row[1])
+        return json.loads(data)
+
+    def _private_key(self, address, entry):
+        if "pk" in entry:
+            return entry["pk"]
+
+        key = _normalize(address)
+        now = time.monotonic()
+        with self._lock:
+            # Drop expired keys so they do not outlive their TTL in memory
+            for cached, (_, expires_at) in list(self._decrypted.items()):
+                if expires_at <= now:
+                    del self._decrypted[cached]
+            if key in self._decrypted:
+                return self._decrypted[key][0]
+
+        if self.password is None:
+            raise ValueError(f"Wallet {address} is encrypted, set WALLET_PASSWORD")
+        private_key = Account.decrypt(entry.get("keystore", entry), self.password)
+        if self.keystore_ttl > 0:
+            with self._lock:
+                self._decrypted[key] = (private_key, now + self.keystore_ttl)
+        return private_key
+
+    def account(self, address):
+        """
+        Derive the Account for an address from its entry
+
+        Nothing is kept besides the decrypted key cache; the caller drops the
+        Account when the wallet is done.
+        """
+        private_key = self._private_key(address, self.entry(address))
+        account = Account.from_key(private_key)
+        if account.address != Web3.to_checksum_address(_normalize(address)):
+            raise ValueError(f"Key of wallet {address} belongs to {account.address}")
+        return account
+
+    async def async_account(self, address):
+        """account() in a thread, keystore decryption would block the loop"""
+        return await asyncio.to_thread(self.account, address)
+
+    def close(self):
+        self._file.close()
+        self._db.close()
@@ -0,0 +1,96 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from web3 import AsyncWeb3, Web3
+
+from batch_provider import RPC_POOL_SIZE, BatchingAsyncHTTPProvider
+from fake_chain import FAKE_RPC_SCHEME, AsyncFakeChainProvider, FakeChainProvider
+from metrics import Metrics, RPCMetricsMiddleware
+from rpc_router import AsyncRouterProvider, RouterProvider
+
+_web3 = {}
+_async_web3 = {}
+_lock = threading.Lock()
+
+
+def _split_urls(rpc_url):
+    return [url.strip() for url in rpc_url.split(",") if url.strip()]
+
+
+# Behind a router, failing over to another node beats retrying the same one
+_NO_RETRY = {"exception_retry_configuration": None}
+
+
+def _provider(rpc_url, retry=True):
+    if rpc_url.startswith(FAKE_RPC_SCHEME):
+        return FakeChainProvider()
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=RPC_POOL_SIZE)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    kwargs = {} if retry else _NO_RETRY
+    return Web3.HTTPProvider(rpc_url, session=session, **kwargs)
+
+
+def _async_provider(rpc_url, retry=True):
+    if rpc_url.startswith(FAKE_RPC_SCHEME):
+        return AsyncFakeChainProvider()
+    kwargs = {} if retry else _NO_RETRY
+    return BatchingAsyncHTTPProvider(rpc_url, **kwargs)
+
+
+def _instrument(w3):
+    # Only installed when metrics are on, so a disabled run pays nothing per call
+    if Metrics.shared().enabled:
+        w3.middleware_onion.add(RPCMetricsMiddleware, "rpc_metrics")
+
+
+def get_web3(rpc_url):
+    """
+    Get the process-wide Web3 for an endpoint
+
+    Sync callers (contract discovery, the event indexer) share one
+    HTTPProvider whose requests session keeps up to RPC_POOL_SIZE
+    connections alive. A fake:// URL gets the in-memory FakeChain instead,
+    and a comma-separated list of URLs a RouterProvider over all of them.
+    """
+    with _lock:
+        w3 = _web3.get(rpc_url)
+        if w3 is None:
+            urls = _split_urls(rpc_url)
+            if len(urls) > 1:
+                provider = RouterProvider(
+                    [(url, _provider(url, retry=False)) for url in urls]
+                )
+            else:
+                provider = _provider(rpc_url)
+            w3 = Web3(provider)
+            _instrument(w3)
+            _web3[rpc_url] = w3
+        return w3
+
+
+def get_async_web3(rpc_url):
+    """
+    Get the process-wide AsyncWeb3 for an endpoint
+
+    All AsyncYeiPointBots share one BatchingAsyncHTTPProvider, so their reads
+    can be batched together over a pool of RPC_POOL_SIZE keep-alive
+    connections. A fake:// URL gets the in-memory FakeChain instead, and a
+    comma-separated list of URLs an AsyncRouterProvider over all of them.
+    """
+    with _lock:
+        w3 = _async_web3.get(rpc_url)
+        if w3 is None:
+            urls = _split_urls(rpc_url)
+            if len(urls) > 1:
+                provider = AsyncRouterProvider(
+                    [(url, _async_provider(url, retry=False)) for url in urls]
+                )
+            else:
+                provider = _async_provider(rpc_url)
+            w3 = AsyncWeb3(provider)
+            _instrument(w3)
+            _async_web3[rpc_url] = w3
+        return w3